@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Análisis avanzado de torneos sobre un dataset columnar compartido.
+
+Los movimientos de torneo del usuario se cargan una vez por versión de datos en un
+`DatasetTorneos` (columnas NumPy tipadas: fecha, hora, importe y códigos de sala,
+nivel y tipo de juego), guardado en `CacheDatasets`. `/api/analisis/insights` y los
+endpoints de análisis de la API leen del mismo dataset, y `calcular_analisis` solo
+calcula las secciones pedidas.
+
+Los analizadores agrupan con np.bincount sobre los códigos, sin bucles por fila.
+bincount suma en el orden de las filas, igual que el `+=` del cálculo por registro,
+así que los importes coinciden bit a bit y el JSON es el mismo.
+"""
+
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Columnas que se leen de poker_results (solo categoría Torneo)
+CAMPOS_DATASET = 'fecha, hora, importe, nivel_buyin, sala, tipo_juego'
+
+COLUMNAS_TEXTO = ('nivel_buyin', 'sala', 'tipo_juego')
+# Filas que se acumulan antes de convertirlas a columnas tipadas
+FILAS_POR_CONVERSION = 65536
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Sección (parámetro `sections`) -> clave de la respuesta
+SECCIONES_ANALISIS = {
+    'buyin': 'analisis_buyin',
+    'sala': 'analisis_sala',
+    'temporal': 'analisis_temporal',
+    'juego': 'analisis_juego',
+    'consistencia': 'analisis_consistencia',
+    'recomendaciones': 'recomendaciones',
+}
+
+
+class ErrorAnalisis(ValueError):
+    """Parámetros de análisis no válidos (se responde con 400)"""
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.fromisoformat(valor).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _hora(valor):
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(f"2000-01-01T{valor}").hour
+    except ValueError:
+        return None
+
+
+def _convertir_unicos(valores, conversion, tipo, vacio):
+    """
+    Aplica `conversion` una sola vez por valor distinto (fechas y horas se repiten
+    mucho) y reparte el resultado con los códigos de pd.factorize.
+    """
+    codigos, unicos = pd.factorize(np.asarray(valores, dtype=object), sort=False)
+    convertidos = [conversion(valor) for valor in unicos]
+    tabla = np.array([vacio if valor is None else valor for valor in convertidos] + [vacio], dtype=tipo)
+    return tabla[codigos]  # el código -1 (None) toma el último elemento: vacío
+
+
+def _codificar_textos(valores, etiquetas):
+    """
+    Códigos de los textos de un bloque sobre las `etiquetas` acumuladas (texto ->
+    código, en orden de aparición). None queda como -1.
+    """
+    codigos, unicos = pd.factorize(np.asarray(valores, dtype=object), sort=False)
+    mapa = np.array([etiquetas.setdefault(valor, len(etiquetas)) for valor in unicos] + [-1], dtype=np.int32)
+    return mapa[codigos]
+
+
+class DatasetTorneos:
+    """
+    Movimientos de torneo de un usuario en columnas NumPy: `fecha` (datetime64[D],
+    NaT si falta o no es válida), `hora` (int8, -1 si falta), `importe` (float64) y
+    códigos int32 de `nivel_buyin`, `sala` y `tipo_juego` (-1 para None) con sus
+    textos en `etiquetas`, en orden de aparición.
+
+    Se construye a partir de lotes de registros; cada FILAS_POR_CONVERSION filas se
+    convierten a columnas y los registros originales no se conservan.
+    """
+
+    def __init__(self, lotes=()):
+        self.etiquetas = {campo: {} for campo in COLUMNAS_TEXTO}
+        partes = []
+        pendientes = {campo: [] for campo in ('fecha', 'hora', 'importe') + COLUMNAS_TEXTO}
+        for lote in lotes:
+            for campo, valores in pendientes.items():
+                valores.extend([registro.get(campo) for registro in lote])
+            if len(pendientes['importe']) >= FILAS_POR_CONVERSION:
+                partes.append(self._convertir(pendientes))
+                pendientes = {campo: [] for campo in pendientes}
+        partes.append(self._convertir(pendientes))
+
+        for campo in partes[0]:
+            setattr(self, campo, np.concatenate([parte[campo] for parte in partes]))
+        self.etiquetas = {campo: list(etiquetas) for campo, etiquetas in self.etiquetas.items()}
+
+    def _convertir(self, pendientes):
+        importes = pd.to_numeric(pd.Series(pendientes['importe'], dtype=object), errors='coerce')
+        columnas = {
+            'fecha': _convertir_unicos(pendientes['fecha'], _fecha, 'datetime64[D]', np.datetime64('NaT')),
+            'hora': _convertir_unicos(pendientes['hora'], _hora, np.int8, -1),
+            'importe': importes.fillna(0.0).to_numpy(dtype=np.float64),
+        }
+        for campo in COLUMNAS_TEXTO:
+            columnas[campo] = _codificar_textos(pendientes[campo], self.etiquetas[campo])
+        return columnas
+
+    def __len__(self):
+        return len(self.importe)
+
+
+class CacheDatasets:
+    """Datasets de torneos por (usuario, versión de datos); conserva los `max_usuarios` más recientes"""
+
+    def __init__(self, max_usuarios=8):
+        self.max_usuarios = max_usuarios
+        self._datasets = OrderedDict()  # user_id -> (versión, DatasetTorneos)
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id, version, cargar):
+        """Devuelve el dataset del usuario; si no existe o es de otra versión, lo crea con los lotes de cargar()"""
+        user_id = str(user_id)
+        with self._lock:
+            entrada = self._datasets.get(user_id)
+            # Versión desconocida (None): se carga de nuevo y no se conserva
+            if entrada and version is not None and entrada[0] == version:
+                self._datasets.move_to_end(user_id)
+                return entrada[1]
+
+        inicio = time.perf_counter()
+        dataset = DatasetTorneos(cargar())
+        print(f"🧱 Dataset de torneos de {user_id} (versión {version}): {len(dataset)} filas en {time.perf_counter() - inicio:.2f}s")
+
+        if version is None:
+            return dataset
+        with self._lock:
+            self._datasets[user_id] = (version, dataset)
+            self._datasets.move_to_end(user_id)
+            while len(self._datasets) > self.max_usuarios:
+                self._datasets.popitem(last=False)
+        return dataset
+
+    def invalidar_usuario(self, user_id):
+        with self._lock:
+            self._datasets.pop(str(user_id), None)
+
+
+# =============================================================================
+# ANALIZADORES
+# =============================================================================
+
+def _agrupar(dataset, campo):
+    """
+    Filas con `campo` informado (ni None ni vacío) y sus códigos. Los códigos siguen
+    el orden de aparición, así que recorrerlos en orden da los grupos en el mismo
+    orden que el cálculo por registro.
+    """
+    etiquetas = dataset.etiquetas[campo]
+    codigos = getattr(dataset, campo)
+    informadas = np.array([bool(etiqueta) for etiqueta in etiquetas] + [False])
+    filas = informadas[codigos]
+    return etiquetas, filas, codigos[filas]
+
+
+def _totales(codigos, importes, grupos):
+    """
+    Torneos, invertido, ganancias y torneos ganados por código, como valores Python.
+    Los totales de un grupo sin importes negativos (o positivos) quedan en 0 entero,
+    como en el cálculo por registro.
+    """
+    negativos = importes < 0
+    positivos = importes > 0
+    torneos = np.bincount(codigos, minlength=grupos).tolist()
+    invertido = np.bincount(codigos, weights=np.where(negativos, -importes, 0.0), minlength=grupos).tolist()
+    ganancias = np.bincount(codigos, weights=np.where(positivos, importes, 0.0), minlength=grupos).tolist()
+    con_negativos = np.bincount(codigos, weights=negativos, minlength=grupos).tolist()
+    ganados = np.bincount(codigos, weights=positivos, minlength=grupos).astype(np.int64).tolist()
+    return [
+        (torneos[codigo], invertido[codigo] if con_negativos[codigo] else 0, ganancias[codigo] if ganados[codigo] else 0, ganados[codigo])
+        for codigo in range(grupos)
+    ]
+
+
+def _en_orden_de_aparicion(claves):
+    """
+    Valores distintos de un array de enteros no negativos en orden de primera
+    aparición. Con claves pequeñas (pares de códigos, días) usa una tabla directa
+    con la primera fila de cada clave en lugar de ordenar todas las filas.
+    """
+    if not len(claves):
+        return claves
+    tamano = int(claves.max()) + 1
+    if tamano > max(len(claves), 1 << 16):
+        unicos, primeros = np.unique(claves, return_index=True)
+        return unicos[np.argsort(primeros, kind='stable')]
+    primera = np.full(tamano, len(claves), dtype=np.int64)
+    np.minimum.at(primera, claves, np.arange(len(claves)))
+    presentes = np.flatnonzero(primera < len(claves))
+    return presentes[np.argsort(primera[presentes], kind='stable')]
+
+
+def _valores_por_grupo(codigos, otros, etiquetas_otros, grupos, omitir_vacios=True):
+    """
+    Valores distintos de otra columna dentro de cada grupo, en orden de aparición
+    (p. ej. las salas de cada nivel de buy-in).
+    """
+    valores = [[] for _ in range(grupos)]
+    if not len(codigos):
+        return valores
+    # Par (grupo, valor) como un único entero; -1 (None) pasa a 0
+    pares = codigos.astype(np.int64) * (len(etiquetas_otros) + 1) + (otros.astype(np.int64) + 1)
+    for par in _en_orden_de_aparicion(pares).tolist():
+        grupo, otro = divmod(par, len(etiquetas_otros) + 1)
+        valor = etiquetas_otros[otro - 1] if otro else None
+        if valor or not omitir_vacios:
+            valores[grupo].append(valor)
+    return valores
+
+
+def analizar_rendimiento_por_buyin(dataset):
+    """Analiza el rendimiento por nivel de buy-in"""
+    etiquetas, filas, codigos = _agrupar(dataset, 'nivel_buyin')
+    totales = _totales(codigos, dataset.importe[filas], len(etiquetas))
+    salas = _valores_por_grupo(codigos, dataset.sala[filas], dataset.etiquetas['sala'], len(etiquetas), omitir_vacios=False)
+
+    buyin_stats = {}
+    for codigo, nivel in enumerate(etiquetas):
+        total_torneos, total_invertido, total_ganancias, _ = totales[codigo]
+        if not total_torneos:
+            continue
+        stats = buyin_stats[nivel] = {
+            'total_torneos': total_torneos,
+            'total_invertido': total_invertido,
+            'total_ganancias': total_ganancias,
+            'roi': 0,
+            'mejor_racha': 0,
+            'peor_racha': 0,
+            'racha_actual': 0,
+            'salas': salas[codigo]
+        }
+
+        # Calcular ROI y rachas
+        if stats['total_invertido'] > 0:
+            stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
+
+        # Calcular rachas (simplificado)
+        stats['mejor_racha'] = max(0, stats['total_ganancias'] / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
+        stats['peor_racha'] = min(0, (stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
+
+    return buyin_stats
+
+
+def _rendimiento_por(dataset, campo):
+    """Torneos, invertido, ganancias, ROI y porcentaje de victorias por cada valor de `campo`"""
+    etiquetas, filas, codigos = _agrupar(dataset, campo)
+    totales = _totales(codigos, dataset.importe[filas], len(etiquetas))
+
+    stats_por_clave = {}
+    for codigo, clave in enumerate(etiquetas):
+        total_torneos, total_invertido, total_ganancias, torneos_ganados = totales[codigo]
+        if not total_torneos:
+            continue
+        stats = stats_por_clave[clave] = {
+            'total_torneos': total_torneos,
+            'total_invertido': total_invertido,
+            'total_ganancias': total_ganancias,
+            'roi': 0,
+            'torneos_ganados': torneos_ganados
+        }
+        if stats['total_invertido'] > 0:
+            stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
+        stats['porcentaje_victorias'] = (stats['torneos_ganados'] / stats['total_torneos']) * 100
+    return stats_por_clave, etiquetas, filas, codigos
+
+
+def analizar_rendimiento_por_sala(dataset):
+    """Analiza el rendimiento por sala, con los tipos de juego y niveles jugados en cada una"""
+    sala_stats, etiquetas, filas, codigos = _rendimiento_por(dataset, 'sala')
+    tipos_juego = _valores_por_grupo(codigos, dataset.tipo_juego[filas], dataset.etiquetas['tipo_juego'], len(etiquetas))
+    niveles_buyin = _valores_por_grupo(codigos, dataset.nivel_buyin[filas], dataset.etiquetas['nivel_buyin'], len(etiquetas))
+
+    for codigo, sala in enumerate(etiquetas):
+        if sala in sala_stats:
+            sala_stats[sala]['tipos_juego'] = tipos_juego[codigo]
+            sala_stats[sala]['niveles_buyin'] = niveles_buyin[codigo]
+
+    return sala_stats
+
+
+def _promedios(claves, importes, grupos):
+    """Torneos y resultado promedio por clave (solo las claves con torneos)"""
+    torneos = np.bincount(claves, minlength=grupos).tolist()
+    resultado = np.bincount(claves, weights=importes, minlength=grupos).tolist()
+    return {clave: (torneos[clave], resultado[clave] / torneos[clave]) for clave in range(grupos) if torneos[clave]}
+
+
+def analizar_patrones_temporales(dataset):
+    """Analiza patrones temporales de juego"""
+    con_fecha = ~np.isnat(dataset.fecha)
+    # 1970-01-01 fue jueves: (días + 3) % 7 da 0 = lunes ... 6 = domingo
+    dias_semana = (dataset.fecha[con_fecha].astype(np.int64) + 3) % 7
+    importes = dataset.importe[con_fecha]
+    horas = dataset.hora[con_fecha]
+    con_hora = horas >= 0
+
+    por_dia = _promedios(dias_semana, importes, 7)
+    por_hora = _promedios(horas[con_hora].astype(np.int64), importes[con_hora], 24)
+
+    return {
+        'por_dia_semana': [
+            {'dia': dia, 'torneos': por_dia[i][0], 'resultado_promedio': por_dia[i][1]}
+            for i, dia in enumerate(DIAS_SEMANA) if i in por_dia
+        ],
+        'por_hora': [
+            {'hora': f"{hora:02d}:00", 'torneos': torneos, 'resultado_promedio': promedio}
+            for hora, (torneos, promedio) in sorted(por_hora.items())
+        ]
+    }
+
+
+def analizar_rendimiento_por_juego(dataset):
+    """Analiza el rendimiento por tipo de juego"""
+    return _rendimiento_por(dataset, 'tipo_juego')[0]
+
+
+def analizar_consistencia_jugador(dataset):
+    """Analiza la consistencia del jugador"""
+    con_fecha = ~np.isnat(dataset.fecha)
+    dias = dataset.fecha[con_fecha].astype(np.int64)
+    if not len(dias):
+        return {'consistencia': 'Sin datos suficientes'}
+
+    # Resultado de cada día, con los días en orden de aparición
+    dias = dias - dias.min()
+    sumas = np.bincount(dias, weights=dataset.importe[con_fecha])[_en_orden_de_aparicion(dias)]
+    resultados = sumas.tolist()
+
+    # Calcular métricas de consistencia
+    media = statistics.mean(resultados)
+    desviacion = statistics.stdev(resultados) if len(resultados) > 1 else 0
+    coeficiente_variacion = (desviacion / abs(media)) * 100 if media != 0 else 0
+
+    # Días positivos vs negativos
+    dias_positivos = int((sumas > 0).sum())
+    dias_negativos = int((sumas < 0).sum())
+    dias_neutros = int((sumas == 0).sum())
+
+    return {
+        'dias_jugados': len(resultados),
+        'resultado_promedio_diario': media,
+        'desviacion_estandar': desviacion,
+        'coeficiente_variacion': coeficiente_variacion,
+        'dias_positivos': dias_positivos,
+        'dias_negativos': dias_negativos,
+        'dias_neutros': dias_neutros,
+        'consistencia': 'Alta' if coeficiente_variacion < 50 else 'Media' if coeficiente_variacion < 100 else 'Baja'
+    }
+
+
+def generar_recomendaciones(analisis_buyin, analisis_temporal, analisis_juego, analisis_consistencia):
+    """Genera recomendaciones estratégicas basadas en el análisis"""
+    recomendaciones = []
+
+    # Recomendaciones por nivel de buy-in
+    mejor_buyin = max(analisis_buyin.items(), key=lambda x: x[1]['roi']) if analisis_buyin else None
+    peor_buyin = min(analisis_buyin.items(), key=lambda x: x[1]['roi']) if analisis_buyin else None
+
+    if mejor_buyin and mejor_buyin[1]['roi'] > 0:
+        recomendaciones.append({
+            'tipo': 'buyin',
+            'titulo': f'Mejor rendimiento en {mejor_buyin[0]}',
+            'descripcion': f'Tu ROI en {mejor_buyin[0]} es del {mejor_buyin[1]["roi"]:.1f}%. Considera jugar más en este nivel.',
+            'prioridad': 'alta'
+        })
+
+    if peor_buyin and peor_buyin[1]['roi'] < -20:
+        recomendaciones.append({
+            'tipo': 'buyin',
+            'titulo': f'Revisar estrategia en {peor_buyin[0]}',
+            'descripcion': f'Tu ROI en {peor_buyin[0]} es del {peor_buyin[1]["roi"]:.1f}%. Considera revisar tu estrategia o reducir la frecuencia.',
+            'prioridad': 'alta'
+        })
+
+    # Recomendaciones por tipo de juego
+    mejor_juego = max(analisis_juego.items(), key=lambda x: x[1]['roi']) if analisis_juego else None
+
+    if mejor_juego and mejor_juego[1]['roi'] > 0:
+        recomendaciones.append({
+            'tipo': 'juego',
+            'titulo': f'Fuerte en {mejor_juego[0]}',
+            'descripcion': f'Tu ROI en {mejor_juego[0]} es del {mejor_juego[1]["roi"]:.1f}% con {mejor_juego[1]["porcentaje_victorias"]:.1f}% de victorias.',
+            'prioridad': 'media'
+        })
+
+    # Recomendaciones temporales
+    mejor_dia = max(analisis_temporal['por_dia_semana'], key=lambda x: x['resultado_promedio']) if analisis_temporal['por_dia_semana'] else None
+
+    if mejor_dia and mejor_dia['resultado_promedio'] > 0:
+        recomendaciones.append({
+            'tipo': 'temporal',
+            'titulo': f'Mejor día: {mejor_dia["dia"]}',
+            'descripcion': f'Tu resultado promedio los {mejor_dia["dia"]}s es de ${mejor_dia["resultado_promedio"]:.2f}. Considera jugar más este día.',
+            'prioridad': 'baja'
+        })
+
+    # Recomendaciones de consistencia
+    if analisis_consistencia.get('consistencia') == 'Baja':
+        recomendaciones.append({
+            'tipo': 'consistencia',
+            'titulo': 'Mejorar consistencia',
+            'descripcion': 'Tu juego muestra alta variabilidad. Considera establecer límites de pérdida y ganancia diarios.',
+            'prioridad': 'alta'
+        })
+
+    return recomendaciones
+
+
+# Sección -> analizador (las recomendaciones se calculan a partir de otras cuatro)
+ANALIZADORES = {
+    'buyin': analizar_rendimiento_por_buyin,
+    'sala': analizar_rendimiento_por_sala,
+    'temporal': analizar_patrones_temporales,
+    'juego': analizar_rendimiento_por_juego,
+    'consistencia': analizar_consistencia_jugador,
+}
+DEPENDENCIAS_RECOMENDACIONES = ('buyin', 'temporal', 'juego', 'consistencia')
+
+
+def secciones_pedidas(valor):
+    """
+    Secciones de `sections` ('buyin,sala' o lista); sin valor, todas. Acepta también
+    el nombre de la clave de respuesta ('analisis_buyin').
+    """
+    if not valor:
+        return list(SECCIONES_ANALISIS)
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    por_clave = {clave: seccion for seccion, clave in SECCIONES_ANALISIS.items()}
+    secciones = []
+    for nombre in (v.strip() for v in valor if v and v.strip()):
+        seccion = nombre if nombre in SECCIONES_ANALISIS else por_clave.get(nombre)
+        if seccion is None:
+            raise ErrorAnalisis(f"Sección no válida: {nombre}. Disponibles: {', '.join(SECCIONES_ANALISIS)}")
+        if seccion not in secciones:
+            secciones.append(seccion)
+    return secciones or list(SECCIONES_ANALISIS)
+
+
+def calcular_analisis(dataset, secciones=None):
+    """
+    Calcula solo las `secciones` pedidas (todas por defecto) sobre el dataset y las
+    devuelve con las claves de /api/analisis/insights. Cada analizador se ejecuta una
+    vez aunque lo necesiten varias secciones.
+    """
+    secciones = secciones_pedidas(secciones)
+    calculados = {}
+
+    def seccion(nombre):
+        if nombre not in calculados:
+            calculados[nombre] = ANALIZADORES[nombre](dataset)
+        return calculados[nombre]
+
+    resultado = {}
+    for nombre in secciones:
+        if nombre == 'recomendaciones':
+            resultado['recomendaciones'] = generar_recomendaciones(*(seccion(dependencia) for dependencia in DEPENDENCIAS_RECOMENDACIONES))
+        else:
+            resultado[SECCIONES_ANALISIS[nombre]] = seccion(nombre)
+    return resultado
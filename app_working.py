@@ -4,11 +4,15 @@
 import os
 import uuid
 import json
+import base64
 import pandas as pd
+import numpy as np
 import hashlib
 import time
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, send_from_directory
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, send_from_directory, g, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
@@ -18,6 +22,16 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 import httpx
+from functools import wraps
+from cache_resultados import CacheLRU, etag_respuesta, normalizar_filtros
+from repositorio_poker import MetricasConsultas, RepositorioPoker
+from espejo_local import SOLAPE_SEGUNDOS, EspejoLocal
+from cliente_async import ERRORES_TRANSITORIOS, ClienteSupabaseAsync, calcular_espera
+from circuito import CircuitBreaker, CircuitoAbierto, GestorCircuitos
+from pivot_informes import CAMPOS_SNAPSHOT, FILTROS_LISTA, CacheSnapshots, ejecutar_pivot
+from respuestas_json import ProveedorJSONRapido, comprimir_respuesta
+from exportar_informes import CAMPOS_EXPORTACION, FORMATOS_EXPORTACION, formato_disponible
+from analisis_torneos import CAMPOS_DATASET, CacheDatasets, calcular_analisis
 
 # Importar Flask-RESTX para Swagger
 from flask_restx import Api, Resource, fields, Namespace
@@ -27,6 +41,15 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+logger = logging.getLogger('poker_results')
+
+# jsonify con orjson y compresión brotli/gzip de las respuestas grandes
+app.json = ProveedorJSONRapido(app)
+COMPRESION_MIN_BYTES = int(os.getenv('COMPRESION_MIN_BYTES', '1024'))
+
+@app.after_request
+def comprimir(respuesta):
+    return comprimir_respuesta(respuesta, request.accept_encodings, min_bytes=COMPRESION_MIN_BYTES)
 
 # Configurar Swagger/OpenAPI
 app.config['RESTX_MASK_SWAGGER'] = False
@@ -39,6 +62,14 @@ api = Api(
     prefix='/api'
 )
 
+@api.representation('application/json')
+def salida_json(datos, codigo, headers=None):
+    """Las respuestas de la API de Swagger usan el mismo proveedor JSON que jsonify"""
+    respuesta = app.json.response(datos)
+    respuesta.status_code = codigo
+    respuesta.headers.extend(headers or {})
+    return respuesta
+
 # Crear namespaces para organizar los endpoints
 auth_ns = Namespace('auth', description='Autenticación de usuarios')
 reports_ns = Namespace('reports', description='Informes y reportes')
@@ -120,137 +151,131 @@ opciones_model = api.model('Opciones', {
 # Configurar Supabase
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+# Clave de servicio: las funciones y tablas de supabase_optimizaciones.sql solo son
+# accesibles para service_role (la autorización por usuario la hace la aplicación)
+SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL y SUPABASE_KEY deben estar configurados en el archivo .env")
 
+if not SUPABASE_SERVICE_KEY:
+    print("⚠️  SUPABASE_SERVICE_KEY no configurada: las funciones restringidas a service_role no estarán disponibles")
+CLAVE_SERVIDOR = SUPABASE_SERVICE_KEY or SUPABASE_KEY
+
 # Configurar cliente de Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_client(SUPABASE_URL, CLAVE_SERVIDOR)
 
 # Función de reintentos para consultas de Supabase
+# Circuito de la capa de datos: tras varias consultas que agotan sus reintentos por
+# errores de red, las siguientes fallan al instante en lugar de acumular más reintentos
+CIRCUITO_APERTURA_SEGUNDOS = float(os.getenv('CIRCUITO_APERTURA_SEGUNDOS', '30'))
+circuito_supabase = CircuitBreaker(
+    'supabase',
+    max_fallos=int(os.getenv('CIRCUITO_SUPABASE_MAX_FALLOS', '3')),
+    apertura_segundos=CIRCUITO_APERTURA_SEGUNDOS
+)
+
 def ejecutar_con_reintentos(func, max_intentos=3, delay=1):
-    """Ejecuta una función con reintentos en caso de error de conexión"""
+    """
+    Ejecuta una función con reintentos en caso de error de conexión: backoff exponencial
+    con jitter (calcular_espera) en el propio hilo. Si el circuito se abre durante una
+    espera (otras peticiones agotaron sus intentos), no se hacen más intentos.
+    """
+    if not circuito_supabase.permitir():
+        raise CircuitoAbierto(circuito_supabase.nombre, circuito_supabase.segundos_para_reintento())
+
     for intento in range(max_intentos):
         try:
-            return func()
-        except (httpx.ReadError, httpx.ConnectError, httpx.TimeoutException, httpx.RemoteProtocolError) as e:
+            resultado = func()
+            circuito_supabase.registrar_exito()
+            return resultado
+        except ERRORES_TRANSITORIOS as e:
             print(f"⚠️  Intento {intento + 1} falló: {type(e).__name__}: {e}")
-            if intento < max_intentos - 1:
-                print(f"🔄 Reintentando en {delay} segundos...")
-                time.sleep(delay)
-                delay *= 2  # Backoff exponencial
-            else:
+            if intento == max_intentos - 1:
                 print(f"❌ Todos los intentos fallaron después de {max_intentos} intentos")
-                raise e
+                circuito_supabase.registrar_fallo()
+                raise
+            espera = calcular_espera(intento, base=delay)
+            print(f"🔄 Reintentando en {espera:.2f} segundos...")
+            time.sleep(espera)  # Backoff exponencial con jitter
+            if circuito_supabase.segundos_para_reintento() > 0:
+                print(f"🚨 Circuito '{circuito_supabase.nombre}' abierto durante la espera, sin más reintentos")
+                raise
         except Exception as e:
-            # Para otros errores, no reintentar
+            # Para otros errores, no reintentar (el servidor respondió: no cuenta como caída)
+            circuito_supabase.registrar_exito()
             print(f"❌ Error no recuperable: {type(e).__name__}: {e}")
-            raise e
+            raise
+
+# Número máximo de páginas que se piden en paralelo en las lecturas completas
+LECTURA_CONCURRENTE_MAX_HILOS = int(os.getenv('LECTURA_CONCURRENTE_MAX_HILOS', '6'))
+
+# Capa de acceso a datos: proyecciones por consulta, paginación keyset y métricas por consulta
+repositorio = RepositorioPoker(supabase, ejecutar=ejecutar_con_reintentos, max_hilos=LECTURA_CONCURRENTE_MAX_HILOS)
+
+# Cliente asíncrono (pool HTTP/2 con keep-alive) para lanzar consultas independientes a la vez.
+# Su bucle arranca en el primer uso, dentro de cada worker (con gunicorn --preload el hilo
+# no sobreviviría al fork)
+cliente_async = ClienteSupabaseAsync(
+    SUPABASE_URL, CLAVE_SERVIDOR,
+    max_conexiones=int(os.getenv('SUPABASE_ASYNC_MAX_CONEXIONES', '20')),
+    max_keepalive=int(os.getenv('SUPABASE_ASYNC_MAX_KEEPALIVE', '10')),
+    metricas=repositorio.metricas,
+    circuito=circuito_supabase
+)
+
+def iterar_lotes_keyset(table_name, select_fields, filtros=None, batch_size=1000, desde=None, hasta=None):
+    """Recorre una tabla por lotes con paginación keyset sobre id (ver RepositorioPoker.iterar_lotes)"""
+    return repositorio.iterar_lotes(table_name, select_fields, filtros, tamano_lote=batch_size, desde=desde, hasta=hasta)
+
+def iterar_lotes_keyset_concurrente(table_name, select_fields, filtros=None, batch_size=1000, max_hilos=None):
+    """Lectura completa con rangos de ids en paralelo (ver RepositorioPoker.iterar_lotes_concurrente)"""
+    return repositorio.iterar_lotes_concurrente(table_name, select_fields, filtros, tamano_lote=batch_size, max_hilos=max_hilos)
 
-def obtener_registros_completos_supabase(table_name, select_fields, filter_user_id, max_records=20000):
+def leer_registros_keyset(table_name, select_fields, filtros=None):
+    """Lee todos los registros que cumplen `filtros` recorriéndolos con iterar_lotes_keyset_concurrente"""
+    return repositorio.leer_todos(table_name, select_fields, filtros)
+
+def obtener_registros_completos_supabase(table_name, select_fields, filter_user_id, max_records=None):
     """
-    Obtiene todos los registros de una tabla superando el límite de 1000 de Supabase
-    usando consultas por lotes.
+    Recorre todos los registros de un usuario superando el límite de 1000 de Supabase.
+    Generador: entrega las páginas en orden por id, leyendo rangos de (user_id, id) en paralelo.
+    Sin límite por defecto; `max_records` corta el recorrido si se indica.
     """
-    try:
-        all_records = []
-        offset = 0
-        batch_size = 1000
-        
-        print(f"🔍 Obteniendo registros de {table_name} para usuario {filter_user_id}")
-        
-        while True:
-            # Consulta por lote con reintentos
-            def get_batch():
-                return supabase.table(table_name).select(select_fields).eq('user_id', filter_user_id).range(offset, offset + batch_size - 1).execute()
-            
-            batch_result = ejecutar_con_reintentos(get_batch)
-            
-            if not batch_result.data:
-                break
-                
-            all_records.extend(batch_result.data)
-            
-            print(f"📊 Lote {offset//batch_size + 1}: {len(batch_result.data)} registros (total: {len(all_records)})")
-            
-            # Si obtenemos menos registros que el tamaño del lote, hemos terminado
-            if len(batch_result.data) < batch_size:
-                break
-                
-            offset += batch_size
-            
-            # Límite de seguridad
-            if offset >= max_records:
-                print(f"⚠️  Límite de seguridad alcanzado: {max_records} registros")
-                break
-        
-        print(f"✅ Total de registros obtenidos: {len(all_records)}")
-        return all_records
-        
-    except Exception as e:
-        print(f"❌ Error obteniendo registros completos: {e}")
-        return []
+    total = 0
+    lote_numero = 0
+
+    print(f"🔍 Obteniendo registros de {table_name} para usuario {filter_user_id}")
+
+    for lote in iterar_lotes_keyset_concurrente(table_name, select_fields, lambda q: q.eq('user_id', filter_user_id)):
+        lote_numero += 1
+        total += len(lote)
+        print(f"📊 Lote {lote_numero}: {len(lote)} registros (total: {total})")
 
-def obtener_valores_unicos_optimizado(table_name, field_name, filter_user_id, max_records=20000):
+        yield lote
+
+        if max_records is not None and total >= max_records:
+            print(f"⚠️  Límite solicitado alcanzado: {max_records} registros")
+            break
+
+    print(f"✅ Total de registros obtenidos: {total}")
+
+def obtener_valores_unicos_optimizado(table_name, field_name, filter_user_id):
     """
-    Obtiene valores únicos de un campo específico, parando cuando encuentra todos los valores únicos.
-    Optimizado para filtros de interfaz que solo necesitan las opciones disponibles.
+    Obtiene los valores únicos de un campo recorriendo todos los registros del usuario
+    por lotes. La memoria depende del número de valores distintos, no del de registros.
     """
     try:
         valores_unicos = set()
-        offset = 0
-        batch_size = 1000
-        sin_cambios_consecutivos = 0
+        lote_numero = 0
         
         print(f"🔍 Obteniendo valores únicos de {field_name} en {table_name}")
         
-        # Para salas y categorías, NO usar optimización debido a distribución irregular de registros
-        usar_optimizacion = field_name not in ['sala', 'categoria']
-        
-        while True:
-            # Consulta por lote
-            def get_batch():
-                return supabase.table(table_name).select(field_name).eq('user_id', filter_user_id).range(offset, offset + batch_size - 1).execute()
-            
-            batch_result = ejecutar_con_reintentos(get_batch)
-            
-            if not batch_result.data:
-                break
-            
-            # Contar valores únicos antes
+        for lote in iterar_lotes_keyset(table_name, field_name, lambda q: q.eq('user_id', filter_user_id)):
+            lote_numero += 1
             valores_antes = len(valores_unicos)
-            
-            # Agregar nuevos valores únicos
-            for record in batch_result.data:
-                if record.get(field_name):
-                    valores_unicos.add(record[field_name])
-            
-            valores_despues = len(valores_unicos)
-            nuevos_valores = valores_despues - valores_antes
-            
-            print(f"📊 Lote {offset//batch_size + 1}: {len(batch_result.data)} registros, +{nuevos_valores} valores únicos (total: {len(valores_unicos)})")
-            
-            # Solo aplicar optimización si no es el campo 'sala'
-            if usar_optimizacion:
-                # Si no encontramos nuevos valores únicos en 2 lotes consecutivos, probablemente ya tenemos todos
-                if nuevos_valores == 0:
-                    sin_cambios_consecutivos += 1
-                    if sin_cambios_consecutivos >= 2:
-                        print(f"✅ Optimización: No se encontraron nuevos valores únicos en {sin_cambios_consecutivos} lotes, terminando")
-                        break
-                else:
-                    sin_cambios_consecutivos = 0
-            
-            # Si obtenemos menos registros que el tamaño del lote, hemos terminado
-            if len(batch_result.data) < batch_size:
-                break
-                
-            offset += batch_size
-            
-            # Límite de seguridad
-            if offset >= max_records:
-                print(f"⚠️  Límite de seguridad alcanzado: {max_records} registros")
-                break
+            valores_unicos.update(record[field_name] for record in lote if record.get(field_name))
+            print(f"📊 Lote {lote_numero}: {len(lote)} registros, +{len(valores_unicos) - valores_antes} valores únicos (total: {len(valores_unicos)})")
         
         valores_lista = list(valores_unicos)
         print(f"✅ Valores únicos obtenidos: {len(valores_lista)} - {valores_lista}")
@@ -260,6 +285,774 @@ def obtener_valores_unicos_optimizado(table_name, field_name, filter_user_id, ma
         print(f"❌ Error obteniendo valores únicos: {e}")
         return []
 
+# Campos de poker_results que se ofrecen como filtros en la interfaz
+CAMPOS_OPCIONES_FILTROS = {
+    'salas': 'sala',
+    'categorias': 'categoria',
+    'tipos_juego': 'tipo_juego',
+    'niveles_buyin': 'nivel_buyin',
+    'tipos_movimiento': 'tipo_movimiento'
+}
+
+def obtener_opciones_filtros(user_id):
+    """
+    Obtiene los valores distintos de cada filtro y el rango de fechas de un usuario.
+    Usa la función get_opciones_filtros (una sola consulta en el servidor); si todavía no
+    está creada, calcula lo mismo en una única pasada por los registros del usuario.
+    """
+    lectura = repositorio_lectura(user_id)
+    try:
+        opciones = lectura.rpc('get_opciones_filtros', {'user_id_param': str(user_id)}) or {}
+        return {
+            **{clave: opciones.get(clave) or [] for clave in CAMPOS_OPCIONES_FILTROS},
+            'fecha_min': opciones.get('fecha_min'),
+            'fecha_max': opciones.get('fecha_max')
+        }
+    except Exception as e:
+        print(f"⚠️  RPC get_opciones_filtros no disponible ({e}), calculando opciones por lotes")
+
+    valores = {clave: set() for clave in CAMPOS_OPCIONES_FILTROS}
+    fecha_min = None
+    fecha_max = None
+    select_fields = ', '.join(list(CAMPOS_OPCIONES_FILTROS.values()) + ['fecha'])
+
+    for lote in lectura.iterar_lotes_concurrente('poker_results', select_fields, lambda q: q.eq('user_id', str(user_id))):
+        for record in lote:
+            for clave, campo in CAMPOS_OPCIONES_FILTROS.items():
+                if record.get(campo):
+                    valores[clave].add(record[campo])
+            fecha = record.get('fecha')
+            if fecha:
+                fecha_min = fecha if fecha_min is None or fecha < fecha_min else fecha_min
+                fecha_max = fecha if fecha_max is None or fecha > fecha_max else fecha_max
+
+    return {
+        **{clave: sorted(conjunto) for clave, conjunto in valores.items()},
+        'fecha_min': fecha_min,
+        'fecha_max': fecha_max
+    }
+
+# =============================================================================
+# VERSIÓN DE DATOS POR USUARIO Y CACHÉ DE RESULTADOS
+# =============================================================================
+
+# Tiempo durante el que un proceso reutiliza la versión leída de la base de datos
+# (las versiones incrementadas por el propio proceso se ven al instante)
+VERSION_DATOS_TTL_SEGUNDOS = float(os.getenv('VERSION_DATOS_TTL_SEGUNDOS', '5'))
+CACHE_RESULTADOS_MAX_MB = float(os.getenv('CACHE_RESULTADOS_MAX_MB', '64'))
+
+# Forma parte de los ETags: un despliegue nuevo (que puede cambiar el formato de las
+# respuestas) no valida los ETags que guardan los navegadores
+ETAG_DESPLIEGUE = os.getenv('VERCEL_GIT_COMMIT_SHA') or str(int(os.path.getmtime(__file__)))
+
+cache_resultados = CacheLRU(int(CACHE_RESULTADOS_MAX_MB * 1024 * 1024))
+# Última respuesta buena por (usuario, endpoint, filtros), sin versión: se sirve marcada
+# como obsoleta mientras Supabase no responde
+respaldo_resultados = CacheLRU(int(float(os.getenv('CACHE_RESPALDO_MAX_MB', '16')) * 1024 * 1024))
+# Snapshots columnares (DuckDB) para /api/informes/pivot
+snapshots_pivot = CacheSnapshots(int(os.getenv('PIVOT_MAX_USUARIOS', '8')))
+# Datasets columnares de torneos para el análisis avanzado
+datasets_torneos = CacheDatasets(int(os.getenv('ANALISIS_MAX_USUARIOS', '8')))
+_versiones_datos = {}  # user_id -> (versión o None, momento de lectura)
+_versiones_datos_lock = threading.Lock()
+# Usuarios cuyo incremento de versión no llegó a la base de datos: hasta que se repita
+# con éxito su versión es desconocida y no se cachea ni se valida ningún ETag
+_versiones_pendientes = set()
+VERSION_DATOS_REINTENTO_SEGUNDOS = float(os.getenv('VERSION_DATOS_REINTENTO_SEGUNDOS', '30'))
+
+def obtener_version_datos(user_id):
+    """
+    Devuelve la versión de datos del usuario (tabla user_data_versions) o None si no se
+    puede leer o escribir de forma duradera (tabla ausente, Supabase caído o incremento
+    pendiente). Con None los llamadores no cachean ni responden 304.
+    """
+    user_id = str(user_id)
+    with _versiones_datos_lock:
+        entrada = _versiones_datos.get(user_id)
+        pendiente = user_id in _versiones_pendientes
+    if entrada and time.time() - entrada[1] < VERSION_DATOS_TTL_SEGUNDOS:
+        return entrada[0]
+
+    if pendiente:
+        return _reintentar_incremento_version(user_id)
+
+    try:
+        resultado = ejecutar_con_reintentos(
+            lambda: supabase.table('user_data_versions').select('version').eq('user_id', user_id).limit(1).execute()
+        )
+        version = resultado.data[0]['version'] if resultado.data else 0
+    except Exception as e:
+        # Sin versión fiable no se usa la caché; se vuelve a intentar pasado el TTL
+        print(f"⚠️  No se pudo leer la versión de datos ({e}), respuestas sin caché")
+        version = None
+
+    with _versiones_datos_lock:
+        _versiones_datos[user_id] = (version, time.time())
+    return version
+
+def _incrementar_version_remota(user_id):
+    return ejecutar_con_reintentos(
+        lambda: supabase.rpc('bump_data_version', {'user_id_param': user_id}).execute()
+    ).data
+
+def _reintentar_incremento_version(user_id):
+    """Repite un incremento de versión que falló; devuelve la nueva versión o None"""
+    try:
+        version = _incrementar_version_remota(user_id)
+    except Exception as e:
+        print(f"⚠️  El incremento de versión de {user_id} sigue pendiente ({e})")
+        version = None
+
+    with _versiones_datos_lock:
+        if version is not None:
+            _versiones_pendientes.discard(user_id)
+        _versiones_datos[user_id] = (version, time.time())
+    if version is not None:
+        # Lo cacheado mientras la versión era desconocida no debe sobrevivir
+        cache_resultados.invalidar_usuario(user_id)
+        print(f"🔖 Versión de datos del usuario {user_id}: {version} (incremento pendiente aplicado)")
+    return version
+
+def _programar_reintento_version(user_id):
+    """Reintenta en segundo plano hasta que el incremento llega a la base de datos"""
+    def reintentar():
+        with _versiones_datos_lock:
+            if user_id not in _versiones_pendientes:
+                return
+        if _reintentar_incremento_version(user_id) is None:
+            _programar_reintento_version(user_id)
+
+    temporizador = threading.Timer(VERSION_DATOS_REINTENTO_SEGUNDOS, reintentar)
+    temporizador.daemon = True
+    temporizador.start()
+
+def incrementar_version_datos(user_id):
+    """
+    Incrementa la versión de datos del usuario tras una importación, eliminación o
+    reclasificación. Si la base de datos no responde, la versión queda desconocida
+    (sin caché ni ETags) hasta que el incremento se repite con éxito: un contador local
+    volvería al valor anterior al expirar el TTL y validaría los ETags previos.
+    """
+    user_id = str(user_id)
+    try:
+        version = _incrementar_version_remota(user_id)
+    except Exception as e:
+        print(f"⚠️  No se pudo incrementar la versión de datos en la base de datos ({e}), caché desactivada para el usuario hasta reintentarlo")
+        version = None
+
+    with _versiones_datos_lock:
+        _versiones_datos[user_id] = (version, time.time())
+        if version is None:
+            _versiones_pendientes.add(user_id)
+        else:
+            _versiones_pendientes.discard(user_id)
+    if version is None:
+        _programar_reintento_version(user_id)
+    liberadas = cache_resultados.invalidar_usuario(user_id)
+    snapshots_pivot.invalidar_usuario(user_id)
+    datasets_torneos.invalidar_usuario(user_id)
+    print(f"🔖 Versión de datos del usuario {user_id}: {version} ({liberadas} entradas de caché liberadas)")
+    return version
+
+# =============================================================================
+# CIRCUITOS POR ENDPOINT Y RESPUESTAS OBSOLETAS
+# =============================================================================
+
+# Presupuesto de cada endpoint: fallos consecutivos antes de abrir y latencia máxima
+# (una respuesta más lenta cuenta como fallo)
+PRESUPUESTOS_CIRCUITO = {
+    'informes_opciones': {'max_fallos': 3, 'latencia_max': 5.0},
+    'informes_resultados': {'max_fallos': 3, 'latencia_max': 10.0},
+    'analisis_insights': {'max_fallos': 2, 'latencia_max': 20.0},
+    'informes_pivot': {'max_fallos': 3, 'latencia_max': 30.0},
+}
+
+# Espera mínima antes de repetir en segundo plano una petición que falló
+REFRESCO_MIN_ESPERA_SEGUNDOS = 5.0
+
+_refrescos_pendientes = {}  # (user_id, endpoint, filtros) -> (funcion de datos, args, por_dia)
+_refrescos_programados = set()  # endpoints con un refresco en segundo plano en curso
+_refrescos_lock = threading.Lock()
+
+def programar_refresco(endpoint, espera=0.0):
+    """Lanza (una sola vez por endpoint) el refresco en segundo plano de las respuestas obsoletas"""
+    with _refrescos_lock:
+        if endpoint in _refrescos_programados:
+            return
+        _refrescos_programados.add(endpoint)
+    temporizador = threading.Timer(espera, refrescar_respaldos, args=(endpoint,))
+    temporizador.daemon = True
+    temporizador.start()
+
+def guardar_respuesta(clave, clave_respaldo, datos):
+    """Guarda una respuesta 200 como respaldo y, si la versión es duradera, en la caché"""
+    respaldo_resultados.guardar(clave_respaldo, {'respuesta': datos, 'guardado': datetime.now().isoformat(timespec='seconds')})
+    if clave[1] is not None:
+        cache_resultados.guardar(clave, datos)
+
+def refrescar_respaldos(endpoint):
+    """
+    Recalcula en segundo plano las respuestas servidas como obsoletas llamando a la
+    función de datos del endpoint con el user_id y los filtros guardados (sin
+    petición ni sesión). La primera hace de llamada de prueba del circuito; si
+    falla, se reprograma para cuando vuelva a estar semiabierto.
+    """
+    with _refrescos_lock:
+        pendientes = [(clave, valor) for clave, valor in _refrescos_pendientes.items() if clave[1] == endpoint]
+
+    circuito = circuitos_endpoints.obtener(endpoint)
+    refrescados = 0
+    for clave_respaldo, (func, args, por_dia) in pendientes:
+        if not circuito.permitir():
+            break
+        user_id, _, filtros = clave_respaldo
+        inicio = time.monotonic()
+        try:
+            datos, estado = func(user_id, args)
+        except Exception as e:
+            circuito.registrar_fallo()
+            print(f"⚠️  Error refrescando {endpoint}: {e}")
+            break
+        if estado >= 500:
+            circuito.registrar_fallo()
+            break
+        circuito.registrar_exito(time.monotonic() - inicio)
+        if estado == 200:
+            dia = datetime.now().date().isoformat() if por_dia else None
+            guardar_respuesta((user_id, obtener_version_datos(user_id), endpoint, filtros, dia), clave_respaldo, datos)
+            refrescados += 1
+        with _refrescos_lock:
+            _refrescos_pendientes.pop(clave_respaldo, None)
+
+    with _refrescos_lock:
+        _refrescos_programados.discard(endpoint)
+        quedan = any(clave[1] == endpoint for clave in _refrescos_pendientes)
+    if refrescados:
+        print(f"🔄 Refrescadas {refrescados} respuestas obsoletas de {endpoint}")
+    if quedan:
+        programar_refresco(endpoint, max(circuito.segundos_para_reintento(), circuito_supabase.segundos_para_reintento(), REFRESCO_MIN_ESPERA_SEGUNDOS))
+
+circuitos_endpoints = GestorCircuitos(
+    PRESUPUESTOS_CIRCUITO,
+    por_defecto={'max_fallos': 5, 'apertura_segundos': CIRCUITO_APERTURA_SEGUNDOS},
+    al_cerrar=programar_refresco
+)
+
+def responder_obsoleto(endpoint, clave_respaldo, refresco):
+    """
+    Última respuesta buena marcada como obsoleta (None si no hay ninguna). `refresco`
+    es (función de datos, args, por_dia) para recalcularla en segundo plano.
+    """
+    respaldo = respaldo_resultados.obtener(clave_respaldo)
+    if respaldo is None:
+        return None
+
+    with _refrescos_lock:
+        _refrescos_pendientes[clave_respaldo] = refresco
+    circuito = circuitos_endpoints.obtener(endpoint)
+    programar_refresco(endpoint, max(circuito.segundos_para_reintento(), circuito_supabase.segundos_para_reintento(), REFRESCO_MIN_ESPERA_SEGUNDOS))
+
+    print(f"🧊 {endpoint}: Supabase no disponible, sirviendo datos de {respaldo['guardado']}")
+    respuesta = jsonify({**respaldo['respuesta'], 'stale': True, 'stale_desde': respaldo['guardado']})
+    respuesta.headers['Warning'] = '110 - "Response is Stale"'
+    return respuesta
+
+def con_etag(respuesta, etag):
+    """ETag fuerte; el navegador guarda la respuesta pero la revalida en cada uso"""
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+def cache_por_version(endpoint, por_dia=False):
+    """
+    Decorador para endpoints JSON de solo lectura. La función decorada recibe
+    (user_id, args) y devuelve (datos, estado); el decorador resuelve el usuario de
+    la sesión (admin por defecto si no hay) y cachea la respuesta por (usuario,
+    versión de datos, endpoint, filtros normalizados). Solo se guardan las
+    respuestas 200. Con `por_dia` la clave incluye además la fecha actual
+    (respuestas con los últimos 10 días).
+
+    Las respuestas 200 llevan un ETag derivado de esa misma clave: si la petición
+    trae If-None-Match con él, se responde 304 sin consultar la base de datos ni
+    enviar el JSON.
+
+    Cada endpoint pasa además por su circuito: si está abierto o la respuesta es un
+    error 5xx, se sirve la última respuesta buena marcada con `stale` y se recalcula
+    en segundo plano, con la misma función de datos, cuando Supabase se recupera.
+    """
+    def decorador(func):
+        @wraps(func)
+        def envoltorio():
+            user_id = str(current_user.id) if current_user.is_authenticated else "00000000-0000-0000-0000-000000000001"
+            args = request.args.copy()
+            filtros = normalizar_filtros(args)
+            dia = datetime.now().date().isoformat() if por_dia else None
+            version = obtener_version_datos(user_id)
+            clave = (user_id, version, endpoint, filtros, dia)
+            clave_respaldo = (user_id, endpoint, filtros)
+            refresco = (func, args, por_dia)
+            # Sin versión duradera no hay forma de saber si lo cacheado sigue vigente
+            etag = etag_respuesta(ETAG_DESPLIEGUE, *clave) if version is not None else None
+
+            if etag and request.if_none_match.contains(etag):
+                print(f"🏷️  {endpoint}: sin cambios para usuario {user_id} (304)")
+                return con_etag(app.response_class(status=304), etag)
+
+            respuesta = cache_resultados.obtener(clave) if etag else None
+            if respuesta is not None:
+                print(f"⚡ Caché {endpoint}: acierto para usuario {user_id}")
+                return con_etag(jsonify(respuesta), etag)
+
+            circuito = circuitos_endpoints.obtener(endpoint)
+            if not circuito.permitir():
+                obsoleta = responder_obsoleto(endpoint, clave_respaldo, refresco)
+                if obsoleta is not None:
+                    return obsoleta
+                return jsonify({
+                    'success': False,
+                    'error': 'Servicio de datos no disponible temporalmente',
+                    'reintentar_en': round(circuito.segundos_para_reintento())
+                }), 503
+
+            inicio = time.monotonic()
+            try:
+                datos, estado = func(user_id, args)
+            except Exception:
+                circuito.registrar_fallo()
+                raise
+
+            if estado >= 500:
+                circuito.registrar_fallo()
+                obsoleta = responder_obsoleto(endpoint, clave_respaldo, refresco)
+                return obsoleta if obsoleta is not None else (jsonify(datos), estado)
+
+            circuito.registrar_exito(time.monotonic() - inicio)
+            respuesta_flask = jsonify(datos)
+            respuesta_flask.status_code = estado
+            if estado == 200:
+                guardar_respuesta(clave, clave_respaldo, datos)
+                if etag:
+                    con_etag(respuesta_flask, etag)
+                else:
+                    respuesta_flask.headers['Cache-Control'] = 'private, no-cache'
+            return respuesta_flask
+        return envoltorio
+    return decorador
+
+# =============================================================================
+# ESPEJO LOCAL DE RESULTADOS (SQLite)
+# =============================================================================
+
+# Directorio de los ficheros SQLite por usuario; vacío = las lecturas van a Supabase
+ESPEJO_LOCAL_DIR = os.getenv('ESPEJO_LOCAL_DIR', '').strip()
+espejo_local = EspejoLocal(
+    ESPEJO_LOCAL_DIR, repositorio,
+    solape_segundos=float(os.getenv('ESPEJO_SOLAPE_SEGUNDOS', str(SOLAPE_SEGUNDOS)))
+) if ESPEJO_LOCAL_DIR else None
+metricas_espejo = MetricasConsultas()
+
+def cliente_lectura(user_id):
+    """
+    Cliente para leer poker_results de un usuario: el espejo local (puesto al día si
+    cambió la versión de datos) o Supabase si el espejo está desactivado o todavía no
+    se ha podido copiar. Las escrituras usan siempre `supabase`.
+    """
+    if espejo_local is None:
+        return supabase
+    try:
+        espejo_local.sincronizar(user_id, obtener_version_datos(user_id))
+    except Exception as e:
+        if not espejo_local.sincronizado(user_id):
+            print(f"⚠️  No se pudo crear el espejo local de {user_id} ({e}), leyendo de Supabase")
+            return supabase
+        print(f"⚠️  No se pudo sincronizar el espejo local de {user_id} ({e}), sirviendo la última copia")
+    return espejo_local.cliente(user_id)
+
+def repositorio_lectura(user_id):
+    """Repositorio de solo lectura sobre cliente_lectura(user_id)"""
+    cliente = cliente_lectura(user_id)
+    if cliente is supabase:
+        return repositorio
+    return RepositorioPoker(cliente, max_hilos=1, metricas=metricas_espejo)
+
+# =============================================================================
+# ROLLUP DIARIO (poker_daily_rollup)
+# =============================================================================
+
+# Si el rollup no responde (p. ej. migración sin aplicar) se vuelve a probar pasado este tiempo
+ROLLUP_REINTENTO_SEGUNDOS = 300
+_rollup_no_disponible_hasta = 0.0
+
+def rollup_disponible():
+    return time.time() >= _rollup_no_disponible_hasta
+
+# Errores de PostgREST/PostgreSQL que indican que la migración no está aplicada:
+# función RPC no encontrada (PGRST202), función inexistente (42883), tabla no encontrada
+# en la caché de esquema (PGRST205) o inexistente (42P01); o que la clave no puede
+# usarla (42501: sin SUPABASE_SERVICE_KEY, las funciones son solo para service_role)
+CODIGOS_OBJETO_INEXISTENTE = {'PGRST202', 'PGRST205', '42883', '42P01', '42501'}
+
+def es_objeto_inexistente(error):
+    """True si el error indica que la función o la tabla no existe o no es accesible (no un fallo temporal)"""
+    return str(getattr(error, 'code', '') or '') in CODIGOS_OBJETO_INEXISTENTE
+
+def marcar_rollup_no_disponible(error):
+    global _rollup_no_disponible_hasta
+    _rollup_no_disponible_hasta = time.time() + ROLLUP_REINTENTO_SEGUNDOS
+    print(f"⚠️  Rollup diario no disponible ({error}), usando registros individuales durante {ROLLUP_REINTENTO_SEGUNDOS}s")
+
+# Búsqueda de informes por la columna calculada texto_busqueda (índice de trigramas);
+# sin la migración se vuelve a buscar con ilike sobre cada campo
+_busqueda_indexada_no_disponible_hasta = 0.0
+
+def busqueda_indexada_disponible():
+    return time.time() >= _busqueda_indexada_no_disponible_hasta
+
+def marcar_busqueda_indexada_no_disponible(error):
+    global _busqueda_indexada_no_disponible_hasta
+    _busqueda_indexada_no_disponible_hasta = time.time() + ROLLUP_REINTENTO_SEGUNDOS
+    print(f"⚠️  Búsqueda indexada no disponible ({error}), usando ilike por campo durante {ROLLUP_REINTENTO_SEGUNDOS}s")
+
+def filtro_busqueda(query, busqueda, indexada=False):
+    """Filtra por el término en descripción, sala, tipo de movimiento y categoría (sin distinguir mayúsculas)"""
+    if indexada:
+        return query.ilike('texto_busqueda', f'%{busqueda}%')
+    return query.or_(f'descripcion.ilike.%{busqueda}%,sala.ilike.%{busqueda}%,tipo_movimiento.ilike.%{busqueda}%,categoria.ilike.%{busqueda}%')
+
+def filas_rollup_desde_registros(registros):
+    """Da a los registros individuales la forma de filas del rollup (cantidad 1)"""
+    filas = []
+    for registro in registros:
+        importe = float(registro.get('importe') or 0)
+        filas.append({**registro, 'cantidad': 1, 'suma': importe, 'suma_ingresos': max(importe, 0.0), 'suma_egresos': min(importe, 0.0)})
+    return filas
+
+def agrupar_registros(registros, agrupadas, claves=('categoria', 'tipo_movimiento')):
+    """Suma registros individuales en `agrupadas` (clave -> fila con la forma del rollup)"""
+    for registro in registros:
+        importe = float(registro.get('importe') or 0)
+        clave = tuple(registro.get(campo) for campo in claves)
+        fila = agrupadas.get(clave)
+        if fila is None:
+            fila = agrupadas[clave] = {**dict(zip(claves, clave)), 'cantidad': 0, 'suma': 0.0, 'suma_ingresos': 0.0, 'suma_egresos': 0.0}
+        fila['cantidad'] += 1
+        fila['suma'] += importe
+        if importe > 0:
+            fila['suma_ingresos'] += importe
+        else:
+            fila['suma_egresos'] += importe
+    return agrupadas
+
+def agregar_lotes(lotes, claves, muestras=0):
+    """
+    Pliega lotes de registros (iterar_lotes) en acumuladores: sumas por `claves`
+    (agrupar_registros), total de registros, rango de fechas y las primeras `muestras`
+    filas. Cada lote se descarta tras sumarlo, así que el resultado es exacto con
+    cualquier volumen y la memoria depende del número de grupos, no del de registros.
+    """
+    grupos = {}
+    resumen = {'registros': 0, 'fecha_min': None, 'fecha_max': None, 'muestras': []}
+    for lote in lotes:
+        agrupar_registros(lote, grupos, claves)
+        resumen['registros'] += len(lote)
+        fechas = [registro['fecha'] for registro in lote if registro.get('fecha')]
+        if fechas:
+            menor, mayor = min(fechas), max(fechas)
+            if resumen['fecha_min'] is None or menor < resumen['fecha_min']:
+                resumen['fecha_min'] = menor
+            if resumen['fecha_max'] is None or mayor > resumen['fecha_max']:
+                resumen['fecha_max'] = mayor
+        if len(resumen['muestras']) < muestras:
+            resumen['muestras'].extend(lote[:muestras - len(resumen['muestras'])])
+    return grupos, resumen
+
+def lotes_usuario(user_id, campos, nombre=None):
+    """Todos los registros del usuario por lotes, desde su fuente de lectura (espejo local o Supabase)"""
+    return repositorio_lectura(user_id).iterar_lotes('poker_results', campos, lambda q: q.eq('user_id', str(user_id)), nombre=nombre)
+
+def estadisticas_desde_sql(datos):
+    """Normaliza la respuesta de get_estadisticas_informe (NUMERIC llega como número JSON)"""
+    datos = datos or {}
+    return {
+        'torneos_jugados': int(datos.get('torneos_jugados') or 0),
+        'total_invertido': float(datos.get('total_invertido') or 0),
+        'total_ganancias': float(datos.get('total_ganancias') or 0),
+        'total_importe': float(datos.get('total_importe') or 0),
+        'roi': float(datos.get('roi') or 0),
+        'resultado_economico': float(datos.get('resultado_economico') or 0),
+        'por_categoria': {
+            categoria: {'count': int(valores['count']), 'total': float(valores['total'])}
+            for categoria, valores in (datos.get('por_categoria') or {}).items()
+        }
+    }
+
+def calcular_estadisticas_informe(filas):
+    """Estadísticas de informes a partir de filas del rollup (o registros convertidos)"""
+    torneos_jugados = 0
+    total_invertido = 0.0
+    total_ganancias = 0.0
+    total_importe = 0.0
+    resultado_economico = 0.0
+    por_categoria = {}
+
+    for fila in filas:
+        categoria = fila.get('categoria', 'Sin categoría')
+        tipo_movimiento = fila.get('tipo_movimiento')
+        cantidad = int(fila.get('cantidad') or 0)
+        suma = float(fila.get('suma') or 0)
+
+        # Torneos jugados: solo Buy In + Torneo
+        if tipo_movimiento == 'Buy In' and categoria == 'Torneo':
+            torneos_jugados += cantidad
+        # Invertido: egresos de torneos; ganancias: ingresos de torneos
+        if categoria == 'Torneo':
+            total_invertido += abs(float(fila.get('suma_egresos') or 0))
+            total_ganancias += float(fila.get('suma_ingresos') or 0)
+        total_importe += suma
+        # Resultado económico excluyendo transferencias, retiros y depósitos
+        if categoria not in ['Transferencia', 'Depósito', 'Retiro'] and tipo_movimiento not in ['Retiro']:
+            resultado_economico += suma
+
+        if categoria not in por_categoria:
+            por_categoria[categoria] = {'count': 0, 'total': 0}
+        por_categoria[categoria]['count'] += cantidad
+        por_categoria[categoria]['total'] += suma
+
+    # ROI: (ganancias - invertido) / invertido * 100
+    roi = ((total_ganancias - total_invertido) / total_invertido) * 100 if total_invertido > 0 else 0
+
+    return {
+        'torneos_jugados': torneos_jugados,
+        'total_invertido': total_invertido,
+        'total_ganancias': total_ganancias,
+        'total_importe': total_importe,
+        'roi': roi,
+        'resultado_economico': resultado_economico,
+        'por_categoria': por_categoria
+    }
+
+def calcular_resultados_diarios(filas, fechas):
+    """Resultado y número de movimientos por día (filas del rollup o registros convertidos)"""
+    por_fecha = {}
+    for fila in filas:
+        acumulado = por_fecha.setdefault(fila['fecha'], [0.0, 0])
+        acumulado[0] += float(fila.get('suma') or 0)
+        acumulado[1] += int(fila.get('cantidad') or 0)
+    return [
+        {
+            'fecha': fecha.isoformat(),
+            'resultado': por_fecha.get(fecha.isoformat(), [0.0, 0])[0],
+            'movimientos': por_fecha.get(fecha.isoformat(), [0.0, 0])[1]
+        }
+        for fecha in fechas
+    ]
+
+def dias_grafico(hoy=None, dias=10):
+    """Fechas del gráfico diario, de la más antigua a hoy"""
+    hoy = hoy or datetime.now().date()
+    return [hoy - timedelta(days=i) for i in range(dias - 1, -1, -1)]
+
+def resultados_diarios_usuario(user_id, fechas):
+    """Resultado por día leyendo solo la ventana del gráfico (rollup si está disponible)"""
+    repo = repositorio_lectura(user_id)
+    if repo is repositorio and rollup_disponible():
+        try:
+            return calcular_resultados_diarios(repo.movimientos_poker_periodo(user_id, fechas[0], fechas[-1], rollup=True), fechas)
+        except Exception as e:
+            # Solo la falta de migración pasa a los registros; el resto lo gestiona el circuito
+            if not es_objeto_inexistente(e):
+                raise
+            marcar_rollup_no_disponible(e)
+    registros = repo.movimientos_poker_periodo(user_id, fechas[0], fechas[-1])
+    return calcular_resultados_diarios(filas_rollup_desde_registros(registros), fechas)
+
+# Granularidades de /api/informes/serie (también se aceptan en inglés)
+GRANULARIDADES_SERIE = ('dia', 'semana', 'mes', 'anio')
+ALIAS_GRANULARIDAD = {'day': 'dia', 'week': 'semana', 'month': 'mes', 'year': 'anio'}
+MAX_PERIODOS_SERIE = 20000
+
+def inicio_periodo(fecha, granularidad):
+    """Primer día del periodo que contiene la fecha (semanas de lunes a domingo, como date_trunc)"""
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    if granularidad == 'anio':
+        return fecha.replace(month=1, day=1)
+    return fecha
+
+def siguiente_periodo(fecha, granularidad):
+    if granularidad == 'semana':
+        return fecha + timedelta(days=7)
+    if granularidad == 'mes':
+        return fecha.replace(year=fecha.year + 1, month=1) if fecha.month == 12 else fecha.replace(month=fecha.month + 1)
+    if granularidad == 'anio':
+        return fecha.replace(year=fecha.year + 1)
+    return fecha + timedelta(days=1)
+
+def calcular_serie_resultados(filas, granularidad, desde=None, hasta=None):
+    """
+    Misma serie que get_serie_resultados a partir de filas del rollup (o registros
+    convertidos): saldo anterior a `desde` y resultado por periodo, con los periodos vacíos
+    """
+    return calcular_serie_por_lotes([filas], granularidad, desde, hasta)
+
+def calcular_serie_por_lotes(lotes, granularidad, desde=None, hasta=None):
+    """
+    calcular_serie_resultados sobre lotes (iterar_movimientos_poker_periodo): cada lote se
+    suma por día y se descarta, así que la memoria depende del número de días, no del de filas
+    """
+    por_dia = {}
+    for lote in lotes:
+        for fila in lote:
+            acumulado = por_dia.setdefault(str(fila['fecha'])[:10], [0.0, 0])
+            acumulado[0] += float(fila.get('suma') or 0)
+            acumulado[1] += int(fila.get('cantidad') or 0)
+
+    fechas = {datetime.strptime(dia, '%Y-%m-%d').date(): valores for dia, valores in por_dia.items()}
+    if hasta is None and fechas:
+        hasta = max(fechas)
+    if desde is None and fechas:
+        desde = min(fechas)
+
+    saldo_inicial = 0.0
+    por_periodo = {}
+    for fecha, (suma, cantidad) in fechas.items():
+        if hasta is not None and fecha > hasta:
+            continue
+        if fecha < desde:
+            saldo_inicial += suma
+            continue
+        acumulado = por_periodo.setdefault(inicio_periodo(fecha, granularidad), [0.0, 0])
+        acumulado[0] += suma
+        acumulado[1] += cantidad
+
+    periodos = []
+    if desde is not None and hasta is not None:
+        periodo = inicio_periodo(desde, granularidad)
+        while periodo <= hasta:
+            resultado, movimientos = por_periodo.get(periodo, (0.0, 0))
+            periodos.append({'periodo': periodo.isoformat(), 'resultado': resultado, 'movimientos': movimientos})
+            periodo = siguiente_periodo(periodo, granularidad)
+    return {'saldo_inicial': saldo_inicial, 'periodos': periodos}
+
+def acumular_serie(serie):
+    """Añade el bankroll acumulado (saldo inicial + resultados) al final de cada periodo"""
+    acumulado = float(serie.get('saldo_inicial') or 0)
+    periodos = []
+    for periodo in serie.get('periodos') or []:
+        resultado = float(periodo['resultado'])
+        acumulado += resultado
+        periodos.append({
+            'periodo': str(periodo['periodo'])[:10],
+            'resultado': resultado,
+            'movimientos': int(periodo['movimientos']),
+            'acumulado': acumulado
+        })
+    return {'saldo_inicial': float(serie.get('saldo_inicial') or 0), 'periodos': periodos}
+
+def serie_resultados_usuario(user_id, granularidad, desde=None, hasta=None):
+    """Serie de resultados del usuario: agregada en SQL sobre el rollup o, si no está, en Python"""
+    repo = repositorio_lectura(user_id)
+    if repo is repositorio and rollup_disponible():
+        try:
+            return acumular_serie(repo.rpc('get_serie_resultados', {
+                'user_id_param': str(user_id),
+                'granularidad_param': granularidad,
+                'fecha_inicio_param': desde.isoformat() if desde else None,
+                'fecha_fin_param': hasta.isoformat() if hasta else None
+            }) or {})
+        except Exception as e:
+            # Solo la falta de migración pasa a los registros; el resto lo gestiona el circuito
+            if not es_objeto_inexistente(e):
+                raise
+            marcar_rollup_no_disponible(e)
+    # Cada página de registros se suma por día en cuanto llega, sin juntar el historial en memoria
+    lotes = (filas_rollup_desde_registros(lote) for lote in repo.iterar_movimientos_poker_periodo(user_id, None, hasta))
+    return acumular_serie(calcular_serie_por_lotes(lotes, granularidad, desde, hasta))
+
+def reconstruir_rollup_diario(user_id=None):
+    """Regenera el rollup diario (de un usuario o de todos) e invalida las cachés afectadas"""
+    filas = repositorio.reconstruir_rollup(user_id)
+    usuarios = [user_id] if user_id else [usuario['id'] for usuario in repositorio.listar_usuarios_admin()]
+    for usuario in usuarios:
+        incrementar_version_datos(usuario)
+    print(f"🧮 Rollup diario reconstruido: {filas} filas ({'usuario ' + str(user_id) if user_id else 'todos los usuarios'})")
+    return {'filas': filas, 'usuarios': len(usuarios)}
+
+def verificar_rollup_diario(user_id=None):
+    """Compara el rollup con poker_results y devuelve los grupos que no coinciden"""
+    diferencias = repositorio.verificar_rollup(user_id)
+    print(f"🧮 Verificación del rollup diario: {len(diferencias)} grupos con diferencias")
+    return {'consistente': not diferencias, 'diferencias': diferencias}
+
+# =============================================================================
+# FILTROS DE INFORMES
+# =============================================================================
+
+def filtros_informe(args):
+    """Filtros de la petición: listas (`salas[]` o `sala`), fechas y búsqueda"""
+    filtros = {}
+    for parametro, columna in FILTROS_LISTA.items():
+        valores = args.getlist(f'{parametro}[]') or [args.get(columna, '')]
+        filtros[parametro] = [v for v in valores if v]  # Filtrar valores vacíos
+    filtros['fecha_inicio'] = args.get('fecha_inicio', '')
+    filtros['fecha_fin'] = args.get('fecha_fin', '')
+    filtros['busqueda'] = args.get('busqueda', '').strip()
+    return filtros
+
+def aplicar_filtros_informe(query, filtros, busqueda_indexada=False):
+    """Aplica los filtros de informes a una consulta"""
+    for parametro, columna in FILTROS_LISTA.items():
+        if filtros[parametro]:
+            query = query.in_(columna, filtros[parametro])
+    if filtros['fecha_inicio']:
+        query = query.gte('fecha', filtros['fecha_inicio'])
+    if filtros['fecha_fin']:
+        query = query.lte('fecha', filtros['fecha_fin'])
+    if filtros['busqueda']:
+        query = filtro_busqueda(query, filtros['busqueda'], busqueda_indexada)
+    return query
+
+# =============================================================================
+# PAGINACIÓN POR CURSOR (tabla de informes)
+# =============================================================================
+
+def codificar_cursor(registro, anterior=False):
+    """Token opaco con la posición (fecha, id) de un registro y el sentido de la página pedida"""
+    posicion = json.dumps([str(registro['fecha'])[:10], str(registro['id']), 'a' if anterior else 's'], separators=(',', ':'))
+    return base64.urlsafe_b64encode(posicion.encode()).decode().rstrip('=')
+
+def decodificar_cursor(token):
+    """Devuelve (fecha, id, anterior) de un token; ValueError si no es válido"""
+    try:
+        fecha, registro_id, sentido = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        datetime.strptime(fecha, '%Y-%m-%d')
+        registro_id = str(uuid.UUID(registro_id))
+    except Exception:
+        raise ValueError('Cursor de paginación no válido')
+    if sentido not in ('s', 'a'):
+        raise ValueError('Cursor de paginación no válido')
+    return fecha, registro_id, sentido == 'a'
+
+def recortar_pagina(filas, por_pagina, anterior=False, desde_cursor=False, desplazamiento=0):
+    """
+    Recibe hasta por_pagina + 1 filas en orden (fecha DESC, id DESC); la fila de más
+    indica si hay otra página en ese sentido. Devuelve (filas, has_next, has_prev,
+    cursor_siguiente, cursor_anterior).
+    """
+    hay_mas = len(filas) > por_pagina
+    if anterior:
+        # Hacia atrás la fila de más es la más alejada del cursor: la primera
+        filas = filas[-por_pagina:] if hay_mas else filas
+        has_next, has_prev = True, hay_mas
+    else:
+        filas = filas[:por_pagina]
+        has_next, has_prev = hay_mas, desde_cursor or desplazamiento > 0
+    cursor_siguiente = codificar_cursor(filas[-1]) if has_next and filas else None
+    cursor_anterior = codificar_cursor(filas[0], anterior=True) if has_prev and filas else None
+    return filas, has_next, has_prev, cursor_siguiente, cursor_anterior
+
 # Configurar Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -443,12 +1236,10 @@ def admin():
     
     try:
         # Obtener todos los usuarios
-        users_response = supabase.table('users').select('*').execute()
-        users = users_response.data if users_response.data else []
+        users = repositorio.listar_usuarios_admin()
         
-        # Obtener estadísticas
-        stats_response = supabase.table('poker_results').select('*').execute()
-        total_records = len(stats_response.data) if stats_response.data else 0
+        # Obtener estadísticas (conteo en el servidor, sin traer filas)
+        total_records = repositorio.contar_registros_totales()
         
         return render_template('admin.html', users=users, total_records=total_records)
     except Exception as e:
@@ -465,46 +1256,14 @@ def importar():
 @app.route('/analisis')
 def analisis():
     """Página de análisis"""
-    try:
-        # Usar usuario admin por defecto si no hay sesión
-        if current_user.is_authenticated:
-            user_id = str(current_user.id)
-            print(f"🔍 Usuario autenticado para análisis: {user_id}")
-        else:
-            user_id = "00000000-0000-0000-0000-000000000001"  # Usuario admin por defecto
-            print(f"🔍 Usando usuario por defecto para análisis: {user_id}")
-        
-        # Obtener datos del usuario
-        user_data = supabase.table('poker_results').select('*').eq('user_id', user_id).execute()
-        records = user_data.data if user_data.data else []
-        
-        return render_template('analisis.html', records=records)
-    except Exception as e:
-        flash('Error al cargar datos de análisis.', 'error')
-        print(f"Error en análisis: {e}")
-        return render_template('analisis.html', records=[])
+    # La plantilla carga los datos desde la API; no hace falta consultar registros aquí
+    return render_template('analisis.html')
 
 @app.route('/informes')
 def informes():
     """Página de informes"""
-    try:
-        # Usar usuario admin por defecto si no hay sesión
-        if current_user.is_authenticated:
-            user_id = str(current_user.id)
-            print(f"🔍 Usuario autenticado para informes: {user_id}")
-        else:
-            user_id = "00000000-0000-0000-0000-000000000001"  # Usuario admin por defecto
-            print(f"🔍 Usando usuario por defecto para informes: {user_id}")
-        
-        # Obtener datos del usuario
-        user_data = supabase.table('poker_results').select('*').eq('user_id', user_id).execute()
-        records = user_data.data if user_data.data else []
-        
-        return render_template('informes.html', records=records)
-    except Exception as e:
-        flash('Error al cargar datos de informes.', 'error')
-        print(f"Error en informes: {e}")
-        return render_template('informes.html', records=[])
+    # La plantilla carga los datos desde la API; no hace falta consultar registros aquí
+    return render_template('informes.html')
 
 # Funciones auxiliares para procesamiento de archivos (restauradas del código original)
 def generar_hash_duplicado(fecha, hora, payment_method, descripcion, money_in, money_out, sala):
@@ -512,6 +1271,14 @@ def generar_hash_duplicado(fecha, hora, payment_method, descripcion, money_in, m
     contenido = f"{fecha}_{hora}_{payment_method}_{descripcion}_{money_in}_{money_out}_{sala}"
     return hashlib.sha256(contenido.encode()).hexdigest()
 
+# Versión del conjunto de reglas de clasificación (categorizar_movimiento, clasificar_nivel_buyin
+# y herencias desde el Buy In). Incrementarla al cambiar cualquier regla: la recategorización
+# solo recalcula los registros con una versión anterior.
+CLASIFICADOR_VERSION = 1
+# Versión con la que se insertan las importaciones: las herencias desde el Buy In aún no se
+# han aplicado, así que la reclasificación diferida (o la recategorización) las recalcula
+CLASIFICADOR_VERSION_PENDIENTE = 0
+
 def categorizar_movimiento(payment_category, payment_method, description):
     """Categoriza automáticamente los movimientos basándose en los datos de WPN - VERSIÓN SQLITE"""
     
@@ -696,44 +1463,39 @@ def categorizar_movimiento_pokerstars(action, game, tournament_id):
     
     return categoria, tipo_movimiento, tipo_juego
 
+# Movimientos de torneo que heredan nivel de buy-in y tipo de juego de su Buy In
+TIPOS_MOVIMIENTO_HIJOS = ['Bounty', 'Winnings', 'Sit & Crush Jackpot', 'Fee', 'Reentry Fee', 'Reentry Buy In', 'Unregister Buy In', 'Unregister Fee', 'Tournament Rebuy', 'Ticket']
+
+# Columnas que usan las rutinas de reclasificación automática
+CAMPOS_RECLASIFICACION = 'id, descripcion, importe, tipo_movimiento, tipo_juego, nivel_buyin'
+
 def reclasificar_niveles_buyin_automatica(user_id):
     """Reclasifica automáticamente los niveles de buy-in para registros de torneos - VERSIÓN MEJORADA"""
     try:
         print(f"🔄 Iniciando reclasificación de niveles de buy-in para usuario {user_id}")
         
         # Obtener todos los registros de torneos con Buy In que ya tienen nivel_buyin
-        buyins_clasificados = ejecutar_con_reintentos(
-            lambda: supabase.table('poker_results').select('*').eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').not_.is_('nivel_buyin', 'null').eq('user_id', str(user_id)).execute()
+        buyins_clasificados = leer_registros_keyset(
+            'poker_results', CAMPOS_RECLASIFICACION,
+            lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').not_.is_('nivel_buyin', 'null')
         )
         
-        if not buyins_clasificados.data:
+        if not buyins_clasificados:
             print("⚠️  No se encontraron registros Buy In clasificados")
             return 0
         
-        print(f"📊 Encontrados {len(buyins_clasificados.data)} registros Buy In clasificados")
+        print(f"📊 Encontrados {len(buyins_clasificados)} registros Buy In clasificados")
         
         # Obtener registros de torneos sin clasificar (todos los tipos de movimiento de torneos)
-        # Procesar en lotes para evitar límites de Supabase
+        # Procesar en lotes (keyset sobre user_id, id) para evitar límites de Supabase
         registros_sin_clasificar = []
-        offset = 0
-        batch_size = 1000
         
-        while True:
-            batch = ejecutar_con_reintentos(
-                lambda: supabase.table('poker_results').select('*').eq('categoria', 'Torneo').in_('tipo_movimiento', ['Bounty', 'Winnings', 'Sit & Crush Jackpot', 'Fee', 'Reentry Fee', 'Reentry Buy In', 'Unregister Buy In', 'Unregister Fee', 'Tournament Rebuy', 'Ticket']).is_('nivel_buyin', 'null').eq('user_id', str(user_id)).range(offset, offset + batch_size - 1).execute()
-            )
-            
-            if not batch.data:
-                break
-                
-            registros_sin_clasificar.extend(batch.data)
-            offset += batch_size
-            
-            print(f"📊 Procesando lote: {len(batch.data)} registros (total acumulado: {len(registros_sin_clasificar)})")
-            
-            # Si obtenemos menos registros que el tamaño del lote, hemos terminado
-            if len(batch.data) < batch_size:
-                break
+        for lote in iterar_lotes_keyset(
+            'poker_results', CAMPOS_RECLASIFICACION,
+            lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').in_('tipo_movimiento', TIPOS_MOVIMIENTO_HIJOS).is_('nivel_buyin', 'null')
+        ):
+            registros_sin_clasificar.extend(lote)
+            print(f"📊 Procesando lote: {len(lote)} registros (total acumulado: {len(registros_sin_clasificar)})")
         
         if not registros_sin_clasificar:
             print("⚠️  No se encontraron registros sin clasificar")
@@ -746,7 +1508,7 @@ def reclasificar_niveles_buyin_automatica(user_id):
         torneo_id_nivel = {}     # ID torneo -> nivel_buyin
         patron_nivel = {}        # Patrón de descripción -> nivel_buyin
         
-        for buyin in buyins_clasificados.data:
+        for buyin in buyins_clasificados:
             descripcion = buyin['descripcion']
             nivel = buyin['nivel_buyin']
             
@@ -768,7 +1530,7 @@ def reclasificar_niveles_buyin_automatica(user_id):
                     patron = descripcion[:ultimo_dolar].strip()
                     patron_nivel[patron] = nivel
         
-        reclasificados = 0
+        cambios_por_id = {}
         
         for registro in registros_sin_clasificar:
             try:
@@ -805,18 +1567,14 @@ def reclasificar_niveles_buyin_automatica(user_id):
                     print(f"✅ Clasificado por importe: {registro['importe']} -> {nivel_buyin}")
                 
                 if nivel_buyin:
-                    # Actualizar registro en Supabase (simple, sin reintentos complejos)
-                    try:
-                        supabase.table('poker_results').update({'nivel_buyin': nivel_buyin}).eq('id', registro['id']).execute()
-                        reclasificados += 1
-                    except Exception as e:
-                        print(f"⚠️  Error actualizando registro {registro['id']}: {e}")
-                        continue
+                    cambios_por_id[registro['id']] = {'nivel_buyin': nivel_buyin}
                     
             except Exception as e:
                 print(f"❌ Error reclasificando registro {registro['id']}: {e}")
                 continue
         
+        # Una actualización por nivel en lugar de una petición por registro
+        reclasificados = repositorio.actualizar_agrupados(cambios_por_id, nombre='resultados.reclasificar_nivel', tamano_lote=LOTE_ACTUALIZACION_IDS)
         print(f"✅ Reclasificación completada: {reclasificados} registros actualizados")
         return reclasificados
         
@@ -830,20 +1588,21 @@ def reclasificar_pokerstars_automatica(user_id):
         print(f"🔄 Iniciando reclasificación específica de Pokerstars para usuario {user_id}")
         
         # Obtener todos los registros Buy In de Pokerstars que tienen nivel_buyin y tipo_juego clasificados
-        buyins_pokerstars = ejecutar_con_reintentos(
-            lambda: supabase.table('poker_results').select('*').eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').eq('sala', 'Pokerstars').not_.is_('nivel_buyin', 'null').neq('tipo_juego', 'Torneo').eq('user_id', str(user_id)).execute()
+        buyins_pokerstars = leer_registros_keyset(
+            'poker_results', CAMPOS_RECLASIFICACION,
+            lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').eq('sala', 'Pokerstars').not_.is_('nivel_buyin', 'null').neq('tipo_juego', 'Torneo')
         )
         
-        if not buyins_pokerstars.data:
+        if not buyins_pokerstars:
             print("⚠️  No se encontraron registros Buy In de Pokerstars clasificados")
             return 0
         
-        print(f"📊 Encontrados {len(buyins_pokerstars.data)} registros Buy In de Pokerstars clasificados")
+        print(f"📊 Encontrados {len(buyins_pokerstars)} registros Buy In de Pokerstars clasificados")
         
         # Crear diccionarios de mapeo para Pokerstars
         pokerstars_mapping = {}  # tournament_id -> {nivel_buyin, tipo_juego}
         
-        for buyin in buyins_pokerstars.data:
+        for buyin in buyins_pokerstars:
             descripcion = buyin['descripcion']
             # Extraer tournament_id de la descripción de Pokerstars
             # Formato: "tournament_id game_description"
@@ -864,11 +1623,10 @@ def reclasificar_pokerstars_automatica(user_id):
         registros_sin_clasificar = []
         for tipo_mov in tipos_a_reclasificar:
             try:
-                batch = ejecutar_con_reintentos(
-                    lambda: supabase.table('poker_results').select('*').eq('categoria', 'Torneo').eq('tipo_movimiento', tipo_mov).eq('sala', 'Pokerstars').eq('user_id', str(user_id)).execute()
-                )
-                if batch.data:
-                    registros_sin_clasificar.extend(batch.data)
+                registros_sin_clasificar.extend(leer_registros_keyset(
+                    'poker_results', CAMPOS_RECLASIFICACION,
+                    lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').eq('tipo_movimiento', tipo_mov).eq('sala', 'Pokerstars')
+                ))
             except Exception as e:
                 print(f"❌ Error obteniendo registros {tipo_mov}: {e}")
                 continue
@@ -879,7 +1637,7 @@ def reclasificar_pokerstars_automatica(user_id):
         
         print(f"📊 Encontrados {len(registros_sin_clasificar)} registros de Pokerstars para reclasificar")
         
-        reclasificados = 0
+        cambios_por_id = {}
         for registro in registros_sin_clasificar:
             try:
                 descripcion = registro['descripcion']
@@ -904,29 +1662,21 @@ def reclasificar_pokerstars_automatica(user_id):
                         
                         # Aplicar actualizaciones si hay cambios
                         if updates:
-                            try:
-                                supabase.table('poker_results').update(updates).eq('id', registro['id']).execute()
-                                reclasificados += 1
-                                print(f"✅ Pokerstars reclasificado: {registro['tipo_movimiento']} (Torneo: {tournament_id}) -> {updates}")
-                            except Exception as e:
-                                print(f"⚠️  Error actualizando registro Pokerstars {registro['id']}: {e}")
-                                continue
+                            cambios_por_id[registro['id']] = updates
+                            print(f"✅ Pokerstars reclasificado: {registro['tipo_movimiento']} (Torneo: {tournament_id}) -> {updates}")
                     else:
                         # Si no encontramos el tournament_id, intentar clasificar por importe para nivel_buyin
                         if not registro.get('nivel_buyin') or registro.get('nivel_buyin') == 'null':
-                            try:
-                                nivel_calculado = clasificar_nivel_buyin(registro['importe'])
-                                supabase.table('poker_results').update({'nivel_buyin': nivel_calculado}).eq('id', registro['id']).execute()
-                                reclasificados += 1
-                                print(f"✅ Pokerstars clasificado por importe: {registro['tipo_movimiento']} -> nivel: {nivel_calculado}")
-                            except Exception as e:
-                                print(f"⚠️  Error clasificando por importe {registro['id']}: {e}")
-                                continue
+                            nivel_calculado = clasificar_nivel_buyin(registro['importe'])
+                            cambios_por_id[registro['id']] = {'nivel_buyin': nivel_calculado}
+                            print(f"✅ Pokerstars clasificado por importe: {registro['tipo_movimiento']} -> nivel: {nivel_calculado}")
                                 
             except Exception as e:
                 print(f"❌ Error procesando registro Pokerstars {registro['id']}: {e}")
                 continue
         
+        # Registros con los mismos cambios en una sola actualización
+        reclasificados = repositorio.actualizar_agrupados(cambios_por_id, nombre='resultados.reclasificar_pokerstars', tamano_lote=LOTE_ACTUALIZACION_IDS)
         print(f"✅ Reclasificación de Pokerstars completada: {reclasificados} registros actualizados")
         return reclasificados
         
@@ -938,24 +1688,30 @@ def reclasificar_tipos_juego_automatica(user_id):
     """Reclasifica automáticamente los tipos de juego para registros relacionados - VERSIÓN SQLITE"""
     try:
         # Obtener todos los registros Buy In con tipo de juego específico
-        buyins_clasificados = supabase.table('poker_results').select('*').eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').neq('tipo_juego', 'Torneo').eq('user_id', str(user_id)).execute()
+        buyins_clasificados = leer_registros_keyset(
+            'poker_results', CAMPOS_RECLASIFICACION,
+            lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').eq('tipo_movimiento', 'Buy In').neq('tipo_juego', 'Torneo')
+        )
         
-        if not buyins_clasificados.data:
+        if not buyins_clasificados:
             return 0
         
         # Crear diccionario de descripción -> tipo_juego para búsqueda rápida
         descripcion_tipo_juego = {}
-        for buyin in buyins_clasificados.data:
+        for buyin in buyins_clasificados:
             descripcion_tipo_juego[buyin['descripcion']] = buyin['tipo_juego']
         
         # Obtener registros que necesitan reclasificación (solo los que tienen tipo genérico)
-        registros_sin_clasificar = supabase.table('poker_results').select('*').eq('categoria', 'Torneo').in_('tipo_movimiento', ['Reentry Buy In', 'Winnings', 'Bounty', 'Fee', 'Reentry Fee', 'Unregister Buy In', 'Unregister Fee', 'Sit & Crush Jackpot', 'Tournament Rebuy', 'Ticket']).eq('tipo_juego', 'Torneo').eq('user_id', str(user_id)).execute()
+        registros_sin_clasificar = leer_registros_keyset(
+            'poker_results', CAMPOS_RECLASIFICACION,
+            lambda q: q.eq('user_id', str(user_id)).eq('categoria', 'Torneo').in_('tipo_movimiento', TIPOS_MOVIMIENTO_HIJOS).eq('tipo_juego', 'Torneo')
+        )
         
-        if not registros_sin_clasificar.data:
+        if not registros_sin_clasificar:
             return 0
         
-        reclasificados = 0
-        for registro in registros_sin_clasificar.data:
+        cambios_por_id = {}
+        for registro in registros_sin_clasificar:
             try:
                 tipo_juego = None
                 
@@ -975,25 +1731,380 @@ def reclasificar_tipos_juego_automatica(user_id):
                                 break
                 
                 if tipo_juego:
-                    # Actualizar registro en Supabase (simple, sin reintentos complejos)
-                    try:
-                        supabase.table('poker_results').update({'tipo_juego': tipo_juego}).eq('id', registro['id']).execute()
-                        reclasificados += 1
-                    except Exception as e:
-                        print(f"⚠️  Error actualizando registro {registro['id']}: {e}")
-                        continue
+                    cambios_por_id[registro['id']] = {'tipo_juego': tipo_juego}
                     print(f"✅ Reclasificado: {registro['tipo_movimiento']} -> {tipo_juego}")
                     
             except Exception as e:
                 print(f"Error reclasificando tipo de juego para registro {registro['id']}: {e}")
                 continue
         
-        return reclasificados
+        # Una actualización por tipo de juego en lugar de una petición por registro
+        return repositorio.actualizar_agrupados(cambios_por_id, nombre='resultados.reclasificar_tipo_juego', tamano_lote=LOTE_ACTUALIZACION_IDS)
         
     except Exception as e:
         print(f"Error en reclasificación de tipos de juego: {e}")
         return 0
 
+# =============================================================================
+# RECLASIFICACIÓN DIFERIDA (DEBOUNCE POR USUARIO)
+# =============================================================================
+
+# Segundos de espera desde la última importación antes de lanzar la reclasificación
+RECLASIFICACION_DEBOUNCE_SEGUNDOS = float(os.getenv('RECLASIFICACION_DEBOUNCE_SEGUNDOS', '10'))
+
+_reclasificacion_lock = threading.Lock()
+_reclasificacion_timers = {}     # user_id -> Timer pendiente
+_reclasificacion_salas = {}      # user_id -> salas importadas desde la última pasada
+_reclasificacion_estado = {}     # user_id -> estado visible desde la interfaz
+_reclasificacion_ejecucion = {}  # user_id -> Lock que serializa las pasadas de un usuario
+
+def programar_reclasificacion(user_id, sala):
+    """Programa la reclasificación del usuario para después de la última importación de una ráfaga"""
+    user_id = str(user_id)
+    with _reclasificacion_lock:
+        timer_anterior = _reclasificacion_timers.get(user_id)
+        if timer_anterior:
+            timer_anterior.cancel()
+
+        _reclasificacion_salas.setdefault(user_id, set()).add(sala)
+
+        timer = threading.Timer(RECLASIFICACION_DEBOUNCE_SEGUNDOS, _ejecutar_reclasificacion_diferida, args=(user_id,))
+        timer.daemon = True
+        _reclasificacion_timers[user_id] = timer
+
+        estado_anterior = _reclasificacion_estado.get(user_id, {})
+        _reclasificacion_estado[user_id] = {
+            'estado': 'pendiente',
+            'salas': sorted(_reclasificacion_salas[user_id]),
+            'programada_para': (datetime.now() + timedelta(seconds=RECLASIFICACION_DEBOUNCE_SEGUNDOS)).isoformat(),
+            'ultimo_resultado': estado_anterior.get('ultimo_resultado')
+        }
+        timer.start()
+
+    print(f"⏳ Reclasificación programada para usuario {user_id} en {RECLASIFICACION_DEBOUNCE_SEGUNDOS}s (salas: {sorted(_reclasificacion_salas[user_id])})")
+    return obtener_estado_reclasificacion(user_id)
+
+def obtener_estado_reclasificacion(user_id):
+    """Devuelve el estado de la reclasificación diferida del usuario"""
+    with _reclasificacion_lock:
+        estado = _reclasificacion_estado.get(str(user_id))
+        return dict(estado) if estado else {'estado': 'inactivo', 'ultimo_resultado': None}
+
+def _ejecutar_reclasificacion_diferida(user_id):
+    """Ejecuta una única pasada de reclasificación con todas las salas acumuladas en la ráfaga"""
+    with _reclasificacion_lock:
+        # Si el timer fue reemplazado por una importación posterior, esta pasada ya no corresponde
+        if _reclasificacion_timers.get(user_id) is not threading.current_thread():
+            return
+        del _reclasificacion_timers[user_id]
+        salas = _reclasificacion_salas.pop(user_id, set())
+        lock_usuario = _reclasificacion_ejecucion.setdefault(user_id, threading.Lock())
+
+    with lock_usuario:
+        inicio = datetime.now()
+        with _reclasificacion_lock:
+            _reclasificacion_estado[user_id] = {
+                **_reclasificacion_estado.get(user_id, {}),
+                'estado': 'ejecutando',
+                'salas': sorted(salas),
+                'iniciada': inicio.isoformat()
+            }
+
+        print(f"🔄 Iniciando reclasificación diferida para usuario {user_id} (salas: {sorted(salas)})")
+        resultado = {'salas': sorted(salas), 'pokerstars': 0, 'niveles_buyin': 0, 'tipos_juego': 0, 'versionados': 0}
+        error = None
+        try:
+            # Reclasificación específica de Pokerstars que busca el Buy In padre
+            if 'Pokerstars' in salas:
+                resultado['pokerstars'] = reclasificar_pokerstars_automatica(user_id)
+            resultado['niveles_buyin'] = reclasificar_niveles_buyin_automatica(user_id)
+            resultado['tipos_juego'] = reclasificar_tipos_juego_automatica(user_id)
+            # Los registros importados quedan con CLASIFICADOR_VERSION_PENDIENTE hasta este punto:
+            # la recategorización dirigida los recalcula con las herencias ya resueltas y les
+            # escribe la versión actual. Si el proceso se reinicia antes, siguen pendientes.
+            resultado['versionados'] = recategorizar_usuario(user_id, aplicar=True)['registros_actualizados']
+        except Exception as e:
+            error = str(e)
+            print(f"⚠️  Error en reclasificación diferida: {e}")
+
+        # Un error a mitad de pasada puede haber dejado actualizaciones parciales
+        if error or resultado['pokerstars'] or resultado['niveles_buyin'] or resultado['tipos_juego']:
+            incrementar_version_datos(user_id)
+
+        fin = datetime.now()
+        resultado['finalizada'] = fin.isoformat()
+        resultado['duracion_segundos'] = round((fin - inicio).total_seconds(), 2)
+        print(f"✅ Reclasificación diferida completada en {resultado['duracion_segundos']}s: {resultado}")
+
+        with _reclasificacion_lock:
+            # Si llegó otra importación mientras se ejecutaba, la siguiente pasada sigue pendiente
+            pendiente = user_id in _reclasificacion_timers
+            estado_actual = _reclasificacion_estado.get(user_id, {})
+            _reclasificacion_estado[user_id] = {
+                **(estado_actual if pendiente else {}),
+                'estado': 'pendiente' if pendiente else ('error' if error else 'completado'),
+                'error': error,
+                'ultimo_resultado': resultado
+            }
+
+# =============================================================================
+# RECATEGORIZACIÓN MASIVA DEL HISTORIAL
+# =============================================================================
+
+CAMPOS_CLASIFICACION = ['categoria', 'tipo_movimiento', 'tipo_juego', 'nivel_buyin']
+COLUMNAS_RECATEGORIZACION = ['id', 'sala', 'descripcion', 'importe'] + CAMPOS_CLASIFICACION + ['clasificador_version']
+
+TIPOS_MOVIMIENTO_HIJOS_POKERSTARS = ['Bounty', 'Winnings', 'Reentry Buy In', 'Fee']
+
+# Inversa del mapeo de categorizar_movimiento: tipo_movimiento guardado -> método de pago de WPN
+METODO_PAGO_WPN_POR_TIPO = {
+    'Depósito': 'Deposit',
+    'Retiro': 'Withdrawal',
+    'Bonus': 'Achievements',
+    'Puntos': 'Points Exchange',
+    'Transferencia': 'Player2Player'
+}
+
+# Tamaño de los lotes de ids en las actualizaciones agrupadas (limitado por la longitud de la URL)
+LOTE_ACTUALIZACION_IDS = 200
+
+def clasificar_niveles_buyin_vectorizado(importes):
+    """Versión vectorizada de clasificar_nivel_buyin para una columna de importes"""
+    valores = np.abs(np.asarray(importes, dtype=float))
+    return np.select([valores < 5, valores < 25, valores < 100], ['Micro', 'Bajo', 'Medio'], default='Alto')
+
+def calcular_recategorizacion(registros):
+    """
+    Vuelve a ejecutar los clasificadores vigentes sobre un conjunto de registros de un usuario.
+    Trabaja por columnas: el clasificador de WPN se ejecuta una vez por combinación única de
+    (tipo_movimiento, descripcion) y las herencias desde el Buy In se resuelven con mapeos.
+    Devuelve un DataFrame con los valores actuales y las columnas `<campo>_nuevo`.
+    """
+    df = pd.DataFrame.from_records(registros, columns=COLUMNAS_RECATEGORIZACION)
+    if df.empty:
+        return df
+
+    df['descripcion'] = df['descripcion'].fillna('').astype(str)
+    df['importe'] = pd.to_numeric(df['importe'], errors='coerce').fillna(0.0)
+    df = df.astype({campo: object for campo in CAMPOS_CLASIFICACION})
+    df = df.where(df.notna(), None)
+    for campo in CAMPOS_CLASIFICACION:
+        df[f'{campo}_nuevo'] = df[campo]
+
+    # 1. Clasificador base de WPN (los tipos 'Otro' no permiten recuperar el método de pago original)
+    es_wpn = (df['sala'] == 'WPN') & (df['tipo_movimiento'] != 'Otro')
+    if es_wpn.any():
+        claves = df.loc[es_wpn, ['tipo_movimiento', 'descripcion']]
+        clasificados = {}
+        for tipo, descripcion in claves.drop_duplicates().itertuples(index=False):
+            metodo_pago = METODO_PAGO_WPN_POR_TIPO.get(tipo, tipo)
+            clasificados[(tipo, descripcion)] = categorizar_movimiento(determinar_categoria_pago(metodo_pago), metodo_pago, descripcion)
+        tabla = pd.DataFrame(list(clasificados.values()), index=pd.MultiIndex.from_tuples(list(clasificados.keys())),
+                             columns=['categoria_nuevo', 'tipo_movimiento_nuevo', 'tipo_juego_nuevo'])
+        valores = tabla.reindex(pd.MultiIndex.from_frame(claves))
+        for columna in tabla.columns:
+            df.loc[es_wpn, columna] = valores[columna].to_numpy()
+        # En WPN solo los Buy In reciben nivel en la importación; el resto lo hereda
+        df.loc[es_wpn, 'nivel_buyin_nuevo'] = None
+
+    es_torneo = df['categoria_nuevo'] == 'Torneo'
+    es_buyin = es_torneo & (df['tipo_movimiento_nuevo'] == 'Buy In')
+    df.loc[es_buyin, 'nivel_buyin_nuevo'] = clasificar_niveles_buyin_vectorizado(df.loc[es_buyin, 'importe'])
+
+    # Claves de búsqueda derivadas de la descripción: ID de torneo y patrón sin el precio final
+    partes = df['descripcion'].str.split(' ', n=1)
+    df['torneo_id'] = partes.str[0]
+    tiene_id = partes.str.len() > 1
+    con_patron = df['descripcion'].str.contains(' $', regex=False) & (df['descripcion'].str.count(r'\$') >= 2)
+    df['patron'] = None
+    df.loc[con_patron, 'patron'] = df.loc[con_patron, 'descripcion'].str.rsplit('$', n=1).str[0].str.strip()
+
+    # 2. Herencia específica de Pokerstars desde el Buy In padre
+    buyins_ps = es_buyin & (df['sala'] == 'Pokerstars') & df['nivel_buyin_nuevo'].notna() & (df['tipo_juego_nuevo'] != 'Torneo')
+    mapa_ps = df[buyins_ps].drop_duplicates('torneo_id', keep='last').set_index('torneo_id')
+    hijos_ps = es_torneo & (df['sala'] == 'Pokerstars') & df['tipo_movimiento_nuevo'].isin(TIPOS_MOVIMIENTO_HIJOS_POKERSTARS)
+    en_mapa = hijos_ps & df['torneo_id'].isin(mapa_ps.index)
+    sin_nivel = df['nivel_buyin_nuevo'].isna()
+    df.loc[en_mapa & sin_nivel, 'nivel_buyin_nuevo'] = df.loc[en_mapa & sin_nivel, 'torneo_id'].map(mapa_ps['nivel_buyin_nuevo'])
+    generico = df['tipo_juego_nuevo'].isna() | (df['tipo_juego_nuevo'] == 'Torneo')
+    df.loc[en_mapa & generico, 'tipo_juego_nuevo'] = df.loc[en_mapa & generico, 'torneo_id'].map(mapa_ps['tipo_juego_nuevo'])
+    fuera_mapa = hijos_ps & ~en_mapa & df['nivel_buyin_nuevo'].isna()
+    df.loc[fuera_mapa, 'nivel_buyin_nuevo'] = clasificar_niveles_buyin_vectorizado(df.loc[fuera_mapa, 'importe'])
+
+    # 3. Herencia general del nivel de buy-in: descripción exacta, ID de torneo, patrón y, por último, importe
+    hijos = es_torneo & df['tipo_movimiento_nuevo'].isin(TIPOS_MOVIMIENTO_HIJOS)
+    buyins_con_nivel = df[es_buyin & df['nivel_buyin_nuevo'].notna()]
+    pendientes = hijos & df['nivel_buyin_nuevo'].isna()
+    if pendientes.any():
+        nivel = df.loc[pendientes, 'descripcion'].map(buyins_con_nivel.drop_duplicates('descripcion', keep='last').set_index('descripcion')['nivel_buyin_nuevo'])
+        por_id = buyins_con_nivel[tiene_id[buyins_con_nivel.index]].drop_duplicates('torneo_id', keep='last').set_index('torneo_id')['nivel_buyin_nuevo']
+        nivel = nivel.fillna(df.loc[pendientes, 'torneo_id'].where(tiene_id[pendientes]).map(por_id))
+        por_patron = buyins_con_nivel.dropna(subset=['patron']).drop_duplicates('patron', keep='last').set_index('patron')['nivel_buyin_nuevo']
+        nivel = nivel.fillna(df.loc[pendientes, 'patron'].map(por_patron))
+        nivel = nivel.fillna(pd.Series(clasificar_niveles_buyin_vectorizado(df.loc[pendientes, 'importe']), index=nivel.index))
+        df.loc[pendientes, 'nivel_buyin_nuevo'] = nivel
+
+    # 4. Herencia general del tipo de juego para movimientos con tipo genérico
+    buyins_con_juego = df[es_buyin & (df['tipo_juego_nuevo'] != 'Torneo')]
+    pendientes = hijos & (df['tipo_juego_nuevo'] == 'Torneo')
+    if pendientes.any() and not buyins_con_juego.empty:
+        tipo_juego = df.loc[pendientes, 'descripcion'].map(buyins_con_juego.drop_duplicates('descripcion', keep='last').set_index('descripcion')['tipo_juego_nuevo'])
+        por_id = buyins_con_juego.drop_duplicates('torneo_id', keep='first').set_index('torneo_id')['tipo_juego_nuevo']
+        tipo_juego = tipo_juego.fillna(df.loc[pendientes, 'torneo_id'].where(tiene_id[pendientes]).map(por_id))
+        df.loc[pendientes, 'tipo_juego_nuevo'] = tipo_juego.fillna('Torneo')
+
+    df = df.drop(columns=['torneo_id', 'patron'])
+    return df.where(df.notna(), None)
+
+def resumir_recategorizacion(df, max_transiciones=50):
+    """
+    Resume los cambios de un DataFrame de calcular_recategorizacion: conteos por campo y transiciones.
+    Devuelve además la máscara de registros a escribir (con cambios o con una versión de clasificador anterior).
+    """
+    if df.empty:
+        return pd.Series(dtype=bool), {'registros_analizados': 0, 'registros_con_cambios': 0, 'registros_desactualizados': 0, 'cambios_por_campo': {}, 'transiciones': []}
+
+    nuevos = [f'{campo}_nuevo' for campo in CAMPOS_CLASIFICACION]
+    antes = df[CAMPOS_CLASIFICACION].fillna('∅')
+    despues = df[nuevos].fillna('∅')
+    despues.columns = CAMPOS_CLASIFICACION
+    difiere = antes.ne(despues)
+    cambiados = difiere.any(axis=1)
+
+    transiciones = []
+    if cambiados.any():
+        claves = pd.concat([antes[cambiados].add_suffix('_antes'), despues[cambiados].add_suffix('_despues')], axis=1)
+        conteo = claves.value_counts().head(max_transiciones)
+        for valores, registros in conteo.items():
+            valores = [None if v == '∅' else v for v in valores]
+            transiciones.append({
+                'antes': dict(zip(CAMPOS_CLASIFICACION, valores[:len(CAMPOS_CLASIFICACION)])),
+                'despues': dict(zip(CAMPOS_CLASIFICACION, valores[len(CAMPOS_CLASIFICACION):])),
+                'registros': int(registros)
+            })
+
+    desactualizados = pd.to_numeric(df['clasificador_version'], errors='coerce').fillna(0) < CLASIFICADOR_VERSION
+
+    return cambiados | desactualizados, {
+        'registros_analizados': int(len(df)),
+        'registros_con_cambios': int(cambiados.sum()),
+        'registros_desactualizados': int(desactualizados.sum()),
+        'cambios_por_campo': {campo: int(difiere[campo].sum()) for campo in CAMPOS_CLASIFICACION},
+        'transiciones': transiciones
+    }
+
+def aplicar_recategorizacion(df, a_actualizar):
+    """Aplica los cambios agrupando los registros por sus nuevos valores en actualizaciones masivas"""
+    nuevos = [f'{campo}_nuevo' for campo in CAMPOS_CLASIFICACION]
+    actualizados = 0
+    grupos = df[a_actualizar].fillna({columna: '∅' for columna in nuevos}).groupby(nuevos, sort=False)['id']
+
+    for valores, ids in grupos:
+        cambios = {campo: (None if valor == '∅' else valor) for campo, valor in zip(CAMPOS_CLASIFICACION, valores)}
+        cambios['clasificador_version'] = CLASIFICADOR_VERSION
+        ids = ids.tolist()
+        actualizados += repositorio.actualizar_por_ids(ids, cambios, nombre='resultados.recategorizar', tamano_lote=LOTE_ACTUALIZACION_IDS)
+        print(f"✅ {len(ids)} registros -> {cambios}")
+
+    return actualizados
+
+def leer_registros_recategorizacion(filtros):
+    """Lee con paginación keyset las columnas necesarias para recategorizar"""
+    return leer_registros_keyset('poker_results', ', '.join(COLUMNAS_RECATEGORIZACION), filtros)
+
+def recategorizar_usuario(user_id, aplicar=False, completo=False):
+    """
+    Recategoriza el historial de un usuario; en modo simulación solo devuelve el diff.
+    Por defecto solo se recalculan los registros con clasificador_version anterior a
+    CLASIFICADOR_VERSION; con `completo` se recalcula todo el historial.
+    """
+    inicio = time.time()
+    user_id = str(user_id)
+    print(f"🔄 Recategorización {'(aplicando)' if aplicar else '(simulación)'} para usuario {user_id} - versión {CLASIFICADOR_VERSION}{' (completa)' if completo else ''}")
+
+    if completo:
+        registros = leer_registros_recategorizacion(lambda q: q.eq('user_id', user_id))
+        contexto = []
+    else:
+        registros = leer_registros_recategorizacion(lambda q: q.eq('user_id', user_id).lt('clasificador_version', CLASIFICADOR_VERSION))
+        # Los Buy In ya clasificados con la versión actual solo se leen como referencia para las herencias
+        contexto = leer_registros_recategorizacion(
+            lambda q: q.eq('user_id', user_id).eq('tipo_movimiento', 'Buy In').gte('clasificador_version', CLASIFICADOR_VERSION)
+        ) if registros else []
+    print(f"📊 {len(registros)} registros a recalcular (+{len(contexto)} Buy In de referencia) leídos en {time.time() - inicio:.1f}s")
+
+    df = calcular_recategorizacion(registros + contexto)
+    if contexto:
+        df = df.iloc[:len(registros)]
+    a_actualizar, resumen = resumir_recategorizacion(df)
+    resumen['user_id'] = user_id
+    resumen['aplicado'] = bool(aplicar)
+    resumen['registros_actualizados'] = aplicar_recategorizacion(df, a_actualizar) if aplicar and a_actualizar.any() else 0
+    if resumen['registros_actualizados']:
+        incrementar_version_datos(user_id)
+    resumen['duracion_segundos'] = round(time.time() - inicio, 2)
+
+    print(f"✅ Recategorización: {resumen['registros_con_cambios']}/{resumen['registros_analizados']} registros con cambios {resumen['cambios_por_campo']}")
+    return resumen
+
+def recategorizar_historial(user_id=None, aplicar=False, completo=False):
+    """Recategoriza el historial de un usuario o, si no se indica, el de todos los usuarios"""
+    if user_id:
+        usuarios = [str(user_id)]
+    else:
+        usuarios = [u['id'] for u in ejecutar_con_reintentos(lambda: supabase.table('users').select('id').execute()).data]
+
+    resultados = [recategorizar_usuario(uid, aplicar=aplicar, completo=completo) for uid in usuarios]
+    return {
+        'aplicado': bool(aplicar),
+        'clasificador_version': CLASIFICADOR_VERSION,
+        'usuarios': len(resultados),
+        'registros_analizados': sum(r['registros_analizados'] for r in resultados),
+        'registros_con_cambios': sum(r['registros_con_cambios'] for r in resultados),
+        'registros_desactualizados': sum(r['registros_desactualizados'] for r in resultados),
+        'registros_actualizados': sum(r['registros_actualizados'] for r in resultados),
+        'detalle': resultados
+    }
+
+# Campos de cada duplicado que se devuelven en `duplicados_detalle`
+CAMPOS_DETALLE_DUPLICADO = ['fecha', 'hora', 'tipo_movimiento', 'descripcion', 'importe', 'categoria', 'tipo_juego']
+
+def separar_duplicados_importacion(user_id, registros):
+    """
+    Separa los registros de un fichero que el usuario ya tiene (mismo hash_duplicado).
+    Usa repositorio.hashes_existentes: una consulta por grupo de hashes del fichero, no
+    una por fila. Devuelve (registros nuevos, detalle de los duplicados).
+    """
+    existentes = repositorio.hashes_existentes(user_id, [registro['hash_duplicado'] for registro in registros]) if registros else set()
+    nuevos = []
+    detalle = []
+    for registro in registros:
+        if registro['hash_duplicado'] in existentes:
+            detalle.append({campo: registro[campo] for campo in CAMPOS_DETALLE_DUPLICADO if campo in registro})
+        else:
+            nuevos.append(registro)
+    return nuevos, detalle
+
+def insertar_registros_importacion(registros, tamano_lote=100):
+    """Inserta en lotes; si un lote falla, lo reintenta registro a registro. Devuelve los insertados"""
+    insertados = 0
+    for i in range(0, len(registros), tamano_lote):
+        lote = registros[i:i + tamano_lote]
+        try:
+            supabase.table('poker_results').insert(lote).execute()
+            insertados += len(lote)
+            print(f"Insertados {len(lote)} registros en lote. Total importados: {insertados}")
+        except Exception as e:
+            print(f"Error insertando lote: {e}")
+            # Intentar insertar uno por uno si falla el lote
+            for reg in lote:
+                try:
+                    supabase.table('poker_results').insert(reg).execute()
+                    insertados += 1
+                except Exception as e2:
+                    print(f"Error insertando registro individual: {e2}")
+    return insertados
+
 def procesar_archivo_wpn(filepath, user_id):
     """Procesa archivos Excel de WPN y los importa a Supabase"""
     try:
@@ -1056,23 +2167,6 @@ def procesar_archivo_wpn(filepath, user_id):
                     'WPN'
                 )
                 
-                # Verificar si ya existe en Supabase
-                existing = supabase.table('poker_results').select('id').eq('hash_duplicado', hash_duplicado).eq('user_id', str(user_id)).execute()
-                
-                if existing.data:
-                    duplicados_encontrados += 1
-                    # Agregar detalle del duplicado
-                    duplicados_detalle.append({
-                        'fecha': fecha.isoformat(),
-                        'hora': hora.isoformat() if hora else None,
-                        'tipo_movimiento': tipo_movimiento,
-                        'descripcion': descripcion,
-                        'importe': importe,
-                        'categoria': categoria,
-                        'tipo_juego': tipo_juego
-                    })
-                    continue
-                
                 # Calcular nivel de buy-in SOLO para registros Buy In
                 nivel_buyin = None
                 if categoria == 'Torneo' and tipo_movimiento == 'Buy In':
@@ -1092,50 +2186,22 @@ def procesar_archivo_wpn(filepath, user_id):
                     'nivel_buyin': nivel_buyin,
                     'sala': 'WPN',
                     'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE,
                     'created_at': datetime.now().isoformat()
                 }
                 
                 registros_nuevos.append(registro)
                 
-                # Insertar en lotes de 100 registros
-                if len(registros_nuevos) >= 100:
-                    try:
-                        supabase.table('poker_results').insert(registros_nuevos).execute()
-                        resultados_importados += len(registros_nuevos)
-                        print(f"Insertados {len(registros_nuevos)} registros en lote. Total importados: {resultados_importados}")
-                        registros_nuevos = []
-                    except Exception as e:
-                        print(f"Error insertando lote: {e}")
-                        # Intentar insertar uno por uno si falla el lote
-                        for reg in registros_nuevos:
-                            try:
-                                supabase.table('poker_results').insert(reg).execute()
-                                resultados_importados += 1
-                            except Exception as e2:
-                                print(f"Error insertando registro individual: {e2}")
-                        registros_nuevos = []
-                
             except Exception as e:
                 errores_procesamiento += 1
                 print(f"Error procesando fila {index}: {e}")
                 print(f"Datos de la fila: {row.to_dict()}")
                 continue
         
-        # Insertar registros restantes
-        if registros_nuevos:
-            try:
-                supabase.table('poker_results').insert(registros_nuevos).execute()
-                resultados_importados += len(registros_nuevos)
-                print(f"Insertados {len(registros_nuevos)} registros finales. Total importados: {resultados_importados}")
-            except Exception as e:
-                print(f"Error insertando lote final: {e}")
-                # Intentar insertar uno por uno si falla el lote
-                for reg in registros_nuevos:
-                    try:
-                        supabase.table('poker_results').insert(reg).execute()
-                        resultados_importados += 1
-                    except Exception as e2:
-                        print(f"Error insertando registro individual final: {e2}")
+        # Duplicados por grupos de hashes del fichero y después inserción en lotes de 100
+        registros_nuevos, duplicados_detalle = separar_duplicados_importacion(user_id, registros_nuevos)
+        duplicados_encontrados = len(duplicados_detalle)
+        resultados_importados = insertar_registros_importacion(registros_nuevos)
         
         print(f"Resumen del procesamiento:")
         print(f"- Registros en archivo: {df_original}")
@@ -1144,18 +2210,17 @@ def procesar_archivo_wpn(filepath, user_id):
         print(f"- Duplicados omitidos: {duplicados_encontrados}")
         print(f"- Registros importados: {resultados_importados}")
         
-        # Procesamiento posterior a la importación
-        print("Iniciando procesamiento posterior...")
-        niveles_reclasificados = reclasificar_niveles_buyin_automatica(user_id)
-        tipos_reclasificados = reclasificar_tipos_juego_automatica(user_id)
-        print(f"Niveles de buy-in reclasificados: {niveles_reclasificados}")
-        print(f"Tipos de juego reclasificados: {tipos_reclasificados}")
+        # La reclasificación se difiere para agrupar importaciones consecutivas
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'WPN') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
         
         return {
             'mensaje': f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.',
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
-            'duplicados_detalle': duplicados_detalle
+            'duplicados_detalle': duplicados_detalle,
+            'reclasificacion': estado_reclasificacion
         }
         
     except Exception as e:
@@ -1324,21 +2389,6 @@ def procesar_archivo_pokerstars(filepath, user_id):
                     'Pokerstars'
                 )
                 
-                # Verificar duplicados en Supabase
-                existing = supabase.table('poker_results').select('id').eq('hash_duplicado', hash_duplicado).eq('user_id', str(user_id)).execute()
-                
-                if existing.data:
-                    duplicados_encontrados += 1
-                    duplicados_detalle.append({
-                        'fecha': fecha.isoformat(),
-                        'tipo_movimiento': tipo_movimiento,
-                        'descripcion': descripcion,
-                        'importe': importe,
-                        'categoria': categoria,
-                        'tipo_juego': tipo_juego
-                    })
-                    continue
-                
                 # Crear registro para Supabase
                 registro = {
                     'id': str(uuid.uuid4()),
@@ -1351,48 +2401,20 @@ def procesar_archivo_pokerstars(filepath, user_id):
                     'tipo_juego': tipo_juego,
                     'sala': 'Pokerstars',
                     'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE,
                     'created_at': datetime.now().isoformat()
                 }
                 
                 registros_nuevos.append(registro)
                 
-                # Insertar en lotes de 100 registros
-                if len(registros_nuevos) >= 100:
-                    try:
-                        supabase.table('poker_results').insert(registros_nuevos).execute()
-                        resultados_importados += len(registros_nuevos)
-                        print(f"Insertados {len(registros_nuevos)} registros en lote. Total importados: {resultados_importados}")
-                        registros_nuevos = []
-                    except Exception as e:
-                        print(f"Error insertando lote: {e}")
-                        # Intentar insertar uno por uno si falla el lote
-                        for reg in registros_nuevos:
-                            try:
-                                supabase.table('poker_results').insert(reg).execute()
-                                resultados_importados += 1
-                            except Exception as e2:
-                                print(f"Error insertando registro individual: {e2}")
-                        registros_nuevos = []
-                
             except Exception as e:
                 print(f"Error procesando fila {index}: {e}")
                 continue
         
-        # Insertar registros restantes
-        if registros_nuevos:
-            try:
-                supabase.table('poker_results').insert(registros_nuevos).execute()
-                resultados_importados += len(registros_nuevos)
-                print(f"Insertados {len(registros_nuevos)} registros finales. Total importados: {resultados_importados}")
-            except Exception as e:
-                print(f"Error insertando lote final: {e}")
-                # Intentar insertar uno por uno si falla el lote
-                for reg in registros_nuevos:
-                    try:
-                        supabase.table('poker_results').insert(reg).execute()
-                        resultados_importados += 1
-                    except Exception as e2:
-                        print(f"Error insertando registro individual final: {e2}")
+        # Duplicados por grupos de hashes del fichero y después inserción en lotes de 100
+        registros_nuevos, duplicados_detalle = separar_duplicados_importacion(user_id, registros_nuevos)
+        duplicados_encontrados = len(duplicados_detalle)
+        resultados_importados = insertar_registros_importacion(registros_nuevos)
         
         print(f"Resumen del procesamiento Pokerstars:")
         print(f"- Registros en archivo: {total_registros}")
@@ -1404,18 +2426,17 @@ def procesar_archivo_pokerstars(filepath, user_id):
         if resultados_importados == 0 and registros_procesados == 0:
             print(f"Debug info: {debug_info}")
         
-        # Procesamiento posterior a la importación
-        print("Iniciando procesamiento posterior...")
-        niveles_reclasificados = reclasificar_niveles_buyin_automatica(user_id)
-        tipos_reclasificados = reclasificar_tipos_juego_automatica(user_id)
-        print(f"Niveles de buy-in reclasificados: {niveles_reclasificados}")
-        print(f"Tipos de juego reclasificados: {tipos_reclasificados}")
+        # La reclasificación se difiere para agrupar importaciones consecutivas
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'Pokerstars') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
         
         return {
             'mensaje': f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.',
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
-            'duplicados_detalle': duplicados_detalle
+            'duplicados_detalle': duplicados_detalle,
+            'reclasificacion': estado_reclasificacion
         }
         
     except Exception as e:
@@ -1521,7 +2542,8 @@ def procesar_archivo_wpn_con_progreso_streaming(filepath, user_id, progress_call
                     'tipo_juego': tipo_juego,
                     'nivel_buyin': nivel_buyin,
                     'sala': 'WPN',
-                    'hash_duplicado': hash_duplicado
+                    'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE
                 }
                 
                 registros_nuevos.append(registro)
@@ -1570,34 +2592,23 @@ def procesar_archivo_wpn_con_progreso_streaming(filepath, user_id, progress_call
         if errores_procesamiento > 0:
             mensaje += f' {errores_procesamiento} errores durante el procesamiento.'
         
+        # La reclasificación se ejecuta en segundo plano una sola vez por ráfaga de importaciones
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'WPN') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
+        
         resultado_final = {
             'tipo': 'completado',
             'mensaje': mensaje,
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
             'duplicados_detalle': duplicados_detalle,
-            'errores_procesamiento': errores_procesamiento
+            'errores_procesamiento': errores_procesamiento,
+            'reclasificacion': estado_reclasificacion
         }
         
         yield f"data: {json.dumps(resultado_final)}\n\n"
         
-        # Ejecutar reclasificación automática después de la importación
-        try:
-            print("🔄 Iniciando reclasificación automática...")
-            
-            # Reclasificar niveles de buy-in
-            reclasificados_buyin = reclasificar_niveles_buyin_automatica(user_id)
-            if reclasificados_buyin > 0:
-                print(f"✅ Reclasificados {reclasificados_buyin} registros por nivel de buy-in")
-            
-            # Reclasificar tipos de juego
-            reclasificados_juego = reclasificar_tipos_juego_automatica(user_id)
-            if reclasificados_juego > 0:
-                print(f"✅ Reclasificados {reclasificados_juego} registros por tipo de juego")
-                
-        except Exception as e:
-            print(f"⚠️  Error en reclasificación automática: {e}")
-        
         return resultado_final
         
     except Exception as e:
@@ -1699,7 +2710,8 @@ def procesar_archivo_wpn_con_progreso(filepath, user_id, progress_callback):
                     'tipo_juego': tipo_juego,
                     'nivel_buyin': nivel_buyin,
                     'sala': 'WPN',
-                    'hash_duplicado': hash_duplicado
+                    'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE
                 }
                 
                 registros_nuevos.append(registro)
@@ -1715,10 +2727,9 @@ def procesar_archivo_wpn_con_progreso(filepath, user_id, progress_callback):
         print("🔍 Verificando duplicados...")
         hashes_existentes = set()
         if registros_nuevos:
-            # Obtener todos los hashes existentes de una vez
+            # Solo los hashes del fichero, por grupos (no todo el historial)
             try:
-                existing_hashes = supabase.table('poker_results').select('hash_duplicado').eq('user_id', str(user_id)).execute()
-                hashes_existentes = set([record['hash_duplicado'] for record in existing_hashes.data])
+                hashes_existentes = repositorio.hashes_existentes(user_id, [registro['hash_duplicado'] for registro in registros_nuevos])
                 print(f"✅ {len(hashes_existentes)} hashes existentes encontrados")
             except Exception as e:
                 print(f"❌ Error obteniendo hashes existentes: {e}")
@@ -1783,18 +2794,17 @@ def procesar_archivo_wpn_con_progreso(filepath, user_id, progress_callback):
         print(f"- Duplicados omitidos: {duplicados_encontrados}")
         print(f"- Registros importados: {resultados_importados}")
         
-        # Procesamiento posterior a la importación
-        print("🔄 Iniciando procesamiento posterior...")
-        niveles_reclasificados = reclasificar_niveles_buyin_automatica(user_id)
-        tipos_reclasificados = reclasificar_tipos_juego_automatica(user_id)
-        print(f"✅ Niveles de buy-in reclasificados: {niveles_reclasificados}")
-        print(f"✅ Tipos de juego reclasificados: {tipos_reclasificados}")
+        # La reclasificación se difiere para agrupar importaciones consecutivas
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'WPN') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
         
         return {
             'mensaje': f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.',
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
-            'duplicados_detalle': duplicados_detalle
+            'duplicados_detalle': duplicados_detalle,
+            'reclasificacion': estado_reclasificacion
         }
         
     except Exception as e:
@@ -1937,7 +2947,8 @@ def procesar_archivo_pokerstars_con_progreso_streaming(filepath, user_id, progre
                     'nivel_buyin': nivel_buyin,
                     'sala': 'Pokerstars',
                     'user_id': str(user_id),
-                    'hash_duplicado': hash_duplicado
+                    'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE
                 }
                 
                 registros_nuevos.append(registro)
@@ -1951,12 +2962,9 @@ def procesar_archivo_pokerstars_con_progreso_streaming(filepath, user_id, progre
         print("🔍 Verificando duplicados...")
         hashes_existentes = set()
         if registros_nuevos:
-            # Obtener todos los hashes existentes de una vez
+            # Solo los hashes del fichero, por grupos (no todo el historial)
             try:
-                existing_hashes = ejecutar_con_reintentos(
-                    lambda: supabase.table('poker_results').select('hash_duplicado').eq('user_id', str(user_id)).execute()
-                )
-                hashes_existentes = set([record['hash_duplicado'] for record in existing_hashes.data])
+                hashes_existentes = repositorio.hashes_existentes(user_id, [registro['hash_duplicado'] for registro in registros_nuevos])
                 print(f"✅ {len(hashes_existentes)} hashes existentes encontrados")
             except Exception as e:
                 print(f"❌ Error obteniendo hashes existentes: {e}")
@@ -2011,40 +3019,24 @@ def procesar_archivo_pokerstars_con_progreso_streaming(filepath, user_id, progre
                     print(f"❌ Error insertando lote: {e}")
                     errores_procesamiento += len(lote)
         
-                # Ejecutar reclasificación automática después de la importación (Pokerstars específica)
-                try:
-                    print("🔄 Iniciando reclasificación automática de Pokerstars...")
-                    
-                    # Reclasificación específica de Pokerstars que busca Buy In padre
-                    reclasificados_pokerstars = reclasificar_pokerstars_automatica(user_id)
-                    if reclasificados_pokerstars > 0:
-                        print(f"✅ Reclasificados {reclasificados_pokerstars} registros de Pokerstars usando Buy In padre")
-                    
-                    # Reclasificación general de niveles de buy-in como fallback
-                    reclasificados_niveles = reclasificar_niveles_buyin_automatica(user_id)
-                    if reclasificados_niveles > 0:
-                        print(f"✅ Reclasificados {reclasificados_niveles} registros por nivel de buy-in general")
-                    
-                    # Reclasificación general de tipos de juego
-                    reclasificados_tipos = reclasificar_tipos_juego_automatica(user_id)
-                    if reclasificados_tipos > 0:
-                        print(f"✅ Reclasificados {reclasificados_tipos} registros por tipo de juego")
-                        
-                except Exception as e:
-                    print(f"⚠️  Error en reclasificación automática: {e}")
-        
         # Resultado final
         mensaje = f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.'
         if errores_procesamiento > 0:
             mensaje += f' {errores_procesamiento} errores durante el procesamiento.'
         
+        # La reclasificación (incluida la específica de Pokerstars) se ejecuta en segundo plano
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'Pokerstars') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
+        
         resultado_final = {
             'tipo': 'completado',
             'mensaje': mensaje,
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
             'duplicados_detalle': duplicados_detalle,
-            'errores_procesamiento': errores_procesamiento
+            'errores_procesamiento': errores_procesamiento,
+            'reclasificacion': estado_reclasificacion
         }
         
         yield f"data: {json.dumps(resultado_final)}\n\n"
@@ -2160,7 +3152,8 @@ def procesar_archivo_pokerstars_excel_con_progreso_streaming(filepath, user_id,
                     'descripcion': descripcion,
                     'importe': importe,
                     'user_id': str(user_id),
-                    'hash_duplicado': hash_duplicado
+                    'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE
                 }
                 
                 registros_nuevos.append(registro)
@@ -2178,10 +3171,7 @@ def procesar_archivo_pokerstars_excel_con_progreso_streaming(filepath, user_id,
         hashes_existentes = set()
         if registros_nuevos:
             try:
-                existing_hashes = ejecutar_con_reintentos(
-                    lambda: supabase.table('poker_results').select('hash_duplicado').eq('user_id', str(user_id)).execute()
-                )
-                hashes_existentes = set([record['hash_duplicado'] for record in existing_hashes.data])
+                hashes_existentes = repositorio.hashes_existentes(user_id, [registro['hash_duplicado'] for registro in registros_nuevos])
                 print(f"✅ {len(hashes_existentes)} hashes existentes encontrados")
             except Exception as e:
                 print(f"❌ Error obteniendo hashes existentes: {e}")
@@ -2241,39 +3231,23 @@ def procesar_archivo_pokerstars_excel_con_progreso_streaming(filepath, user_id,
         if errores_procesamiento > 0:
             mensaje += f' {errores_procesamiento} errores durante el procesamiento.'
         
+        # La reclasificación de Pokerstars (igual que en HTML) se ejecuta en segundo plano
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'Pokerstars') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
+        
         resultado_final = {
             'tipo': 'completado',
             'mensaje': mensaje,
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
             'duplicados_detalle': duplicados_detalle,
-            'errores_procesamiento': errores_procesamiento
+            'errores_procesamiento': errores_procesamiento,
+            'reclasificacion': estado_reclasificacion
         }
         
         yield f"data: {json.dumps(resultado_final)}\n\n"
         
-        # Ejecutar reclasificación automática de Pokerstars (igual que en HTML)
-        try:
-            print("🔄 Iniciando reclasificación automática de Pokerstars Excel...")
-            
-            # Reclasificación específica de Pokerstars que busca Buy In padre
-            reclasificados_pokerstars = reclasificar_pokerstars_automatica(user_id)
-            if reclasificados_pokerstars > 0:
-                print(f"✅ Reclasificados {reclasificados_pokerstars} registros de Pokerstars usando Buy In padre")
-            
-            # Reclasificación general de niveles de buy-in como fallback
-            reclasificados_niveles = reclasificar_niveles_buyin_automatica(user_id)
-            if reclasificados_niveles > 0:
-                print(f"✅ Reclasificados {reclasificados_niveles} registros por nivel de buy-in general")
-            
-            # Reclasificación general de tipos de juego
-            reclasificados_tipos = reclasificar_tipos_juego_automatica(user_id)
-            if reclasificados_tipos > 0:
-                print(f"✅ Reclasificados {reclasificados_tipos} registros por tipo de juego")
-                
-        except Exception as e:
-            print(f"⚠️  Error en reclasificación automática: {e}")
-        
         return resultado_final
         
     except Exception as e:
@@ -2405,7 +3379,8 @@ def procesar_archivo_pokerstars_con_progreso(filepath, user_id, progress_callbac
                     'tipo_juego': tipo_juego,
                     'nivel_buyin': nivel_buyin,
                     'sala': 'Pokerstars',
-                    'hash_duplicado': hash_duplicado
+                    'hash_duplicado': hash_duplicado,
+                    'clasificador_version': CLASIFICADOR_VERSION_PENDIENTE
                 }
                 
                 registros_nuevos.append(registro)
@@ -2421,10 +3396,9 @@ def procesar_archivo_pokerstars_con_progreso(filepath, user_id, progress_callbac
         print("🔍 Verificando duplicados...")
         hashes_existentes = set()
         if registros_nuevos:
-            # Obtener todos los hashes existentes de una vez
+            # Solo los hashes del fichero, por grupos (no todo el historial)
             try:
-                existing_hashes = supabase.table('poker_results').select('hash_duplicado').eq('user_id', str(user_id)).execute()
-                hashes_existentes = set([record['hash_duplicado'] for record in existing_hashes.data])
+                hashes_existentes = repositorio.hashes_existentes(user_id, [registro['hash_duplicado'] for registro in registros_nuevos])
                 print(f"✅ {len(hashes_existentes)} hashes existentes encontrados")
             except Exception as e:
                 print(f"❌ Error obteniendo hashes existentes: {e}")
@@ -2488,18 +3462,17 @@ def procesar_archivo_pokerstars_con_progreso(filepath, user_id, progress_callbac
         print(f"- Duplicados omitidos: {duplicados_encontrados}")
         print(f"- Registros importados: {resultados_importados}")
         
-        # Procesamiento posterior a la importación
-        print("🔄 Iniciando procesamiento posterior...")
-        niveles_reclasificados = reclasificar_niveles_buyin_automatica(user_id)
-        tipos_reclasificados = reclasificar_tipos_juego_automatica(user_id)
-        print(f"✅ Niveles de buy-in reclasificados: {niveles_reclasificados}")
-        print(f"✅ Tipos de juego reclasificados: {tipos_reclasificados}")
+        # La reclasificación se difiere para agrupar importaciones consecutivas
+        if resultados_importados > 0:
+            incrementar_version_datos(user_id)
+        estado_reclasificacion = programar_reclasificacion(user_id, 'Pokerstars') if resultados_importados > 0 else obtener_estado_reclasificacion(user_id)
         
         return {
             'mensaje': f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.',
             'resultados_importados': resultados_importados,
             'duplicados_encontrados': duplicados_encontrados,
-            'duplicados_detalle': duplicados_detalle
+            'duplicados_detalle': duplicados_detalle,
+            'reclasificacion': estado_reclasificacion
         }
         
     except Exception as e:
@@ -2741,269 +3714,194 @@ def api_progreso():
         'mensaje': 'Procesando archivo...'
     })
 
+@app.route('/api/reclasificacion/estado')
+@login_required
+def api_reclasificacion_estado():
+    """API endpoint para consultar la reclasificación diferida posterior a las importaciones"""
+    return jsonify(obtener_estado_reclasificacion(current_user.id))
+
 # API endpoints para informes
 @app.route('/api/informes/opciones')
-def api_informes_opciones():
+@cache_por_version('informes_opciones')
+def api_informes_opciones(user_id, args):
     """API endpoint para obtener opciones de informes"""
     try:
-        # Usar usuario admin por defecto si no hay sesión
-        if current_user.is_authenticated:
-            user_id = str(current_user.id)
-            print(f"🔍 Usuario autenticado: {user_id}")
-        else:
-            user_id = "00000000-0000-0000-0000-000000000001"  # Usuario admin por defecto
-            print(f"🔍 Usando usuario por defecto: {user_id}")
-        
-        # Obtener opciones únicas usando consultas específicas para evitar cargar todos los registros
-        # Obtener salas únicas - versión optimizada
-        try:
-            salas = obtener_valores_unicos_optimizado('poker_results', 'sala', user_id)
-            print(f"🔍 Salas encontradas: {salas}")
-        except Exception as e:
-            print(f"❌ Error obteniendo salas: {e}")
-            salas = []
-        
-        # Obtener categorías únicas - versión optimizada
-        try:
-            categorias = obtener_valores_unicos_optimizado('poker_results', 'categoria', user_id)
-        except Exception as e:
-            print(f"❌ Error obteniendo categorías: {e}")
-            categorias = []
-        
-        # Obtener tipos de juego únicos - versión optimizada
-        try:
-            tipos_juego = obtener_valores_unicos_optimizado('poker_results', 'tipo_juego', user_id)
-        except Exception as e:
-            print(f"❌ Error obteniendo tipos de juego: {e}")
-            tipos_juego = []
-        
-        # Obtener niveles de buy-in únicos - versión optimizada
-        try:
-            niveles_buyin = obtener_valores_unicos_optimizado('poker_results', 'nivel_buyin', user_id)
-        except Exception as e:
-            print(f"❌ Error obteniendo niveles de buy-in: {e}")
-            niveles_buyin = []
+        opciones = obtener_opciones_filtros(user_id)
+        print(f"🔍 Salas encontradas: {opciones['salas']}")
         
-        # Obtener tipos de movimiento únicos - versión optimizada
-        try:
-            tipos_movimiento = obtener_valores_unicos_optimizado('poker_results', 'tipo_movimiento', user_id)
-        except Exception as e:
-            print(f"❌ Error obteniendo tipos de movimiento: {e}")
-            tipos_movimiento = []
-        
-        # Obtener rangos de fechas
-        try:
-            fechas_result = supabase.table('poker_results').select('fecha').eq('user_id', user_id).range(0, 20000).execute()
-            fechas = [record['fecha'] for record in fechas_result.data if record.get('fecha')]
-            fecha_min = min(fechas) if fechas else None
-            fecha_max = max(fechas) if fechas else None
-        except Exception as e:
-            print(f"❌ Error obteniendo fechas: {e}")
-            fecha_min = None
-            fecha_max = None
-        
-        return jsonify({
+        return {
             'success': True,
-            'opciones': {
-                'salas': salas,
-                'categorias': categorias,
-                'tipos_juego': tipos_juego,
-                'niveles_buyin': niveles_buyin,
-                'tipos_movimiento': tipos_movimiento,
-                'fecha_min': fecha_min,
-                'fecha_max': fecha_max
-            }
-        })
+            'opciones': opciones
+        }, 200
     except Exception as e:
         print(f"Error en API opciones informes: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return {'success': False, 'error': str(e)}, 500
 
 @app.route('/api/informes/resultados')
-def api_informes_resultados():
+@cache_por_version('informes_resultados', por_dia=True)
+def api_informes_resultados(user_id, args):
     """API endpoint para obtener resultados de informes"""
     try:
-        # Usar usuario admin por defecto si no hay sesión
-        if current_user.is_authenticated:
-            user_id = str(current_user.id)
-        else:
-            user_id = "00000000-0000-0000-0000-000000000001"  # Usuario admin por defecto
-        
-        # Obtener parámetros de filtro (soporte para arrays y valores únicos)
-        salas = request.args.getlist('salas[]') or [request.args.get('sala', '')]
-        salas = [s for s in salas if s]  # Filtrar valores vacíos
-        
-        categorias = request.args.getlist('categorias[]') or [request.args.get('categoria', '')]
-        categorias = [c for c in categorias if c]  # Filtrar valores vacíos
-        
-        tipos_juego = request.args.getlist('tipos_juego[]') or [request.args.get('tipo_juego', '')]
-        tipos_juego = [t for t in tipos_juego if t]  # Filtrar valores vacíos
-        
-        niveles_buyin = request.args.getlist('niveles_buyin[]') or [request.args.get('nivel_buyin', '')]
-        niveles_buyin = [n for n in niveles_buyin if n]  # Filtrar valores vacíos
-        
-        fecha_inicio = request.args.get('fecha_inicio', '')
-        fecha_fin = request.args.get('fecha_fin', '')
-        
-        tipos_movimiento = request.args.getlist('tipos_movimiento[]') or [request.args.get('tipo_movimiento', '')]
-        tipos_movimiento = [t for t in tipos_movimiento if t]  # Filtrar valores vacíos
+        # Filtros de la petición (soporte para arrays y valores únicos)
+        filtros = filtros_informe(args)
+        salas, categorias = filtros['salas'], filtros['categorias']
+        tipos_juego, niveles_buyin = filtros['tipos_juego'], filtros['niveles_buyin']
+        tipos_movimiento = filtros['tipos_movimiento']
+        fecha_inicio, fecha_fin = filtros['fecha_inicio'], filtros['fecha_fin']
         
         # Parámetros de paginación y búsqueda
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 50))  # Reducido a 50 registros por página
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', 50))  # Reducido a 50 registros por página
         offset = (page - 1) * per_page
         
-        # Parámetro de búsqueda
-        busqueda = request.args.get('busqueda', '').strip()
-        
-        # Construir consulta base
-        query = supabase.table('poker_results').select('*').eq('user_id', user_id)
-        
-        # Aplicar filtros
-        if salas:
-            query = query.in_('sala', salas)
-        if categorias:
-            query = query.in_('categoria', categorias)
-        if tipos_juego:
-            query = query.in_('tipo_juego', tipos_juego)
-        if niveles_buyin:
-            query = query.in_('nivel_buyin', niveles_buyin)
-        if tipos_movimiento:
-            query = query.in_('tipo_movimiento', tipos_movimiento)
-        if fecha_inicio:
-            query = query.gte('fecha', fecha_inicio)
-        if fecha_fin:
-            query = query.lte('fecha', fecha_fin)
-        
-        # Aplicar búsqueda si se proporciona
-        if busqueda:
-            # Buscar en descripción, sala, tipo_movimiento, categoria
-            # Usar ilike para búsqueda case-insensitive
-            query = query.or_(f'descripcion.ilike.%{busqueda}%,sala.ilike.%{busqueda}%,tipo_movimiento.ilike.%{busqueda}%,categoria.ilike.%{busqueda}%')
-        
-        # Obtener total de registros para estadísticas
-        def obtener_conteo():
-            count_query = supabase.table('poker_results').select('id', count='exact').eq('user_id', user_id)
-            
-            # Aplicar los mismos filtros para el conteo
-            if salas:
-                count_query = count_query.in_('sala', salas)
-            if categorias:
-                count_query = count_query.in_('categoria', categorias)
-            if tipos_juego:
-                count_query = count_query.in_('tipo_juego', tipos_juego)
-            if niveles_buyin:
-                count_query = count_query.in_('nivel_buyin', niveles_buyin)
-            if tipos_movimiento:
-                count_query = count_query.in_('tipo_movimiento', tipos_movimiento)
-            if fecha_inicio:
-                count_query = count_query.gte('fecha', fecha_inicio)
-            if fecha_fin:
-                count_query = count_query.lte('fecha', fecha_fin)
-            if busqueda:
-                count_query = count_query.or_(f'descripcion.ilike.%{busqueda}%,sala.ilike.%{busqueda}%,tipo_movimiento.ilike.%{busqueda}%,categoria.ilike.%{busqueda}%')
-            
-            return count_query.execute()
-        
-        count_result = ejecutar_con_reintentos(obtener_conteo)
-        total_registros = count_result.count if hasattr(count_result, 'count') else 0
-        
-        # Aplicar paginación y ordenamiento
-        query = query.order('fecha', desc=True).order('id', desc=True)
-        query = query.range(offset, offset + per_page - 1)
-        
-        # Ejecutar consulta con reintentos
-        def obtener_datos():
-            return query.execute()
+        # Cursor opaco (fecha, id) de la tabla: la página se lee por keyset en lugar de por desplazamiento
+        cursor = args.get('cursor', '').strip()
+        try:
+            posicion = decodificar_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
+        cursor_anterior_pedido = bool(posicion and posicion[2])
+        if posicion:
+            offset = 0
         
-        result = ejecutar_con_reintentos(obtener_datos)
-        records = result.data if result.data else []
+        # Parámetro de búsqueda
+        busqueda = filtros['busqueda']
+        
+        def aplicar_filtros(query):
+            """Aplica los filtros de la petición a una consulta"""
+            return aplicar_filtros_informe(query, filtros, busqueda_indexada)
+        
+        # Mismos filtros que la página, para las funciones SQL del informe
+        parametros_informe = {
+            'user_id_param': user_id,
+            'salas_param': salas or None,
+            'categorias_param': categorias or None,
+            'tipos_juego_param': tipos_juego or None,
+            'niveles_buyin_param': niveles_buyin or None,
+            'tipos_movimiento_param': tipos_movimiento or None,
+            'fecha_inicio_param': fecha_inicio or None,
+            'fecha_fin_param': fecha_fin or None,
+            'busqueda_param': busqueda or None
+        }
         
-        # Para estadísticas, usar una estrategia más eficiente y resistente a errores
-        print(f"🔄 Calculando estadísticas (usuario: {user_id})")
+        # Calcular resultados diarios de los últimos 10 días (SIN FILTROS, desde fecha actual)
+        hoy = datetime.now().date()
+        ultimos_10_dias = dias_grafico(hoy)
+        
+        informe = None
+        cliente = cliente_lectura(user_id)
+        busqueda_indexada = bool(busqueda) and cliente is supabase and busqueda_indexada_disponible()
+        if cliente is supabase and rollup_disponible():
+            # Un solo viaje de red: página, total, estadísticas y gráfico en un documento JSON
+            respuesta = cliente_async.ejecutar_concurrente({
+                'informes.resultados': cliente_async.rpc('get_informe_resultados', {
+                    **parametros_informe,
+                    'limite_param': per_page + 1,
+                    'desplazamiento_param': offset,
+                    'hoy_param': hoy.isoformat(),
+                    'cursor_fecha_param': posicion[0] if posicion else None,
+                    'cursor_id_param': posicion[1] if posicion else None,
+                    'cursor_anterior_param': cursor_anterior_pedido
+                })
+            })['informes.resultados']
+            if isinstance(respuesta, Exception) and not es_objeto_inexistente(respuesta):
+                raise respuesta
+            if isinstance(respuesta, Exception):
+                marcar_rollup_no_disponible(respuesta)
+            else:
+                informe = respuesta.data or {}
         
         # Inicializar estadísticas por defecto
-        torneos_jugados = 0
-        total_invertido = 0.0
-        total_ganancias = 0.0
-        total_importe = 0.0
-        roi = 0.0
-        por_categoria = {}
-        
-        try:
-            # Obtener todos los registros del usuario para estadísticas (aplicando filtros)
-            def obtener_estadisticas_torneos():
-                query = supabase.table('poker_results').select('importe, categoria, tipo_movimiento').eq('user_id', user_id)
-                if categorias:
-                    query = query.in_('categoria', categorias)
-                if salas:
-                    query = query.in_('sala', salas)
-                if fecha_inicio:
-                    query = query.gte('fecha', fecha_inicio)
-                if fecha_fin:
-                    query = query.lte('fecha', fecha_fin)
-                return query.range(0, 20000).execute()  # Obtener hasta 20k registros
+        estadisticas = calcular_estadisticas_informe([])
+        
+        if informe is not None:
+            total_registros = informe.get('total_registros') or 0
+            records = informe.get('registros') or []
+            estadisticas = estadisticas_desde_sql(informe.get('estadisticas'))
+            resultados_diarios = [
+                {'fecha': dia['fecha'], 'resultado': float(dia['resultado']), 'movimientos': int(dia['movimientos'])}
+                for dia in informe.get('resultados_diarios') or []
+            ]
+            print(f"📊 Informe calculado en SQL (get_informe_resultados, usuario: {user_id})")
+        else:
+            # Sin las funciones SQL (o en el espejo local): conteo y página en paralelo, gráfico y estadísticas aparte
+            def construir_consultas(cliente):
+                pagina = aplicar_filtros(cliente.table('poker_results').select('*').eq('user_id', user_id))
+                if posicion:
+                    # Keyset: (fecha, id) < cursor hacia delante, > cursor hacia atrás
+                    fecha_cursor, id_cursor, _ = posicion
+                    operador = 'gt' if cursor_anterior_pedido else 'lt'
+                    pagina = pagina.or_(f'fecha.{operador}.{fecha_cursor},and(fecha.eq.{fecha_cursor},id.{operador}.{id_cursor})') \
+                        .order('fecha', desc=not cursor_anterior_pedido).order('id', desc=not cursor_anterior_pedido).limit(per_page + 1)
+                else:
+                    pagina = pagina.order('fecha', desc=True).order('id', desc=True).range(offset, offset + per_page)
+                return {
+                    'informes.conteo': aplicar_filtros(cliente.table('poker_results').select('id', count='exact', head=True).eq('user_id', user_id)),
+                    'informes.pagina': pagina
+                }
             
-            stats_result = ejecutar_con_reintentos(obtener_estadisticas_torneos)
-            if stats_result.data:
-                all_records = stats_result.data
-                print(f"📊 Registros obtenidos para estadísticas: {len(all_records)}")
-                
-                # Calcular estadísticas usando la lógica correcta de SQLite
-                # 1. Torneos jugados: solo Buy In + Torneo
-                torneos_jugados = len([r for r in all_records 
-                                     if r.get('tipo_movimiento') == 'Buy In' and r.get('categoria') == 'Torneo'])
-                
-                # 2. Filtrar solo registros de torneos para cálculos específicos
-                torneos = [r for r in all_records if r.get('categoria') == 'Torneo']
-                
-                # 3. Total invertido: solo egresos (importes negativos) de torneos
-                total_invertido = sum([abs(float(record.get('importe', 0))) 
-                                     for record in torneos if float(record.get('importe', 0)) < 0])
-                
-                # 4. Total ganancias: solo ingresos (importes positivos) de torneos
-                total_ganancias = sum([float(record.get('importe', 0)) 
-                                     for record in torneos if float(record.get('importe', 0)) > 0])
-                
-                # 5. Calcular ROI: (ganancias - invertido) / invertido * 100
-                roi = 0
-                if total_invertido > 0:
-                    roi = ((total_ganancias - total_invertido) / total_invertido) * 100
-                
-                # 6. Suma total de todos los importes (incluyendo todos los registros filtrados)
-                total_importe = sum([float(record.get('importe', 0)) for record in all_records])
-                
-                # 7. Resultado económico excluyendo transferencias, retiros y depósitos
-                movimientos_poker = [r for r in all_records 
-                                   if r.get('categoria') not in ['Transferencia', 'Depósito', 'Retiro'] 
-                                   and r.get('tipo_movimiento') not in ['Retiro']]
-                resultado_economico = sum([float(record.get('importe', 0)) for record in movimientos_poker])
-                
-                # Agrupar por categoría
-                for record in all_records:
-                    cat = record.get('categoria', 'Sin categoría')
-                    if cat not in por_categoria:
-                        por_categoria[cat] = {'count': 0, 'total': 0}
-                    por_categoria[cat]['count'] += 1
-                    por_categoria[cat]['total'] += float(record.get('importe', 0))
-        
-                print(f"🎯 Estadísticas calculadas (lógica SQLite):")
-                print(f"   - Torneos jugados (Buy In + Torneo): {torneos_jugados}")
-                print(f"   - Total invertido (egresos torneos): ${total_invertido:.2f}")
-                print(f"   - Total ganancias (ingresos torneos): ${total_ganancias:.2f}")
-                print(f"   - Balance total (todos registros): ${total_importe:.2f}")
-                print(f"   - ROI: {roi:.1f}%")
-                print(f"   - Resultado económico (sin transferencias): ${resultado_economico:.2f}")
+            if cliente is supabase:
+                # Contra Supabase se lanzan a la vez por el cliente asíncrono
+                respuestas = cliente_async.ejecutar_concurrente(construir_consultas(cliente_async))
+                errores = [r for r in respuestas.values() if isinstance(r, Exception) and not isinstance(r, CircuitoAbierto)]
+                if busqueda_indexada and errores and 'texto_busqueda' in str(errores[0]):
+                    marcar_busqueda_indexada_no_disponible(errores[0])
+                    busqueda_indexada = False
+                    respuestas = cliente_async.ejecutar_concurrente(construir_consultas(cliente_async))
             else:
-                print("⚠️  No se pudieron obtener registros para estadísticas")
-                
-        except Exception as e:
-            print(f"⚠️  Error calculando estadísticas: {e}")
-            # Usar valores por defecto si hay error
-        
-        # Calcular información de paginación
+                # En el espejo local cada consulta tarda microsegundos
+                respuestas = {nombre: consulta.execute() for nombre, consulta in construir_consultas(cliente).items()}
+            for respuesta in respuestas.values():
+                if isinstance(respuesta, Exception):
+                    raise respuesta
+            
+            count_result = respuestas['informes.conteo']
+            total_registros = count_result.count if count_result.count else 0
+            
+            result = respuestas['informes.pagina']
+            records = result.data if result.data else []
+            if cursor_anterior_pedido:
+                records.reverse()
+            
+            resultados_diarios = resultados_diarios_usuario(user_id, ultimos_10_dias)
+            
+            # Para estadísticas, usar una estrategia más eficiente y resistente a errores
+            print(f"🔄 Calculando estadísticas (usuario: {user_id})")
+            try:
+                # Todos los registros filtrados por lotes, agrupados por categoría y tipo de movimiento
+                agrupadas = {}
+                for lote in repositorio_lectura(user_id).iterar_lotes(
+                    'poker_results', 'importe, categoria, tipo_movimiento',
+                    lambda q: aplicar_filtros(q.eq('user_id', user_id)), nombre='informes.estadisticas'
+                ):
+                    agrupar_registros(lote, agrupadas)
+                estadisticas = calcular_estadisticas_informe(agrupadas.values())
+                print(f"📊 Registros agrupados para estadísticas: {sum(fila['cantidad'] for fila in agrupadas.values())}")
+            except Exception as e:
+                print(f"⚠️  Error calculando estadísticas: {e}")
+                # Usar valores por defecto si hay error
+        
+        print(f"🎯 Estadísticas calculadas (lógica SQLite):")
+        print(f"   - Torneos jugados (Buy In + Torneo): {estadisticas['torneos_jugados']}")
+        print(f"   - Total invertido (egresos torneos): ${estadisticas['total_invertido']:.2f}")
+        print(f"   - Total ganancias (ingresos torneos): ${estadisticas['total_ganancias']:.2f}")
+        print(f"   - Balance total (todos registros): ${estadisticas['total_importe']:.2f}")
+        print(f"   - ROI: {estadisticas['roi']:.1f}%")
+        print(f"   - Resultado económico (sin transferencias): ${estadisticas['resultado_economico']:.2f}")
+        
+        torneos_jugados = estadisticas['torneos_jugados']
+        total_invertido = estadisticas['total_invertido']
+        total_ganancias = estadisticas['total_ganancias']
+        total_importe = estadisticas['total_importe']
+        roi = estadisticas['roi']
+        resultado_economico = estadisticas['resultado_economico']
+        por_categoria = estadisticas['por_categoria']
+        
+        # Calcular información de paginación (se pidió una fila de más para saber si hay otra página)
+        records, has_next, has_prev, cursor_siguiente, cursor_anterior = recortar_pagina(
+            records, per_page, anterior=cursor_anterior_pedido, desde_cursor=bool(posicion), desplazamiento=offset
+        )
         total_pages = (total_registros + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_prev = page > 1
         
         # Debug: mostrar estadísticas que se van a enviar
         print(f"📤 Enviando estadísticas al frontend:")
@@ -3030,7 +3928,9 @@ def api_informes_resultados():
                     'per_page': per_page,
                     'total_pages': total_pages,
                     'has_next': has_next,
-                    'has_prev': has_prev
+                    'has_prev': has_prev,
+                    'cursor_siguiente': cursor_siguiente,
+                    'cursor_anterior': cursor_anterior
                 },
                 'busqueda': {
                     'termino': busqueda,
@@ -3039,31 +3939,11 @@ def api_informes_resultados():
             }
         }
         
-        # Calcular resultados diarios de los últimos 10 días (SIN FILTROS, desde fecha actual)
-        from datetime import timedelta
-        hoy = datetime.now().date()
-        ultimos_10_dias = [hoy - timedelta(days=i) for i in range(10)]
-        ultimos_10_dias.reverse()
-        
-        # Obtener TODOS los movimientos de poker del usuario (sin filtros) para el gráfico
-        todos_movimientos_poker = supabase.table('poker_results').select('*').eq('user_id', user_id).neq('categoria', 'Transferencia').neq('categoria', 'Depósito').neq('tipo_movimiento', 'Retiro').execute()
-        
-        resultados_diarios = []
-        for fecha in ultimos_10_dias:
-            # Filtrar movimientos de poker para esta fecha específica
-            movimientos_dia = [r for r in todos_movimientos_poker.data if r['fecha'] == fecha.isoformat()]
-            resultado_dia = sum(float(r['importe']) for r in movimientos_dia)
-            resultados_diarios.append({
-                'fecha': fecha.isoformat(),
-                'resultado': resultado_dia,
-                'movimientos': len(movimientos_dia)
-            })
-        
         # Agregar resultados_diarios a la respuesta
         response_data['resultados']['resultados_diarios'] = resultados_diarios
         
-        print(f"📤 JSON completo a enviar: {response_data}")
-        return jsonify(response_data)
+        logger.debug("📤 JSON completo a enviar: %s", response_data)
+        return response_data, 200
     except Exception as e:
         print(f"❌ Error crítico en API resultados informes: {e}")
         import traceback
@@ -3078,7 +3958,7 @@ def api_informes_resultados():
         else:
             error_msg = f"Error interno: {error_msg}"
         
-        return jsonify({
+        return {
             'success': False, 
             'error': error_msg,
             'resultados': {
@@ -3092,18 +3972,175 @@ def api_informes_resultados():
                 'por_categoria': {},
                 'registros': [],
                 'paginacion': {
-                    'page': int(request.args.get('page', 1)),
-                    'per_page': int(request.args.get('per_page', 50)),
+                    'page': int(args.get('page', 1)),
+                    'per_page': int(args.get('per_page', 50)),
                     'total_pages': 0,
                     'has_next': False,
                     'has_prev': False
                 },
                 'busqueda': {
-                    'termino': request.args.get('busqueda', ''),
-                    'activa': bool(request.args.get('busqueda', ''))
+                    'termino': args.get('busqueda', ''),
+                    'activa': bool(args.get('busqueda', ''))
                 }
             }
-        }), 500
+        }, 500
+
+@app.route('/api/informes/exportar')
+def api_informes_exportar():
+    """
+    Exporta los registros filtrados (mismos filtros y orden que /api/informes/resultados)
+    en CSV, Parquet o XLSX. Ej.: ?formato=csv&salas[]=WPN&fecha_inicio=2025-01-01
+    Los registros se leen por lotes keyset y se escriben a medida que llegan: la
+    memoria no depende del número de filas. Requiere sesión: sin ella responde 401
+    (no se exportan los datos del usuario admin por defecto).
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'error': 'No autenticado'}), 401
+    user_id = str(current_user.id)
+
+    formato = request.args.get('formato', 'csv').strip().lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'success': False, 'error': f"Formato no soportado: {formato} (csv, parquet o xlsx)"}), 400
+    if not formato_disponible(formato):
+        return jsonify({'success': False, 'error': f"La exportación a {formato} no está disponible en este servidor"}), 501
+
+    filtros = filtros_informe(request.args)
+    repo = repositorio_lectura(user_id)
+    busqueda_indexada = bool(filtros['busqueda']) and repo is repositorio and busqueda_indexada_disponible()
+
+    def leer_lotes():
+        return repo.iterar_lotes_por_fecha(
+            'poker_results', CAMPOS_EXPORTACION,
+            lambda q: aplicar_filtros_informe(q.eq('user_id', user_id), filtros, busqueda_indexada),
+            nombre='informes.exportar'
+        )
+
+    # El primer lote se lee antes de responder: un error de consulta es un 500 y no un fichero cortado
+    try:
+        lotes = leer_lotes()
+        try:
+            primero = next(lotes, [])
+        except Exception as e:
+            if not (busqueda_indexada and 'texto_busqueda' in str(e)):
+                raise
+            marcar_busqueda_indexada_no_disponible(e)
+            busqueda_indexada = False
+            lotes = leer_lotes()
+            primero = next(lotes, [])
+    except Exception as e:
+        print(f"❌ Error exportando informes: {e}")
+        return jsonify({'success': False, 'error': f'Error al exportar: {str(e)}'}), 500
+
+    def lotes_exportacion():
+        if primero:
+            yield primero
+        filas = len(primero)
+        for lote in lotes:
+            filas += len(lote)
+            yield lote
+        print(f"📤 Exportación {formato}: {filas} registros (usuario: {user_id})")
+
+    generador, mimetype, extension = FORMATOS_EXPORTACION[formato]
+    nombre_archivo = f"poker_results_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    return Response(
+        stream_with_context(generador(lotes_exportacion())),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre_archivo}"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/informes/ultimos-10-dias')
+@cache_por_version('informes_ultimos_10_dias', por_dia=True)
+def api_ultimos_10_dias(user_id, args):
+    """Resultados de los últimos 10 días sin filtros (gráfico de informes); solo lee esa ventana"""
+    try:
+        fechas = dias_grafico()
+        return {
+            'success': True,
+            'resultados_diarios': resultados_diarios_usuario(user_id, fechas),
+            'total_dias': len(fechas),
+            'fecha_inicio': fechas[0].isoformat(),
+            'fecha_fin': fechas[-1].isoformat()
+        }, 200
+    except Exception as e:
+        print(f"❌ Error en resultados de últimos 10 días: {e}")
+        return {'success': False, 'error': f'Error al obtener resultados de últimos 10 días: {str(e)}'}, 500
+
+@app.route('/api/informes/serie')
+@cache_por_version('informes_serie')
+def api_informes_serie(user_id, args):
+    """
+    Serie temporal de resultados de poker con el bankroll acumulado.
+    Ej.: ?granularidad=mes&fecha_inicio=2020-01-01&fecha_fin=2025-12-31 (dia, semana, mes o anio)
+    """
+    try:
+        granularidad = args.get('granularidad', 'dia').strip().lower()
+        granularidad = ALIAS_GRANULARIDAD.get(granularidad, granularidad)
+        if granularidad not in GRANULARIDADES_SERIE:
+            return {'success': False, 'error': f"granularidad debe ser una de: {', '.join(GRANULARIDADES_SERIE)}"}, 400
+        try:
+            desde = datetime.strptime(args['fecha_inicio'], '%Y-%m-%d').date() if args.get('fecha_inicio') else None
+            hasta = datetime.strptime(args['fecha_fin'], '%Y-%m-%d').date() if args.get('fecha_fin') else None
+        except ValueError:
+            return {'success': False, 'error': 'Las fechas deben tener el formato YYYY-MM-DD'}, 400
+        if desde and hasta and desde > hasta:
+            return {'success': False, 'error': 'fecha_inicio no puede ser posterior a fecha_fin'}, 400
+        if granularidad == 'dia' and desde and hasta and (hasta - desde).days >= MAX_PERIODOS_SERIE:
+            return {'success': False, 'error': f'Como máximo {MAX_PERIODOS_SERIE} días; usa una granularidad mayor'}, 400
+
+        serie = serie_resultados_usuario(user_id, granularidad, desde, hasta)
+        periodos = serie['periodos']
+        return {
+            'success': True,
+            'granularidad': granularidad,
+            'fecha_inicio': desde.isoformat() if desde else (periodos[0]['periodo'] if periodos else None),
+            'fecha_fin': hasta.isoformat() if hasta else None,
+            'saldo_inicial': serie['saldo_inicial'],
+            'saldo_final': periodos[-1]['acumulado'] if periodos else serie['saldo_inicial'],
+            'total_periodos': len(periodos),
+            'periodos': periodos
+        }, 200
+    except Exception as e:
+        print(f"❌ Error en serie de resultados: {e}")
+        return {'success': False, 'error': str(e)}, 500
+
+@app.route('/api/informes/pivot')
+@cache_por_version('informes_pivot')
+def api_informes_pivot(user_id, args):
+    """
+    Informe dinámico: agrupa por cualquier combinación de dimensiones y calcula las
+    medidas pedidas con los mismos filtros que /api/informes/resultados (DuckDB).
+    Ej.: ?dimensiones=sala,tipo_juego,mes&medidas=suma,roi&orden=-suma
+    """
+    try:
+        filtros = {parametro: args.getlist(f'{parametro}[]') or args.getlist(parametro) for parametro in FILTROS_LISTA}
+        filtros['fecha_inicio'] = args.get('fecha_inicio', '')
+        filtros['fecha_fin'] = args.get('fecha_fin', '')
+
+        snapshot = snapshots_pivot.obtener(
+            user_id, obtener_version_datos(user_id),
+            lambda: repositorio_lectura(user_id).leer_todos(
+                'poker_results', CAMPOS_SNAPSHOT, lambda q: q.eq('user_id', user_id), nombre='resultados.snapshot_pivot'
+            )
+        )
+        pivot = ejecutar_pivot(
+            snapshot,
+            args.getlist('dimensiones[]') or args.get('dimensiones', ''),
+            args.getlist('medidas[]') or args.get('medidas', ''),
+            filtros,
+            orden=args.get('orden'),
+            limite=args.get('limite')
+        )
+        print(f"📐 Pivot {pivot['dimensiones']} x {pivot['medidas']}: {pivot['total_filas']} filas en {pivot['consulta_ms']}ms")
+        return {'success': True, 'pivot': pivot}, 200
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error en API pivot informes: {e}")
+        return {'success': False, 'error': str(e)}, 500
 
 @app.route('/favicon.ico')
 def favicon():
@@ -3116,9 +4153,8 @@ def favicon():
 def api_eliminar_todos():
     """Elimina todos los registros del usuario actual"""
     try:
-        # Contar registros del usuario antes de eliminar
-        result = supabase.table('poker_results').select('id', count='exact').eq('user_id', current_user.id).execute()
-        total_registros = result.count if result.count else 0
+        # Contar y eliminar todos los registros del usuario
+        total_registros = repositorio.eliminar_registros_usuario(current_user.id)
         
         if total_registros == 0:
             return jsonify({
@@ -3126,8 +4162,7 @@ def api_eliminar_todos():
                 'registros_eliminados': 0
             })
         
-        # Eliminar todos los registros del usuario
-        supabase.table('poker_results').delete().eq('user_id', current_user.id).execute()
+        incrementar_version_datos(current_user.id)
         
         return jsonify({
             'mensaje': f'Se eliminaron {total_registros} registros exitosamente',
@@ -3148,9 +4183,8 @@ def api_eliminar_por_sala():
         if not sala:
             return jsonify({'error': 'Sala no especificada'}), 400
         
-        # Contar registros de la sala del usuario antes de eliminar
-        result = supabase.table('poker_results').select('id', count='exact').eq('user_id', current_user.id).eq('sala', sala).execute()
-        registros_sala = result.count if result.count else 0
+        # Contar y eliminar los registros de la sala del usuario
+        registros_sala = repositorio.eliminar_registros_usuario(current_user.id, sala)
         
         if registros_sala == 0:
             return jsonify({
@@ -3158,8 +4192,7 @@ def api_eliminar_por_sala():
                 'registros_eliminados': 0
             })
         
-        # Eliminar registros de la sala del usuario
-        supabase.table('poker_results').delete().eq('user_id', current_user.id).eq('sala', sala).execute()
+        incrementar_version_datos(current_user.id)
         
         return jsonify({
             'mensaje': f'Se eliminaron {registros_sala} registros de la sala {sala}',
@@ -3183,23 +4216,20 @@ def api_salas_optimizado():
             print(f"🔍 Usando usuario por defecto: {user_id}")
         
         # Usar consulta optimizada para obtener salas únicas
-        salas_unicas = obtener_valores_unicos_optimizado('poker_results', 'sala', user_id)
+        salas_unicas = obtener_opciones_filtros(user_id)['salas']
         
-        # Ahora obtenemos un registro de ejemplo para cada sala
+        # Ahora obtenemos un registro de ejemplo para cada sala (solo las columnas que se muestran)
         salas_con_info = []
+        lectura = repositorio_lectura(user_id)
         for sala in salas_unicas:
             try:
-                # Obtener un registro de ejemplo de cada sala con reintentos
-                def obtener_ejemplo_sala():
-                    return supabase.table('poker_results').select('*').eq('user_id', user_id).eq('sala', sala).limit(1).execute()
-                
-                ejemplo = ejecutar_con_reintentos(obtener_ejemplo_sala)
-                if ejemplo.data:
+                ejemplo = lectura.ejemplo_sala(user_id, sala)
+                if ejemplo:
                     salas_con_info.append({
                         'sala': sala,
-                        'fecha_ejemplo': ejemplo.data[0].get('fecha'),
-                        'descripcion_ejemplo': ejemplo.data[0].get('descripcion', '')[:50] + '...' if ejemplo.data[0].get('descripcion') else '',
-                        'categoria_ejemplo': ejemplo.data[0].get('categoria')
+                        'fecha_ejemplo': ejemplo.get('fecha'),
+                        'descripcion_ejemplo': ejemplo.get('descripcion', '')[:50] + '...' if ejemplo.get('descripcion') else '',
+                        'categoria_ejemplo': ejemplo.get('categoria')
                     })
             except Exception as e:
                 print(f"⚠️  Error obteniendo ejemplo para sala {sala}: {e}")
@@ -3233,43 +4263,48 @@ def api_migrar_registros_admin():
         current_admin_id = str(current_user.id)
         print(f"🔄 Migrando registros al admin: {current_admin_id}")
         
-        # Obtener todos los registros que no pertenecen al admin actual
-        all_records = supabase.table('poker_results').select('*').neq('user_id', current_admin_id).execute()
-        records_to_migrate = all_records.data if all_records.data else []
+        # Recorrer por lotes los registros que no pertenecen al admin actual. La paginación
+        # keyset avanza por id, así que los lotes ya migrados no vuelven a aparecer.
+        migrated_count = 0
+        encontrados = 0
+        usuarios_origen = set()
+        lotes = repositorio.iterar_lotes(
+            'poker_results', 'id, user_id',
+            lambda q: q.neq('user_id', current_admin_id),
+            nombre='resultados.migrar_admin'
+        )
+        for numero_lote, batch in enumerate(lotes, 1):
+            encontrados += len(batch)
+            usuarios_origen.update(str(record['user_id']) for record in batch)
+            
+            # Todo el lote en una actualización in_('id', ...)
+            try:
+                migrados = repositorio.actualizar_por_ids(
+                    [record['id'] for record in batch], {'user_id': current_admin_id},
+                    nombre='resultados.migrar_admin_actualizar', tamano_lote=LOTE_ACTUALIZACION_IDS
+                )
+            except Exception as e:
+                print(f"❌ Error migrando lote {numero_lote}: {e}")
+                continue
+            migrated_count += migrados
+            
+            print(f"✅ Migrado lote {numero_lote}: {migrados} registros")
         
-        print(f"📊 Encontrados {len(records_to_migrate)} registros para migrar")
+        print(f"📊 Encontrados {encontrados} registros para migrar")
         
-        if not records_to_migrate:
+        if not encontrados:
             return jsonify({
                 'success': True,
                 'message': 'No hay registros para migrar',
                 'migrated_count': 0
             })
         
-        # Migrar en lotes de 1000 registros
-        migrated_count = 0
-        batch_size = 1000
-        
-        for i in range(0, len(records_to_migrate), batch_size):
-            batch = records_to_migrate[i:i + batch_size]
-            
-            # Actualizar user_id para este lote
-            record_ids = [record['id'] for record in batch]
-            
-            for record_id in record_ids:
-                try:
-                    supabase.table('poker_results').update({
-                        'user_id': current_admin_id
-                    }).eq('id', record_id).execute()
-                    migrated_count += 1
-                except Exception as e:
-                    print(f"❌ Error migrando registro {record_id}: {e}")
-                    continue
-            
-            print(f"✅ Migrado lote {i//batch_size + 1}: {len(batch)} registros")
-        
         print(f"✅ Migración completada: {migrated_count} registros migrados")
         
+        # Los registros cambiaron de usuario: invalidar la caché del admin y de los usuarios de origen
+        for usuario_afectado in {current_admin_id} | usuarios_origen:
+            incrementar_version_datos(usuario_afectado)
+        
         return jsonify({
             'success': True,
             'message': f'Se migraron {migrated_count} registros al usuario admin',
@@ -3280,6 +4315,69 @@ def api_migrar_registros_admin():
         print(f"❌ Error en migración: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/recategorizar', methods=['POST'])
+@login_required
+def api_admin_recategorizar():
+    """Recategorizar el historial con los clasificadores actuales (por defecto en modo simulación)"""
+    try:
+        if not current_user.is_admin:
+            return jsonify({'error': 'Solo administradores pueden ejecutar esta acción'}), 403
+
+        data = request.get_json(silent=True) or {}
+        user_id = None if data.get('todos') else (data.get('user_id') or str(current_user.id))
+        aplicar = bool(data.get('aplicar', False))
+        completo = bool(data.get('completo', False))
+
+        resultado = recategorizar_historial(user_id=user_id, aplicar=aplicar, completo=completo)
+        return jsonify({'success': True, **resultado})
+
+    except Exception as e:
+        print(f"❌ Error en recategorización: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/rollup-diario', methods=['POST'])
+@login_required
+def api_admin_rollup_diario():
+    """Verificar (por defecto) o reconstruir el rollup diario de un usuario o de todos"""
+    try:
+        if not current_user.is_admin:
+            return jsonify({'error': 'Solo administradores pueden ejecutar esta acción'}), 403
+
+        data = request.get_json(silent=True) or {}
+        user_id = None if data.get('todos') else (data.get('user_id') or str(current_user.id))
+        accion = data.get('accion', 'verificar')
+        if accion not in ('verificar', 'reconstruir'):
+            return jsonify({'error': "accion debe ser 'verificar' o 'reconstruir'"}), 400
+
+        if accion == 'reconstruir':
+            resultado = reconstruir_rollup_diario(user_id)
+        else:
+            resultado = verificar_rollup_diario(user_id)
+        return jsonify({'success': True, 'accion': accion, **resultado})
+
+    except Exception as e:
+        print(f"❌ Error en rollup diario: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/metricas-consultas', methods=['GET', 'DELETE'])
+@login_required
+def api_admin_metricas_consultas():
+    """Tiempo y filas por consulta de la capa de acceso a datos (DELETE reinicia los contadores)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Solo administradores pueden ejecutar esta acción'}), 403
+
+    if request.method == 'DELETE':
+        repositorio.metricas.reiniciar()
+        metricas_espejo.reiniciar()
+    return jsonify({
+        'success': True,
+        'consultas': repositorio.metricas.resumen(),
+        'consultas_espejo': metricas_espejo.resumen(),
+        'cache': cache_resultados.estadisticas(),
+        'respaldo': respaldo_resultados.estadisticas(),
+        'circuitos': {'supabase': circuito_supabase.estadisticas(), **circuitos_endpoints.estadisticas()}
+    })
+
 
 @app.route('/api/debug-consulta-salas', methods=['GET'])
 @login_required
@@ -3289,35 +4387,27 @@ def api_debug_consulta_salas():
         user_id = str(current_user.id)
         print(f"🔍 Debug consulta salas - Usuario: {user_id}")
         
-        # Consulta directa igual que en /api/informes/opciones
-        print("🔍 Ejecutando consulta: supabase.table('poker_results').select('sala').eq('user_id', user_id).range(0, 20000)")
-        salas_result = supabase.table('poker_results').select('sala').eq('user_id', user_id).range(0, 20000).execute()
-        
-        print(f"🔍 Resultado raw: {len(salas_result.data)} registros")
-        print(f"🔍 Primeros 10 registros: {salas_result.data[:10]}")
-        
-        # Obtener todas las salas únicas
-        todas_las_salas = [record['sala'] for record in salas_result.data if record.get('sala')]
-        salas_unicas = list(set(todas_las_salas))
+        # Recorrer todos los registros del usuario por lotes, contando por sala
+        conteo, resumen = agregar_lotes(
+            iterar_lotes_keyset('poker_results', 'sala', lambda q: q.eq('user_id', user_id)),
+            ('sala',), muestras=10
+        )
+        conteo_salas = {sala: fila['cantidad'] for (sala,), fila in conteo.items() if sala}
+        salas_unicas = list(conteo_salas)
         
-        print(f"🔍 Total registros con sala: {len(todas_las_salas)}")
+        print(f"🔍 Resultado: {resumen['registros']} registros")
+        print(f"🔍 Primeros 10 registros: {resumen['muestras']}")
         print(f"🔍 Salas únicas encontradas: {salas_unicas}")
-        
-        # Contar por sala
-        conteo_salas = {}
-        for sala in todas_las_salas:
-            conteo_salas[sala] = conteo_salas.get(sala, 0) + 1
-        
         print(f"🔍 Conteo por sala: {conteo_salas}")
         
         return jsonify({
             'success': True,
             'user_id': user_id,
-            'total_registros': len(salas_result.data),
-            'registros_con_sala': len(todas_las_salas),
+            'total_registros': resumen['registros'],
+            'registros_con_sala': sum(conteo_salas.values()),
             'salas_unicas': salas_unicas,
             'conteo_por_sala': conteo_salas,
-            'primeros_10': salas_result.data[:10]
+            'primeros_10': [{'sala': registro.get('sala')} for registro in resumen['muestras']]
         })
         
     except Exception as e:
@@ -3333,20 +4423,11 @@ def api_debug_usuarios():
         users_result = supabase.table('users').select('*').execute()
         users = users_result.data if users_result.data else []
         
-        # Obtener registros con sus user_ids
-        records_result = supabase.table('poker_results').select('user_id, sala').execute()
-        records = records_result.data if records_result.data else []
-        
-        # Agrupar por user_id
+        # Contar registros por usuario y sala recorriendo la tabla por lotes
+        conteo, _ = agregar_lotes(iterar_lotes_keyset('poker_results', 'user_id, sala'), ('user_id', 'sala'))
         user_records = {}
-        for record in records:
-            user_id = record.get('user_id')
-            sala = record.get('sala')
-            if user_id not in user_records:
-                user_records[user_id] = {}
-            if sala not in user_records[user_id]:
-                user_records[user_id][sala] = 0
-            user_records[user_id][sala] += 1
+        for (user_id, sala), fila in conteo.items():
+            user_records.setdefault(user_id, {})[sala] = fila['cantidad']
         
         return jsonify({
             'current_user': {
@@ -3369,38 +4450,39 @@ def api_debug_salas():
         user_id = str(current_user.id)
         print(f"🔍 Debug - Usuario: {user_id}")
         
-        # Consulta directa para ver todas las salas
-        result = supabase.table('poker_results').select('sala, user_id, fecha, descripcion').range(0, 20000).execute()
-        print(f"🔍 Debug - Todos los registros: {len(result.data)}")
+        # Contar por sala y usuario recorriendo toda la tabla por lotes
+        conteo, resumen = agregar_lotes(iterar_lotes_keyset('poker_results', 'sala, user_id'), ('sala', 'user_id'))
+        print(f"🔍 Debug - Todos los registros: {resumen['registros']}")
         
         # Analizar user_ids únicos
-        user_ids_unicos = list(set([str(r.get('user_id')) for r in result.data]))
+        user_ids_unicos = list({str(usuario) for _, usuario in conteo})
         print(f"🔍 Debug - User IDs únicos en BD: {user_ids_unicos}")
         
-        # Analizar salas únicas
-        salas_unicas = list(set([r['sala'] for r in result.data if r.get('sala')]))
-        print(f"🔍 Debug - Salas únicas en BD: {salas_unicas}")
-        
-        # Contar registros por sala
-        for sala in salas_unicas:
-            registros_sala = [r for r in result.data if r.get('sala') == sala]
-            user_ids_sala = list(set([str(r.get('user_id')) for r in registros_sala]))
-            print(f"🔍 Debug - Sala '{sala}': {len(registros_sala)} registros, User IDs: {user_ids_sala}")
-        
-        # Filtrar por usuario
-        user_records = [r for r in result.data if str(r.get('user_id')) == user_id]
-        print(f"🔍 Debug - Registros del usuario: {len(user_records)}")
-        
-        # Obtener salas únicas del usuario
-        user_salas = list(set([r['sala'] for r in user_records if r.get('sala')]))
+        # Registros y usuarios por sala
+        salas = {}
+        for (sala, usuario), fila in conteo.items():
+            if sala:
+                info = salas.setdefault(sala, {'registros': 0, 'user_ids': set()})
+                info['registros'] += fila['cantidad']
+                info['user_ids'].add(str(usuario))
+        print(f"🔍 Debug - Salas únicas en BD: {list(salas)}")
+        for sala, info in salas.items():
+            print(f"🔍 Debug - Sala '{sala}': {info['registros']} registros, User IDs: {list(info['user_ids'])}")
+        
+        # Registros y salas del usuario
+        user_records = sum(fila['cantidad'] for (_, usuario), fila in conteo.items() if str(usuario) == user_id)
+        user_salas = [sala for (sala, usuario) in conteo if sala and str(usuario) == user_id]
+        print(f"🔍 Debug - Registros del usuario: {user_records}")
         print(f"🔍 Debug - Salas del usuario: {user_salas}")
         
+        muestra = supabase.table('poker_results').select('sala, user_id, fecha, descripcion').eq('user_id', user_id).order('id').limit(5).execute()
+        
         return jsonify({
             'user_id': user_id,
-            'total_records': len(result.data),
-            'user_records': len(user_records),
+            'total_records': resumen['registros'],
+            'user_records': user_records,
             'user_salas': user_salas,
-            'sample_records': user_records[:5]  # Primeros 5 registros
+            'sample_records': muestra.data or []  # Primeros 5 registros
         })
     except Exception as e:
         print(f"❌ Debug error: {e}")
@@ -3418,15 +4500,15 @@ def api_salas_disponibles():
         print(f"🔍 API Salas Disponibles - Usuario: {user_id}")
         
         # Obtener salas únicas del usuario usando la función optimizada
-        salas = obtener_valores_unicos_optimizado('poker_results', 'sala', user_id)
+        salas = obtener_opciones_filtros(user_id)['salas']
         print(f"🔍 API Salas Disponibles - Salas encontradas: {salas}")
         
         # Contar registros por sala del usuario
+        lectura = repositorio_lectura(user_id)
         salas_info = []
         for sala in salas:
             try:
-                count_result = supabase.table('poker_results').select('id', count='exact').eq('user_id', user_id).eq('sala', sala).execute()
-                count = count_result.count if count_result.count else 0
+                count = lectura.contar_registros_usuario(user_id, sala)
                 salas_info.append({
                     'sala': sala,
                     'registros': count
@@ -3515,15 +4597,23 @@ def api_debug_estadisticas():
         user_id = str(current_user.id)
         print(f"🔍 DEBUG ESTADÍSTICAS - Usuario: {user_id}")
         
-        # Obtener todos los registros del usuario
-        all_user_records = obtener_registros_completos_supabase('poker_results', '*', user_id)
-        print(f"📊 Total registros del usuario: {len(all_user_records)}")
-        
-        # Calcular estadísticas específicas
-        torneos_jugados = len([r for r in all_user_records if r.get('categoria') == 'Torneo'])
-        total_invertido = sum([abs(float(record.get('importe', 0))) for record in all_user_records if float(record.get('importe', 0)) < 0])
-        total_ganancias = sum([float(record.get('importe', 0)) for record in all_user_records if float(record.get('importe', 0)) > 0])
-        total_importe = sum([float(record.get('importe', 0)) for record in all_user_records])
+        # Recorrer los registros del usuario página a página acumulando las estadísticas
+        total_registros = 0
+        torneos_jugados = 0
+        total_invertido = 0.0
+        total_ganancias = 0.0
+        for lote in obtener_registros_completos_supabase('poker_results', 'categoria, importe', user_id):
+            total_registros += len(lote)
+            for record in lote:
+                importe = float(record.get('importe') or 0)
+                if record.get('categoria') == 'Torneo':
+                    torneos_jugados += 1
+                if importe < 0:
+                    total_invertido += abs(importe)
+                elif importe > 0:
+                    total_ganancias += importe
+        total_importe = total_ganancias - total_invertido
+        print(f"📊 Total registros del usuario: {total_registros}")
         
         roi = 0.0
         if total_invertido > 0:
@@ -3536,7 +4626,7 @@ def api_debug_estadisticas():
             'total_importe': total_importe,
             'roi': roi,
             'resultado_economico': total_ganancias - total_invertido,
-            'total_registros': len(all_user_records)
+            'total_registros': total_registros
         }
         
         print(f"🎯 Estadísticas calculadas: {estadisticas}")
@@ -3545,7 +4635,7 @@ def api_debug_estadisticas():
             'success': True,
             'estadisticas': estadisticas,
             'debug_info': {
-                'total_registros_procesados': len(all_user_records),
+                'total_registros_procesados': total_registros,
                 'usuario': user_id
             }
         })
@@ -3554,329 +4644,38 @@ def api_debug_estadisticas():
         print(f"❌ Error en debug estadísticas: {e}")
         return jsonify({'error': str(e)}), 500
 
+def dataset_torneos_usuario(user_id):
+    """Dataset columnar de los torneos del usuario, cargado una vez por versión de datos"""
+    user_id = str(user_id)
+    return datasets_torneos.obtener(
+        user_id, obtener_version_datos(user_id),
+        lambda: repositorio_lectura(user_id).iterar_lotes_concurrente(
+            'poker_results', CAMPOS_DATASET,
+            lambda q: q.eq('user_id', user_id).eq('categoria', 'Torneo'),
+            nombre='resultados.dataset_torneos'
+        )
+    )
+
 @app.route('/api/analisis/insights', methods=['GET'])
-def api_analisis_insights():
-    """Análisis avanzado con insights para gestión del juego"""
+@cache_por_version('analisis_insights')
+def api_analisis_insights(user_id, args):
+    """
+    Análisis avanzado con insights para gestión del juego. `sections` limita el cálculo
+    a las secciones indicadas (p. ej. ?sections=buyin,recomendaciones).
+    """
     try:
-        # Usar usuario admin por defecto si no hay sesión
-        if current_user.is_authenticated:
-            user_id = str(current_user.id)
-        else:
-            user_id = "00000000-0000-0000-0000-000000000001"  # Usuario admin por defecto
-        
-        # Obtener todos los registros de torneos del usuario
-        result = supabase.table('poker_results').select('*').eq('user_id', user_id).eq('categoria', 'Torneo').execute()
-        torneos = result.data
-        
-        if not torneos:
-            return jsonify({'error': 'No hay datos de torneos para analizar'}), 400
-        
-        # Análisis por nivel de buy-in
-        analisis_buyin = analizar_rendimiento_por_buyin(torneos)
-        
-        # Análisis por sala
-        analisis_sala = analizar_rendimiento_por_sala(torneos)
-        
-        # Análisis temporal
-        analisis_temporal = analizar_patrones_temporales(torneos)
+        # Todos los torneos del usuario, compartidos con los endpoints de análisis de la API
+        dataset = dataset_torneos_usuario(user_id)
         
-        # Análisis por tipo de juego
-        analisis_juego = analizar_rendimiento_por_juego(torneos)
+        if not len(dataset):
+            return {'error': 'No hay datos de torneos para analizar'}, 400
         
-        # Análisis de consistencia
-        analisis_consistencia = analizar_consistencia_jugador(torneos)
-        
-        # Recomendaciones estratégicas
-        recomendaciones = generar_recomendaciones(analisis_buyin, analisis_temporal, analisis_juego, analisis_consistencia)
-        
-        return jsonify({
-            'analisis_buyin': analisis_buyin,
-            'analisis_sala': analisis_sala,
-            'analisis_temporal': analisis_temporal,
-            'analisis_juego': analisis_juego,
-            'analisis_consistencia': analisis_consistencia,
-            'recomendaciones': recomendaciones
-        })
+        return calcular_analisis(dataset, args.getlist('sections[]') or args.get('sections')), 200
         
+    except ValueError as e:
+        return {'error': str(e)}, 400
     except Exception as e:
-        return jsonify({'error': f'Error en análisis: {str(e)}'}), 500
-
-def analizar_rendimiento_por_buyin(torneos):
-    """Analiza el rendimiento por nivel de buy-in"""
-    buyin_stats = {}
-    
-    for torneo in torneos:
-        if torneo.get('nivel_buyin'):
-            nivel = torneo['nivel_buyin']
-            if nivel not in buyin_stats:
-                buyin_stats[nivel] = {
-                    'total_torneos': 0,
-                    'total_invertido': 0,
-                    'total_ganancias': 0,
-                    'roi': 0,
-                    'mejor_racha': 0,
-                    'peor_racha': 0,
-                    'racha_actual': 0,
-                    'salas': set()
-                }
-            
-            buyin_stats[nivel]['total_torneos'] += 1
-            importe = float(torneo.get('importe', 0))
-            buyin_stats[nivel]['total_invertido'] += abs(importe) if importe < 0 else 0
-            buyin_stats[nivel]['total_ganancias'] += importe if importe > 0 else 0
-            buyin_stats[nivel]['salas'].add(torneo.get('sala', ''))
-    
-    # Calcular ROI y rachas
-    for nivel, stats in buyin_stats.items():
-        if stats['total_invertido'] > 0:
-            stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
-        
-        # Calcular rachas (simplificado)
-        stats['mejor_racha'] = max(0, stats['total_ganancias'] / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
-        stats['peor_racha'] = min(0, (stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
-        
-        # Convertir set a lista para JSON
-        stats['salas'] = list(stats['salas'])
-    
-    return buyin_stats
-
-def analizar_rendimiento_por_sala(torneos):
-    """Analiza el rendimiento por sala"""
-    sala_stats = {}
-    
-    for torneo in torneos:
-        sala = torneo.get('sala')
-        if sala:
-            if sala not in sala_stats:
-                sala_stats[sala] = {
-                    'total_torneos': 0,
-                    'total_invertido': 0,
-                    'total_ganancias': 0,
-                    'roi': 0,
-                    'torneos_ganados': 0,
-                    'tipos_juego': set(),
-                    'niveles_buyin': set()
-                }
-            
-            importe = float(torneo.get('importe', 0))
-            sala_stats[sala]['total_torneos'] += 1
-            sala_stats[sala]['total_invertido'] += abs(importe) if importe < 0 else 0
-            sala_stats[sala]['total_ganancias'] += importe if importe > 0 else 0
-            
-            if importe > 0:
-                sala_stats[sala]['torneos_ganados'] += 1
-            
-            if torneo.get('tipo_juego'):
-                sala_stats[sala]['tipos_juego'].add(torneo['tipo_juego'])
-            
-            if torneo.get('nivel_buyin'):
-                sala_stats[sala]['niveles_buyin'].add(torneo['nivel_buyin'])
-    
-    # Calcular ROI y porcentaje de victorias
-    for sala, stats in sala_stats.items():
-        if stats['total_invertido'] > 0:
-            stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
-        
-        if stats['total_torneos'] > 0:
-            stats['porcentaje_victorias'] = (stats['torneos_ganados'] / stats['total_torneos']) * 100
-        
-        # Convertir sets a listas para JSON
-        stats['tipos_juego'] = list(stats['tipos_juego'])
-        stats['niveles_buyin'] = list(stats['niveles_buyin'])
-    
-    return sala_stats
-
-def analizar_patrones_temporales(torneos):
-    """Analiza patrones temporales de juego"""
-    from collections import defaultdict
-    from datetime import datetime
-    
-    # Agrupar por día de la semana
-    dias_semana = defaultdict(lambda: {'torneos': 0, 'resultado': 0})
-    dias_nombres = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    
-    # Agrupar por hora del día
-    horas_dia = defaultdict(lambda: {'torneos': 0, 'resultado': 0})
-    
-    for torneo in torneos:
-        fecha_str = torneo.get('fecha')
-        if fecha_str:
-            try:
-                fecha = datetime.fromisoformat(fecha_str).date()
-                dia_semana = fecha.weekday()
-                importe = float(torneo.get('importe', 0))
-                
-                dias_semana[dia_semana]['torneos'] += 1
-                dias_semana[dia_semana]['resultado'] += importe
-                
-                hora_str = torneo.get('hora')
-                if hora_str:
-                    try:
-                        hora = datetime.fromisoformat(f"2000-01-01T{hora_str}").hour
-                        horas_dia[hora]['torneos'] += 1
-                        horas_dia[hora]['resultado'] += importe
-                    except:
-                        pass
-            except:
-                pass
-    
-    # Procesar datos
-    patrones_dias = []
-    for i, dia in enumerate(dias_nombres):
-        if i in dias_semana:
-            patrones_dias.append({
-                'dia': dia,
-                'torneos': dias_semana[i]['torneos'],
-                'resultado_promedio': dias_semana[i]['resultado'] / dias_semana[i]['torneos'] if dias_semana[i]['torneos'] > 0 else 0
-            })
-    
-    patrones_horas = []
-    for hora in sorted(horas_dia.keys()):
-        patrones_horas.append({
-            'hora': f"{hora:02d}:00",
-            'torneos': horas_dia[hora]['torneos'],
-            'resultado_promedio': horas_dia[hora]['resultado'] / horas_dia[hora]['torneos'] if horas_dia[hora]['torneos'] > 0 else 0
-        })
-    
-    return {
-        'por_dia_semana': patrones_dias,
-        'por_hora': patrones_horas
-    }
-
-def analizar_rendimiento_por_juego(torneos):
-    """Analiza el rendimiento por tipo de juego"""
-    juego_stats = {}
-    
-    for torneo in torneos:
-        tipo_juego = torneo.get('tipo_juego')
-        if tipo_juego:
-            if tipo_juego not in juego_stats:
-                juego_stats[tipo_juego] = {
-                    'total_torneos': 0,
-                    'total_invertido': 0,
-                    'total_ganancias': 0,
-                    'roi': 0,
-                    'torneos_ganados': 0
-                }
-            
-            importe = float(torneo.get('importe', 0))
-            juego_stats[tipo_juego]['total_torneos'] += 1
-            juego_stats[tipo_juego]['total_invertido'] += abs(importe) if importe < 0 else 0
-            juego_stats[tipo_juego]['total_ganancias'] += importe if importe > 0 else 0
-            
-            if importe > 0:
-                juego_stats[tipo_juego]['torneos_ganados'] += 1
-    
-    # Calcular ROI y porcentaje de victorias
-    for juego, stats in juego_stats.items():
-        if stats['total_invertido'] > 0:
-            stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
-        
-        if stats['total_torneos'] > 0:
-            stats['porcentaje_victorias'] = (stats['torneos_ganados'] / stats['total_torneos']) * 100
-    
-    return juego_stats
-
-def analizar_consistencia_jugador(torneos):
-    """Analiza la consistencia del jugador"""
-    from collections import defaultdict
-    import statistics
-    from datetime import datetime
-    
-    resultados_diarios = defaultdict(float)
-    
-    for torneo in torneos:
-        fecha_str = torneo.get('fecha')
-        if fecha_str:
-            try:
-                fecha = datetime.fromisoformat(fecha_str).date()
-                importe = float(torneo.get('importe', 0))
-                resultados_diarios[fecha] += importe
-            except:
-                pass
-    
-    resultados = list(resultados_diarios.values())
-    
-    if not resultados:
-        return {'consistencia': 'Sin datos suficientes'}
-    
-    # Calcular métricas de consistencia
-    media = statistics.mean(resultados)
-    desviacion = statistics.stdev(resultados) if len(resultados) > 1 else 0
-    coeficiente_variacion = (desviacion / abs(media)) * 100 if media != 0 else 0
-    
-    # Días positivos vs negativos
-    dias_positivos = sum(1 for r in resultados if r > 0)
-    dias_negativos = sum(1 for r in resultados if r < 0)
-    dias_neutros = sum(1 for r in resultados if r == 0)
-    
-    return {
-        'dias_jugados': len(resultados),
-        'resultado_promedio_diario': media,
-        'desviacion_estandar': desviacion,
-        'coeficiente_variacion': coeficiente_variacion,
-        'dias_positivos': dias_positivos,
-        'dias_negativos': dias_negativos,
-        'dias_neutros': dias_neutros,
-        'consistencia': 'Alta' if coeficiente_variacion < 50 else 'Media' if coeficiente_variacion < 100 else 'Baja'
-    }
-
-def generar_recomendaciones(analisis_buyin, analisis_temporal, analisis_juego, analisis_consistencia):
-    """Genera recomendaciones estratégicas basadas en el análisis"""
-    recomendaciones = []
-    
-    # Recomendaciones por nivel de buy-in
-    mejor_buyin = max(analisis_buyin.items(), key=lambda x: x[1]['roi']) if analisis_buyin else None
-    peor_buyin = min(analisis_buyin.items(), key=lambda x: x[1]['roi']) if analisis_buyin else None
-    
-    if mejor_buyin and mejor_buyin[1]['roi'] > 0:
-        recomendaciones.append({
-            'tipo': 'buyin',
-            'titulo': f'Mejor rendimiento en {mejor_buyin[0]}',
-            'descripcion': f'Tu ROI en {mejor_buyin[0]} es del {mejor_buyin[1]["roi"]:.1f}%. Considera jugar más en este nivel.',
-            'prioridad': 'alta'
-        })
-    
-    if peor_buyin and peor_buyin[1]['roi'] < -20:
-        recomendaciones.append({
-            'tipo': 'buyin',
-            'titulo': f'Revisar estrategia en {peor_buyin[0]}',
-            'descripcion': f'Tu ROI en {peor_buyin[0]} es del {peor_buyin[1]["roi"]:.1f}%. Considera revisar tu estrategia o reducir la frecuencia.',
-            'prioridad': 'alta'
-        })
-    
-    # Recomendaciones por tipo de juego
-    mejor_juego = max(analisis_juego.items(), key=lambda x: x[1]['roi']) if analisis_juego else None
-    
-    if mejor_juego and mejor_juego[1]['roi'] > 0:
-        recomendaciones.append({
-            'tipo': 'juego',
-            'titulo': f'Fuerte en {mejor_juego[0]}',
-            'descripcion': f'Tu ROI en {mejor_juego[0]} es del {mejor_juego[1]["roi"]:.1f}% con {mejor_juego[1]["porcentaje_victorias"]:.1f}% de victorias.',
-            'prioridad': 'media'
-        })
-    
-    # Recomendaciones temporales
-    mejor_dia = max(analisis_temporal['por_dia_semana'], key=lambda x: x['resultado_promedio']) if analisis_temporal['por_dia_semana'] else None
-    
-    if mejor_dia and mejor_dia['resultado_promedio'] > 0:
-        recomendaciones.append({
-            'tipo': 'temporal',
-            'titulo': f'Mejor día: {mejor_dia["dia"]}',
-            'descripcion': f'Tu resultado promedio los {mejor_dia["dia"]}s es de ${mejor_dia["resultado_promedio"]:.2f}. Considera jugar más este día.',
-            'prioridad': 'baja'
-        })
-    
-    # Recomendaciones de consistencia
-    if analisis_consistencia.get('consistencia') == 'Baja':
-        recomendaciones.append({
-            'tipo': 'consistencia',
-            'titulo': 'Mejorar consistencia',
-            'descripcion': 'Tu juego muestra alta variabilidad. Considera establecer límites de pérdida y ganancia diarios.',
-            'prioridad': 'alta'
-        })
-    
-    return recomendaciones
+        return {'error': f'Error en análisis: {str(e)}'}, 500
 
 # =============================================================================
 # FUNCIONES AUXILIARES PARA SWAGGER
@@ -4029,9 +4828,11 @@ class ImportUpload(Resource):
             
             # Determinar tipo de archivo y procesar
             if filename.lower().endswith('.html'):
-                resultados_importados, duplicados_encontrados, duplicados_detalle = procesar_archivo_pokerstars(filepath, current_user.id)
+                resultado = procesar_archivo_pokerstars(filepath, current_user.id)
             else:
-                resultados_importados, duplicados_encontrados, duplicados_detalle = procesar_archivo_wpn(filepath, current_user.id)
+                resultado = procesar_archivo_wpn(filepath, current_user.id)
+            if 'error' in resultado:
+                return {'error': resultado['error']}, 500
             
             # Mover archivo a procesados
             processed_filename = f"procesados_{filename_with_timestamp}"
@@ -4039,10 +4840,10 @@ class ImportUpload(Resource):
             os.rename(filepath, processed_filepath)
             
             return {
-                'mensaje': f'Archivo procesado exitosamente. {resultados_importados} registros importados, {duplicados_encontrados} duplicados omitidos.',
-                'resultados_importados': resultados_importados,
-                'duplicados_encontrados': duplicados_encontrados,
-                'duplicados_detalle': duplicados_detalle
+                'mensaje': f"Archivo procesado exitosamente. {resultado['resultados_importados']} registros importados, {resultado['duplicados_encontrados']} duplicados omitidos.",
+                'resultados_importados': resultado['resultados_importados'],
+                'duplicados_encontrados': resultado['duplicados_encontrados'],
+                'duplicados_detalle': resultado['duplicados_detalle']
             }
             
         except Exception as e:
@@ -4123,27 +4924,13 @@ class InformesOpciones(Resource):
         """Obtener opciones disponibles para filtros"""
         try:
             # Obtener opciones únicas del usuario actual
-            response = supabase.table('poker_results').select('categoria, tipo_juego, nivel_buyin, sala').eq('user_id', current_user.id).execute()
-            
-            if not response.data:
-                return {
-                    'categorias': [],
-                    'tipos_juego': [],
-                    'niveles_buyin': [],
-                    'salas': []
-                }
-            
-            # Procesar datos
-            categorias = list(set([r['categoria'] for r in response.data if r['categoria']]))
-            tipos_juego = list(set([r['tipo_juego'] for r in response.data if r['tipo_juego']]))
-            niveles_buyin = list(set([r['nivel_buyin'] for r in response.data if r['nivel_buyin']]))
-            salas = list(set([r['sala'] for r in response.data if r['sala']]))
+            opciones = obtener_opciones_filtros(current_user.id)
             
             return {
-                'categorias': categorias,
-                'tipos_juego': tipos_juego,
-                'niveles_buyin': niveles_buyin,
-                'salas': salas
+                'categorias': opciones['categorias'],
+                'tipos_juego': opciones['tipos_juego'],
+                'niveles_buyin': opciones['niveles_buyin'],
+                'salas': opciones['salas']
             }
             
         except Exception as e:
@@ -4179,59 +4966,38 @@ class InformesResultados(Resource):
             page = int(args.get('page', 1))
             per_page = int(args.get('per_page', 50))
             
-            # Construir query base para el usuario actual
-            query = supabase.table('poker_results').select('*').eq('user_id', current_user.id)
-            
-            # Aplicar filtros
-            if categoria:
-                query = query.eq('categoria', categoria)
-            if tipo_juego:
-                query = query.eq('tipo_juego', tipo_juego)
-            if nivel_buyin:
-                query = query.eq('nivel_buyin', nivel_buyin)
-            if sala:
-                query = query.eq('sala', sala)
-            if fecha_inicio:
-                query = query.gte('fecha', fecha_inicio)
-            if fecha_fin:
-                query = query.lte('fecha', fecha_fin)
+            # Filtros sobre la consulta del repositorio (proyección explícita y medida)
+            def filtros(query):
+                if categoria:
+                    query = query.eq('categoria', categoria)
+                if tipo_juego:
+                    query = query.eq('tipo_juego', tipo_juego)
+                if nivel_buyin:
+                    query = query.eq('nivel_buyin', nivel_buyin)
+                if sala:
+                    query = query.eq('sala', sala)
+                if fecha_inicio:
+                    query = query.gte('fecha', fecha_inicio)
+                if fecha_fin:
+                    query = query.lte('fecha', fecha_fin)
+                return query
             
-            # Aplicar paginación
+            # Aplicar paginación (orden de la tabla de informes)
             offset = (page - 1) * per_page
-            response = query.range(offset, offset + per_page - 1).execute()
-            
-            # Calcular estadísticas básicas
-            stats_response = supabase.table('poker_results').select('importe, categoria, tipo_movimiento').eq('user_id', current_user.id).execute()
-            
-            total_registros = len(stats_response.data)
-            suma_importes = sum(float(r['importe']) for r in stats_response.data)
-            total_torneos = len([r for r in stats_response.data if r['categoria'] == 'Torneo'])
+            pagina = repositorio_lectura(current_user.id).pagina_resultados(current_user.id, filtros, offset, per_page)
             
-            # Calcular resultados diarios de los últimos 10 días (SIN FILTROS, desde fecha actual)
-            from datetime import timedelta
+            # Calcular estadísticas básicas sobre todos los registros, sumando lote a lote
+            por_categoria, resumen = agregar_lotes(lotes_usuario(current_user.id, 'importe, categoria', 'resultados.estadisticas_api'), ('categoria',))
             
-            # Obtener los últimos 10 días calendario desde HOY
-            hoy = datetime.now().date()
-            ultimos_10_dias = [hoy - timedelta(days=i) for i in range(10)]
-            ultimos_10_dias.reverse()  # Ordenar de más antiguo a más reciente
+            total_registros = resumen['registros']
+            suma_importes = sum(fila['suma'] for fila in por_categoria.values())
+            total_torneos = por_categoria.get(('Torneo',), {}).get('cantidad', 0)
             
-            # Obtener TODOS los movimientos de poker del usuario (sin filtros de fecha) para el gráfico
-            todos_movimientos_poker = supabase.table('poker_results').select('*').eq('user_id', current_user.id).neq('categoria', 'Transferencia').neq('categoria', 'Depósito').neq('tipo_movimiento', 'Retiro').execute()
-            
-            # Calcular resultado por día (incluir días sin datos como 0)
-            resultados_diarios = []
-            for fecha in ultimos_10_dias:
-                # Filtrar movimientos de poker para esta fecha específica
-                movimientos_dia = [r for r in todos_movimientos_poker.data if r['fecha'] == fecha.isoformat()]
-                resultado_dia = sum(float(r['importe']) for r in movimientos_dia)
-                resultados_diarios.append({
-                    'fecha': fecha.isoformat(),
-                    'resultado': resultado_dia,
-                    'movimientos': len(movimientos_dia)
-                })
+            # Resultados diarios de los últimos 10 días (SIN FILTROS): solo se lee esa ventana
+            resultados_diarios = resultados_diarios_usuario(current_user.id, dias_grafico())
             
             return {
-                'resultados': response.data,
+                'resultados': pagina,
                 'paginacion': {
                     'pagina_actual': page,
                     'por_pagina': per_page,
@@ -4258,9 +5024,8 @@ class EliminarTodos(Resource):
     def post(self):
         """Eliminar todos los registros del usuario actual"""
         try:
-            # Contar registros del usuario antes de eliminar
-            response = supabase.table('poker_results').select('id').eq('user_id', current_user.id).execute()
-            total_registros = len(response.data)
+            # Contar y eliminar todos los registros del usuario
+            total_registros = repositorio.eliminar_registros_usuario(current_user.id)
             
             if total_registros == 0:
                 return {
@@ -4268,8 +5033,7 @@ class EliminarTodos(Resource):
                     'registros_eliminados': 0
                 }
             
-            # Eliminar todos los registros del usuario
-            supabase.table('poker_results').delete().eq('user_id', current_user.id).execute()
+            incrementar_version_datos(current_user.id)
             
             return {
                 'mensaje': f'Se eliminaron {total_registros} registros exitosamente',
@@ -4296,15 +5060,13 @@ class EliminarPorSala(Resource):
             return {'error': 'Sala es requerida'}, 400
         
         try:
-            # Contar registros de la sala antes de eliminar
-            response = supabase.table('poker_results').select('id').eq('user_id', current_user.id).eq('sala', sala).execute()
-            total_registros = len(response.data)
+            # Contar y eliminar los registros de la sala específica
+            total_registros = repositorio.eliminar_registros_usuario(current_user.id, sala)
             
             if total_registros == 0:
                 return {'error': f'No se encontraron registros para la sala: {sala}'}, 400
             
-            # Eliminar registros de la sala específica
-            supabase.table('poker_results').delete().eq('user_id', current_user.id).eq('sala', sala).execute()
+            incrementar_version_datos(current_user.id)
             
             return {
                 'mensaje': f'Se eliminaron {total_registros} registros de la sala {sala} exitosamente',
@@ -4324,21 +5086,14 @@ class SalasDisponibles(Resource):
     def get(self):
         """Obtener las salas disponibles del usuario actual"""
         try:
-            response = supabase.table('poker_results').select('sala').eq('user_id', current_user.id).execute()
-            
-            # Contar registros por sala del usuario
-            salas_stats = {}
-            for r in response.data:
-                sala = r['sala']
-                if sala not in salas_stats:
-                    salas_stats[sala] = 0
-                salas_stats[sala] += 1
+            # Contar registros por sala del usuario, lote a lote
+            salas_stats, _ = agregar_lotes(lotes_usuario(current_user.id, 'sala', 'resultados.salas_api'), ('sala',))
             
             salas_info = [
                 {
                     'sala': sala,
-                    'registros': count
-                } for sala, count in salas_stats.items() if sala
+                    'registros': stats['cantidad']
+                } for (sala,), stats in salas_stats.items() if sala
             ]
             
             return {'salas': salas_info}
@@ -4356,10 +5111,13 @@ class AdminStats(Resource):
     def get(self):
         """Obtener estadísticas generales del usuario"""
         try:
-            # Obtener todos los registros del usuario
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).execute()
+            # Recorrer todos los registros del usuario sumando por sala y categoría
+            grupos, resumen = agregar_lotes(
+                lotes_usuario(current_user.id, 'sala, categoria, importe, fecha', 'resultados.estadisticas_admin'),
+                ('sala', 'categoria')
+            )
             
-            if not response.data:
+            if not resumen['registros']:
                 return {
                     'usuario': current_user.username,
                     'total_registros': 0,
@@ -4369,32 +5127,19 @@ class AdminStats(Resource):
                     'estadisticas_por_categoria': []
                 }
             
-            # Calcular estadísticas básicas
-            total_registros = len(response.data)
-            total_torneos = len([r for r in response.data if r['categoria'] == 'Torneo'])
-            
-            # Estadísticas por sala
+            # Estadísticas por sala y por categoría a partir de los grupos (sala, categoría)
             salas_stats = {}
-            for r in response.data:
-                sala = r['sala']
-                if sala not in salas_stats:
-                    salas_stats[sala] = {'registros': 0, 'total_importe': 0}
-                salas_stats[sala]['registros'] += 1
-                salas_stats[sala]['total_importe'] += float(r['importe'])
-            
-            # Estadísticas por categoría
             categorias_stats = {}
-            for r in response.data:
-                categoria = r['categoria']
-                if categoria not in categorias_stats:
-                    categorias_stats[categoria] = {'registros': 0, 'total_importe': 0}
-                categorias_stats[categoria]['registros'] += 1
-                categorias_stats[categoria]['total_importe'] += float(r['importe'])
+            for (sala, categoria), fila in grupos.items():
+                for stats in (salas_stats.setdefault(sala, {'registros': 0, 'total_importe': 0}),
+                              categorias_stats.setdefault(categoria, {'registros': 0, 'total_importe': 0})):
+                    stats['registros'] += fila['cantidad']
+                    stats['total_importe'] += fila['suma']
             
-            # Rango de fechas
-            fechas = [r['fecha'] for r in response.data if r['fecha']]
-            fecha_min = min(fechas) if fechas else None
-            fecha_max = max(fechas) if fechas else None
+            total_registros = resumen['registros']
+            total_torneos = categorias_stats.get('Torneo', {}).get('registros', 0)
+            fecha_min = resumen['fecha_min']
+            fecha_max = resumen['fecha_max']
             
             return {
                 'usuario': current_user.username,
@@ -4423,54 +5168,36 @@ class AdminStats(Resource):
         except Exception as e:
             return {'error': f'Error al obtener estadísticas: {str(e)}'}, 500
 
+def responder_analisis_api(secciones, error, clave=None):
+    """
+    Respuesta de los endpoints de análisis de la API desde el dataset compartido
+    con /api/analisis/insights. Con `clave` se devuelve solo esa sección.
+    """
+    try:
+        dataset = dataset_torneos_usuario(current_user.id)
+        
+        if not len(dataset):
+            return {'error': 'No hay datos de torneos para analizar'}, 400
+        
+        analisis = calcular_analisis(dataset, secciones)
+        return analisis[clave] if clave else analisis
+        
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': f'{error}: {str(e)}'}, 500
+
 @analysis_ns.route('/insights')
 class AnalisisInsights(Resource):
     @api.doc('get_analysis_insights')
+    @api.expect(api.parser().add_argument('sections', type=str, help='Secciones separadas por comas: buyin, sala, temporal, juego, consistencia, recomendaciones (por defecto, todas)'))
     @api.response(200, 'Análisis obtenido exitosamente')
     @api.response(400, 'No hay datos para analizar', error_model)
     @api.response(500, 'Error interno', error_model)
     @login_required
     def get(self):
         """Análisis avanzado con insights para gestión del juego"""
-        try:
-            # Obtener todos los registros de torneos del usuario actual
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            # Convertir a objetos similares a los de SQLAlchemy para compatibilidad
-            torneos = [TorneoResult(r) for r in response.data]
-            
-            # Análisis por nivel de buy-in
-            analisis_buyin = analizar_rendimiento_por_buyin(torneos)
-            
-            # Análisis por sala
-            analisis_sala = analizar_rendimiento_por_sala(torneos)
-            
-            # Análisis temporal
-            analisis_temporal = analizar_patrones_temporales(torneos)
-            
-            # Análisis por tipo de juego
-            analisis_juego = analizar_rendimiento_por_juego(torneos)
-            
-            # Análisis de consistencia
-            analisis_consistencia = analizar_consistencia_jugador(torneos)
-            
-            # Recomendaciones estratégicas
-            recomendaciones = generar_recomendaciones(analisis_buyin, analisis_temporal, analisis_juego, analisis_consistencia)
-            
-            return {
-                'analisis_buyin': analisis_buyin,
-                'analisis_sala': analisis_sala,
-                'analisis_temporal': analisis_temporal,
-                'analisis_juego': analisis_juego,
-                'analisis_consistencia': analisis_consistencia,
-                'recomendaciones': recomendaciones
-            }
-            
-        except Exception as e:
-            return {'error': f'Error en análisis: {str(e)}'}, 500
+        return responder_analisis_api(request.args.get('sections'), 'Error en análisis')
 
 @analysis_ns.route('/buyin')
 class AnalisisBuyin(Resource):
@@ -4481,18 +5208,7 @@ class AnalisisBuyin(Resource):
     @login_required
     def get(self):
         """Análisis de rendimiento por nivel de buy-in"""
-        try:
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            torneos = [TorneoResult(r) for r in response.data]
-            analisis = analizar_rendimiento_por_buyin(torneos)
-            return analisis
-            
-        except Exception as e:
-            return {'error': f'Error en análisis por buy-in: {str(e)}'}, 500
+        return responder_analisis_api(['buyin'], 'Error en análisis por buy-in', clave='analisis_buyin')
 
 @analysis_ns.route('/sala')
 class AnalisisSala(Resource):
@@ -4503,18 +5219,7 @@ class AnalisisSala(Resource):
     @login_required
     def get(self):
         """Análisis de rendimiento por sala"""
-        try:
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            torneos = [TorneoResult(r) for r in response.data]
-            analisis = analizar_rendimiento_por_sala(torneos)
-            return analisis
-            
-        except Exception as e:
-            return {'error': f'Error en análisis por sala: {str(e)}'}, 500
+        return responder_analisis_api(['sala'], 'Error en análisis por sala', clave='analisis_sala')
 
 @analysis_ns.route('/temporal')
 class AnalisisTemporal(Resource):
@@ -4525,18 +5230,7 @@ class AnalisisTemporal(Resource):
     @login_required
     def get(self):
         """Análisis de patrones temporales"""
-        try:
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            torneos = [TorneoResult(r) for r in response.data]
-            analisis = analizar_patrones_temporales(torneos)
-            return analisis
-            
-        except Exception as e:
-            return {'error': f'Error en análisis temporal: {str(e)}'}, 500
+        return responder_analisis_api(['temporal'], 'Error en análisis temporal', clave='analisis_temporal')
 
 @analysis_ns.route('/juego')
 class AnalisisJuego(Resource):
@@ -4547,18 +5241,7 @@ class AnalisisJuego(Resource):
     @login_required
     def get(self):
         """Análisis de rendimiento por tipo de juego"""
-        try:
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            torneos = [TorneoResult(r) for r in response.data]
-            analisis = analizar_rendimiento_por_juego(torneos)
-            return analisis
-            
-        except Exception as e:
-            return {'error': f'Error en análisis por juego: {str(e)}'}, 500
+        return responder_analisis_api(['juego'], 'Error en análisis por juego', clave='analisis_juego')
 
 @analysis_ns.route('/consistencia')
 class AnalisisConsistencia(Resource):
@@ -4569,34 +5252,7 @@ class AnalisisConsistencia(Resource):
     @login_required
     def get(self):
         """Análisis de consistencia del jugador"""
-        try:
-            response = supabase.table('poker_results').select('*').eq('user_id', current_user.id).eq('categoria', 'Torneo').execute()
-            
-            if not response.data:
-                return {'error': 'No hay datos de torneos para analizar'}, 400
-            
-            torneos = [TorneoResult(r) for r in response.data]
-            analisis = analizar_consistencia_jugador(torneos)
-            return analisis
-            
-        except Exception as e:
-            return {'error': f'Error en análisis de consistencia: {str(e)}'}, 500
-
-# =============================================================================
-# FUNCIONES DE ANÁLISIS
-# =============================================================================
-
-class TorneoResult:
-    """Clase auxiliar para compatibilidad con las funciones de análisis"""
-    def __init__(self, data):
-        self.fecha = datetime.strptime(data['fecha'], '%Y-%m-%d').date() if isinstance(data['fecha'], str) else data['fecha']
-        self.hora = datetime.strptime(data['hora'], '%H:%M:%S').time() if data['hora'] and isinstance(data['hora'], str) else data['hora']
-        self.importe = float(data['importe'])
-        self.nivel_buyin = data['nivel_buyin']
-        self.sala = data['sala']
-        self.tipo_juego = data['tipo_juego']
-        self.descripcion = data['descripcion']
-
+        return responder_analisis_api(['consistencia'], 'Error en análisis de consistencia', clave='analisis_consistencia')
 
 if __name__ == '__main__':
     print("🚀 Iniciando aplicación funcional con Supabase...")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark del análisis avanzado: cálculo registro a registro (diccionarios, con
+fecha, hora e importe convertidos en cada analizador) frente al motor vectorizado
+de analisis_torneos.py, con 10k, 100k y 1M torneos. Comprueba además que los dos
+producen exactamente el mismo JSON.
+
+Uso: python benchmark_analisis.py [filas ...]
+"""
+
+import json
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from analisis_torneos import DatasetTorneos, calcular_analisis, generar_recomendaciones
+
+TAMANOS = [10_000, 100_000, 1_000_000]
+TAMANO_LOTE = 1000
+
+# =============================================================================
+# CÁLCULO REGISTRO A REGISTRO (referencia)
+# =============================================================================
+
+def _acumular(stats, importe):
+    stats['total_torneos'] += 1
+    stats['total_invertido'] += abs(importe) if importe < 0 else 0
+    stats['total_ganancias'] += importe if importe > 0 else 0
+
+def _roi(stats):
+    if stats['total_invertido'] > 0:
+        stats['roi'] = ((stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido']) * 100
+
+def buyin_por_registros(torneos):
+    buyin_stats = {}
+    for torneo in torneos:
+        if torneo.get('nivel_buyin'):
+            stats = buyin_stats.setdefault(torneo['nivel_buyin'], {
+                'total_torneos': 0, 'total_invertido': 0, 'total_ganancias': 0, 'roi': 0,
+                'mejor_racha': 0, 'peor_racha': 0, 'racha_actual': 0, 'salas': {}
+            })
+            _acumular(stats, float(torneo.get('importe', 0)))
+            stats['salas'][torneo.get('sala', '')] = True
+    for stats in buyin_stats.values():
+        _roi(stats)
+        stats['mejor_racha'] = max(0, stats['total_ganancias'] / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
+        stats['peor_racha'] = min(0, (stats['total_ganancias'] - stats['total_invertido']) / stats['total_invertido'] if stats['total_invertido'] > 0 else 0)
+        stats['salas'] = list(stats['salas'])
+    return buyin_stats
+
+def rendimiento_por_registros(torneos, campo):
+    stats_por_clave = {}
+    for torneo in torneos:
+        clave = torneo.get(campo)
+        if clave:
+            stats = stats_por_clave.setdefault(clave, {'total_torneos': 0, 'total_invertido': 0, 'total_ganancias': 0, 'roi': 0, 'torneos_ganados': 0})
+            importe = float(torneo.get('importe', 0))
+            _acumular(stats, importe)
+            if importe > 0:
+                stats['torneos_ganados'] += 1
+            if campo == 'sala':
+                stats.setdefault('tipos_juego', {})
+                stats.setdefault('niveles_buyin', {})
+                if torneo.get('tipo_juego'):
+                    stats['tipos_juego'][torneo['tipo_juego']] = True
+                if torneo.get('nivel_buyin'):
+                    stats['niveles_buyin'][torneo['nivel_buyin']] = True
+    for stats in stats_por_clave.values():
+        _roi(stats)
+        stats['porcentaje_victorias'] = (stats['torneos_ganados'] / stats['total_torneos']) * 100
+        if campo == 'sala':
+            stats['tipos_juego'] = list(stats['tipos_juego'])
+            stats['niveles_buyin'] = list(stats['niveles_buyin'])
+    return stats_por_clave
+
+def temporal_por_registros(torneos):
+    dias_semana = defaultdict(lambda: {'torneos': 0, 'resultado': 0})
+    horas_dia = defaultdict(lambda: {'torneos': 0, 'resultado': 0})
+    for torneo in torneos:
+        if torneo.get('fecha'):
+            try:
+                dia = datetime.fromisoformat(torneo['fecha']).date().weekday()
+                importe = float(torneo.get('importe', 0))
+                dias_semana[dia]['torneos'] += 1
+                dias_semana[dia]['resultado'] += importe
+                if torneo.get('hora'):
+                    try:
+                        hora = datetime.fromisoformat(f"2000-01-01T{torneo['hora']}").hour
+                        horas_dia[hora]['torneos'] += 1
+                        horas_dia[hora]['resultado'] += importe
+                    except ValueError:
+                        pass
+            except (TypeError, ValueError):
+                pass
+    nombres = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+    return {
+        'por_dia_semana': [{'dia': nombre, 'torneos': dias_semana[i]['torneos'], 'resultado_promedio': dias_semana[i]['resultado'] / dias_semana[i]['torneos']}
+                           for i, nombre in enumerate(nombres) if i in dias_semana],
+        'por_hora': [{'hora': f"{hora:02d}:00", 'torneos': horas_dia[hora]['torneos'], 'resultado_promedio': horas_dia[hora]['resultado'] / horas_dia[hora]['torneos']}
+                     for hora in sorted(horas_dia)]
+    }
+
+def consistencia_por_registros(torneos):
+    resultados_diarios = defaultdict(float)
+    for torneo in torneos:
+        if torneo.get('fecha'):
+            try:
+                resultados_diarios[datetime.fromisoformat(torneo['fecha']).date()] += float(torneo.get('importe', 0))
+            except (TypeError, ValueError):
+                pass
+    resultados = list(resultados_diarios.values())
+    if not resultados:
+        return {'consistencia': 'Sin datos suficientes'}
+    media = statistics.mean(resultados)
+    desviacion = statistics.stdev(resultados) if len(resultados) > 1 else 0
+    coeficiente_variacion = (desviacion / abs(media)) * 100 if media != 0 else 0
+    return {
+        'dias_jugados': len(resultados),
+        'resultado_promedio_diario': media,
+        'desviacion_estandar': desviacion,
+        'coeficiente_variacion': coeficiente_variacion,
+        'dias_positivos': sum(1 for r in resultados if r > 0),
+        'dias_negativos': sum(1 for r in resultados if r < 0),
+        'dias_neutros': sum(1 for r in resultados if r == 0),
+        'consistencia': 'Alta' if coeficiente_variacion < 50 else 'Media' if coeficiente_variacion < 100 else 'Baja'
+    }
+
+def analisis_por_registros(torneos):
+    """Mismas secciones que /api/analisis/insights, recorriendo los registros en Python"""
+    buyin = buyin_por_registros(torneos)
+    temporal = temporal_por_registros(torneos)
+    juego = rendimiento_por_registros(torneos, 'tipo_juego')
+    consistencia = consistencia_por_registros(torneos)
+    return {
+        'analisis_buyin': buyin,
+        'analisis_sala': rendimiento_por_registros(torneos, 'sala'),
+        'analisis_temporal': temporal,
+        'analisis_juego': juego,
+        'analisis_consistencia': consistencia,
+        'recomendaciones': generar_recomendaciones(buyin, temporal, juego, consistencia)
+    }
+
+# =============================================================================
+# DATOS Y MEDICIÓN
+# =============================================================================
+
+def generar_torneos(cantidad, semilla=42):
+    """Torneos sintéticos con la forma de poker_results (incluye valores vacíos y no válidos)"""
+    random.seed(semilla)
+    inicio = date(2020, 1, 1)
+    fechas = [(inicio + timedelta(days=dia)).isoformat() for dia in range(2000)] + [None, 'sin fecha']
+    horas = [f"{hora:02d}:{minuto:02d}:00" for hora in range(24) for minuto in range(0, 60, 5)] + [None, '']
+    niveles = ['Micro', 'Bajo', 'Medio', 'Alto', None, '']
+    salas = ['WPN', 'Pokerstars', 'GGPoker', None]
+    juegos = ['NLH', 'PLO', 'PLO5', 'Mixto', None]
+    return [{
+        'fecha': random.choice(fechas),
+        'hora': random.choice(horas),
+        'importe': round(random.uniform(-120, 100), 2) if random.random() < 0.97 else 0,
+        'nivel_buyin': random.choice(niveles),
+        'sala': random.choice(salas),
+        'tipo_juego': random.choice(juegos),
+    } for _ in range(cantidad)]
+
+def en_lotes(registros, tamano=TAMANO_LOTE):
+    for i in range(0, len(registros), tamano):
+        yield registros[i:i + tamano]
+
+def json_canonico(analisis):
+    return json.dumps(analisis, sort_keys=True, ensure_ascii=False)
+
+def medir(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+def main(tamanos):
+    print(f"{'filas':>10} | {'por registro':>12} | {'dataset':>9} | {'análisis':>9} | {'aceleración':>11} | JSON")
+    print('-' * 72)
+    for cantidad in tamanos:
+        torneos = generar_torneos(cantidad)
+        referencia, segundos_referencia = medir(lambda: analisis_por_registros(torneos))
+        dataset, segundos_dataset = medir(lambda: DatasetTorneos(en_lotes(torneos)))
+        vectorizado, segundos_analisis = medir(lambda: calcular_analisis(dataset))
+        identico = json_canonico(referencia) == json_canonico(vectorizado)
+        print(f"{cantidad:>10,} | {segundos_referencia * 1000:>10.0f}ms | {segundos_dataset * 1000:>7.0f}ms | "
+              f"{segundos_analisis * 1000:>7.1f}ms | {segundos_referencia / segundos_analisis:>10.0f}x | {'idéntico' if identico else 'DISTINTO'}")
+        assert identico, f"El JSON vectorizado difiere con {cantidad} filas"
+
+if __name__ == '__main__':
+    main([int(argumento) for argumento in sys.argv[1:]] or TAMANOS)
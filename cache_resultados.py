@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché en memoria para las respuestas de informes y análisis.
+
+Las claves incluyen la versión de datos del usuario (user, versión, endpoint, filtros),
+por lo que una importación, eliminación o reclasificación deja inalcanzables las
+entradas anteriores sin necesidad de recorrerlas. La expulsión es LRU con un
+presupuesto de memoria medido sobre el tamaño serializado de cada respuesta.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Parámetros que no cambian el resultado (p. ej. el anti-caché de jQuery)
+PARAMETROS_IGNORADOS = {'_'}
+
+# Parámetros cuyo orden cambia la consulta (columnas del pivot): se conservan tal cual
+PARAMETROS_ORDENADOS = {'dimensiones', 'medidas', 'dimensiones[]', 'medidas[]'}
+
+
+def normalizar_filtros(args, ignorar=PARAMETROS_IGNORADOS):
+    """
+    Convierte los parámetros de una petición (MultiDict de Flask o dict) en una tupla
+    ordenada y hashable: `salas[]` y `salas` se tratan igual, los valores de cada
+    parámetro se ordenan y los vacíos se descartan. Los de `PARAMETROS_ORDENADOS`
+    conservan su nombre y el orden de sus valores, porque definen las columnas de la consulta.
+    """
+    normalizados = {}
+    for clave in args.keys():
+        if clave in ignorar:
+            continue
+        valores = args.getlist(clave) if hasattr(args, 'getlist') else args[clave]
+        if not isinstance(valores, (list, tuple)):
+            valores = [valores]
+        valores = [str(v).strip() for v in valores if v is not None and str(v).strip() != '']
+        if not valores:
+            continue
+        if clave in PARAMETROS_ORDENADOS:
+            normalizados[clave] = tuple(valores)
+        else:
+            normalizados.setdefault(clave[:-2] if clave.endswith('[]') else clave, set()).update(valores)
+    return tuple(
+        (clave, valores if isinstance(valores, tuple) else tuple(sorted(valores)))
+        for clave, valores in sorted(normalizados.items())
+    )
+
+
+def etag_respuesta(*partes):
+    """
+    ETag fuerte (sin comillas) para las partes que determinan una respuesta:
+    usuario, versión de datos, endpoint y filtros normalizados. Misma entrada,
+    mismo ETag en cualquier proceso.
+    """
+    return hashlib.sha256(json.dumps(partes, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+
+def tamano_respuesta(valor):
+    """Tamaño aproximado en bytes de una respuesta JSON"""
+    return len(json.dumps(valor, default=str, ensure_ascii=False).encode('utf-8'))
+
+
+class CacheLRU:
+    """Caché LRU con presupuesto de memoria en bytes, segura entre hilos"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave -> (valor, tamaño)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        """Devuelve el valor cacheado o None, marcándolo como usado recientemente"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, clave, valor):
+        """Guarda un valor expulsando las entradas menos usadas hasta respetar el presupuesto"""
+        tamano = tamano_respuesta(valor)
+        if tamano > self.max_bytes:
+            return False
+
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+
+            while self._entradas and self._bytes + tamano > self.max_bytes:
+                _, (_, tamano_expulsado) = self._entradas.popitem(last=False)
+                self._bytes -= tamano_expulsado
+
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+        return True
+
+    def invalidar_usuario(self, user_id):
+        """Libera de inmediato las entradas de un usuario (las claves empiezan por su id)"""
+        user_id = str(user_id)
+        with self._lock:
+            claves = [clave for clave in self._entradas if clave[0] == user_id]
+            for clave in claves:
+                self._bytes -= self._entradas.pop(clave)[1]
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos
+            }
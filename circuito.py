@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Circuit breakers para la capa de datos.
+
+Cuando Supabase falla de forma repetida, seguir reintentando cada petición solo
+acumula carga y latencia. Un circuito cuenta los fallos consecutivos (o las
+llamadas que superan su presupuesto de latencia); al alcanzar el umbral se abre
+y las llamadas fallan al instante con `CircuitoAbierto` durante `apertura_segundos`.
+Pasado ese tiempo deja pasar una única llamada de prueba (semiabierto): si va bien
+se cierra y, si falla, vuelve a abrirse.
+"""
+
+import threading
+import time
+
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+
+class CircuitoAbierto(Exception):
+    """La llamada no se ha hecho porque el circuito está abierto"""
+
+    def __init__(self, nombre, reintentar_en):
+        super().__init__(f"Circuito '{nombre}' abierto, reintentar en {reintentar_en:.0f}s")
+        self.nombre = nombre
+        self.reintentar_en = reintentar_en
+
+
+class CircuitBreaker:
+    """Circuito con umbral de fallos consecutivos y presupuesto de latencia"""
+
+    def __init__(self, nombre, max_fallos=5, apertura_segundos=30.0, latencia_max=None, al_cerrar=None):
+        self.nombre = nombre
+        self.max_fallos = max_fallos
+        self.apertura_segundos = apertura_segundos
+        # Una llamada que tarda más que latencia_max cuenta como fallo aunque responda
+        self.latencia_max = latencia_max
+        # Función que se llama (fuera del lock) cuando el circuito se recupera
+        self.al_cerrar = al_cerrar
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self.aperturas = 0
+        self.rechazadas = 0
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado_actual()
+
+    def _estado_actual(self):
+        if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.apertura_segundos:
+            self._estado = SEMIABIERTO
+            self._prueba_en_curso = False
+        return self._estado
+
+    def segundos_para_reintento(self):
+        with self._lock:
+            if self._estado != ABIERTO:
+                return 0.0
+            return max(0.0, self.apertura_segundos - (time.monotonic() - self._abierto_desde))
+
+    def permitir(self):
+        """Indica si se puede hacer la llamada (en semiabierto solo una a la vez)"""
+        with self._lock:
+            estado = self._estado_actual()
+            if estado == CERRADO:
+                return True
+            if estado == SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            self.rechazadas += 1
+            return False
+
+    def registrar_exito(self, segundos=None):
+        if self.latencia_max is not None and segundos is not None and segundos > self.latencia_max:
+            print(f"🐢 Circuito '{self.nombre}': {segundos:.2f}s supera el presupuesto de {self.latencia_max:.2f}s")
+            self.registrar_fallo()
+            return
+
+        with self._lock:
+            recuperado = self._estado != CERRADO
+            self._estado = CERRADO
+            self._fallos = 0
+            self._prueba_en_curso = False
+        if recuperado:
+            print(f"✅ Circuito '{self.nombre}' cerrado de nuevo")
+            if self.al_cerrar:
+                self.al_cerrar(self.nombre)
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self._estado == SEMIABIERTO or self._fallos >= self.max_fallos:
+                if self._estado != ABIERTO:
+                    self.aperturas += 1
+                    print(f"🚨 Circuito '{self.nombre}' abierto tras {self._fallos} fallos ({self.apertura_segundos:.0f}s)")
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+
+    def llamar(self, func):
+        """Ejecuta func() a través del circuito"""
+        if not self.permitir():
+            raise CircuitoAbierto(self.nombre, self.segundos_para_reintento())
+        inicio = time.monotonic()
+        try:
+            resultado = func()
+        except Exception:
+            self.registrar_fallo()
+            raise
+        self.registrar_exito(time.monotonic() - inicio)
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'estado': self._estado_actual(),
+                'fallos_consecutivos': self._fallos,
+                'max_fallos': self.max_fallos,
+                'apertura_segundos': self.apertura_segundos,
+                'latencia_max': self.latencia_max,
+                'aperturas': self.aperturas,
+                'rechazadas': self.rechazadas
+            }
+
+
+class GestorCircuitos:
+    """Un circuito por nombre (endpoint), cada uno con su propio presupuesto"""
+
+    def __init__(self, presupuestos=None, por_defecto=None, al_cerrar=None):
+        self.presupuestos = presupuestos or {}
+        self.por_defecto = por_defecto or {}
+        self.al_cerrar = al_cerrar
+        self._circuitos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, nombre):
+        with self._lock:
+            circuito = self._circuitos.get(nombre)
+            if circuito is None:
+                parametros = {**self.por_defecto, **self.presupuestos.get(nombre, {})}
+                circuito = CircuitBreaker(nombre, al_cerrar=self.al_cerrar, **parametros)
+                self._circuitos[nombre] = circuito
+            return circuito
+
+    def estadisticas(self):
+        with self._lock:
+            circuitos = dict(self._circuitos)
+        return {nombre: circuito.estadisticas() for nombre, circuito in circuitos.items()}
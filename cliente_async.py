@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ruta de datos asíncrona para Supabase (PostgREST).
+
+Un único httpx.AsyncClient con HTTP/2 y keep-alive se comparte entre todas las
+peticiones y vive en un bucle de eventos propio, en un hilo en segundo plano.
+Los endpoints de Flask (síncronos) le entregan varias consultas independientes y
+esperan a que se resuelvan en paralelo: el worker queda bloqueado lo que tarde la más
+lenta, no la suma de todas. Los reintentos de cada consulta esperan con asyncio.sleep
+y backoff exponencial con jitter, a la vez que las demás consultas del lote.
+Las consultas sueltas siguen usando el cliente síncrono (ejecutar_con_reintentos).
+
+El bucle, su hilo y el cliente HTTP se crean en el primer uso y se vuelven a crear
+si el proceso cambió (fork de gunicorn con --preload): los hilos no sobreviven al fork.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from postgrest import AsyncPostgrestClient
+
+from circuito import CircuitoAbierto
+
+# Errores de red que justifican reintentar una consulta
+ERRORES_TRANSITORIOS = (httpx.ReadError, httpx.ConnectError, httpx.TimeoutException, httpx.RemoteProtocolError)
+
+
+def calcular_espera(intento, base=0.25, maximo=4.0):
+    """Backoff exponencial con jitter completo: espera aleatoria entre 0 y base * 2^intento"""
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+async def ejecutar_con_reintentos_async(func, max_intentos=3, base=0.25, maximo=4.0, circuito=None):
+    """
+    Ejecuta una corrutina con reintentos ante errores de red transitorios. Si se indica
+    el circuito y se abre durante la espera, no se hacen más intentos.
+    """
+    for intento in range(max_intentos):
+        try:
+            return await func()
+        except ERRORES_TRANSITORIOS as e:
+            if intento == max_intentos - 1:
+                print(f"❌ Todos los intentos fallaron después de {max_intentos} intentos")
+                raise
+            espera = calcular_espera(intento, base, maximo)
+            print(f"⚠️  Intento {intento + 1} falló: {type(e).__name__}: {e} - reintentando en {espera:.2f}s")
+            await asyncio.sleep(espera)
+            if circuito is not None and circuito.segundos_para_reintento() > 0:
+                print(f"🚨 Circuito '{circuito.nombre}' abierto durante la espera, sin más reintentos")
+                raise
+
+
+class ClienteSupabaseAsync:
+    """Cliente PostgREST asíncrono con un pool de conexiones HTTP/2 compartido"""
+
+    def __init__(self, url, key, max_conexiones=20, max_keepalive=10, keepalive_segundos=30.0, timeout=30.0, metricas=None, circuito=None):
+        self.url = url
+        self.key = key
+        self.limites = httpx.Limits(
+            max_connections=max_conexiones,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_segundos
+        )
+        self.timeout = timeout
+        self.metricas = metricas
+        # Circuito de la capa de datos (ver circuito.py), compartido con el cliente síncrono
+        self.circuito = circuito
+        self.http2 = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+
+    def _iniciar(self):
+        """Crea (en el primer uso o tras un fork) el bucle, su hilo y el cliente HTTP"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._hilo = threading.Thread(target=self._loop.run_forever, name='supabase-async', daemon=True)
+            self._hilo.start()
+
+            try:
+                self.http = httpx.AsyncClient(http2=True, limits=self.limites, timeout=self.timeout, follow_redirects=True)
+                self.http2 = True
+            except ImportError:
+                # El paquete h2 es opcional: sin él se usa HTTP/1.1 con el mismo pool keep-alive
+                print("⚠️  Paquete h2 no disponible, el cliente asíncrono usará HTTP/1.1")
+                self.http = httpx.AsyncClient(limits=self.limites, timeout=self.timeout, follow_redirects=True)
+                self.http2 = False
+
+            self.postgrest = AsyncPostgrestClient(
+                f"{self.url.rstrip('/')}/rest/v1",
+                headers={
+                    'apikey': self.key,
+                    'Authorization': f'Bearer {self.key}',
+                    'Accept': 'application/json',
+                    'Content-Type': 'application/json'
+                },
+                http_client=self.http
+            )
+            self._pid = os.getpid()
+
+    def table(self, nombre):
+        """Constructor de consultas (misma API que el cliente síncrono, pero con execute() asíncrono)"""
+        self._iniciar()
+        return self.postgrest.from_(nombre)
+
+    def rpc(self, nombre, parametros):
+        self._iniciar()
+        return self.postgrest.rpc(nombre, parametros)
+
+    async def _ejecutar_medida(self, nombre, consulta):
+        inicio = time.perf_counter()
+        try:
+            resultado = await ejecutar_con_reintentos_async(consulta.execute, circuito=self.circuito)
+        except Exception:
+            if self.metricas:
+                self.metricas.registrar_error(nombre)
+            raise
+        if self.metricas:
+            datos = resultado.data
+            filas = len(datos) if isinstance(datos, list) else (1 if datos else 0)
+            self.metricas.registrar(nombre, time.perf_counter() - inicio, filas)
+        return resultado
+
+    def ejecutar_concurrente(self, consultas, timeout=60):
+        """
+        Ejecuta a la vez un diccionario {nombre: consulta} y devuelve {nombre: resultado}.
+        Si una consulta falla, su valor es la excepción, para que el llamador decida
+        qué resultados son imprescindibles. El lote cuenta como una sola llamada para el
+        circuito: con el circuito abierto no se lanza ninguna consulta.
+        """
+        if self.circuito and not self.circuito.permitir():
+            error = CircuitoAbierto(self.circuito.nombre, self.circuito.segundos_para_reintento())
+            return {nombre: error for nombre in consultas}
+
+        async def todas():
+            nombres = list(consultas)
+            resultados = await asyncio.gather(
+                *(self._ejecutar_medida(nombre, consultas[nombre]) for nombre in nombres),
+                return_exceptions=True
+            )
+            return dict(zip(nombres, resultados))
+
+        self._iniciar()
+        try:
+            resultados = asyncio.run_coroutine_threadsafe(todas(), self._loop).result(timeout)
+        except Exception:
+            if self.circuito:
+                self.circuito.registrar_fallo()
+            raise
+        if self.circuito:
+            if any(isinstance(resultado, ERRORES_TRANSITORIOS) for resultado in resultados.values()):
+                self.circuito.registrar_fallo()
+            else:
+                self.circuito.registrar_exito()
+        return resultados
+
+    def cerrar(self):
+        if self._pid != os.getpid():
+            return
+        asyncio.run_coroutine_threadsafe(self.http.aclose(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._pid = None
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Espejo local (SQLite) de los resultados de cada usuario.
+
+Cada usuario tiene su propio fichero `<directorio>/<user_id>.sqlite3` con una copia
+de sus filas de poker_results. La sincronización es incremental:
+- filas nuevas: keyset sobre (created_at, id) a partir de la última fila copiada,
+  volviendo a leer una ventana de solape (una transacción que confirma tarde puede
+  tener un created_at anterior a filas ya copiadas);
+- modificaciones y eliminaciones: tabla poker_results_cambios (triggers en Supabase),
+  leída a partir del último seq aplicado, también con solape (el seq se asigna al
+  insertar, no al confirmar).
+Solo se sincroniza cuando cambia la versión de datos del usuario.
+
+Las lecturas se hacen con `ClienteEspejo`, que imita el subconjunto del constructor
+de consultas de supabase-py que usa la aplicación (select/eq/in_/order/range...),
+por lo que RepositorioPoker y los endpoints funcionan igual sobre el espejo.
+Las escrituras siguen yendo siempre a Supabase.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+TABLA = 'poker_results'
+
+# Columnas copiadas (mismo orden que la tabla local)
+COLUMNAS_ESPEJO = [
+    'id', 'user_id', 'fecha', 'hora', 'descripcion', 'importe', 'categoria', 'tipo_movimiento',
+    'tipo_juego', 'sala', 'nivel_buyin', 'hash_duplicado', 'clasificador_version', 'created_at'
+]
+CAMPOS_ESPEJO = ', '.join(COLUMNAS_ESPEJO)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS poker_results (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    fecha TEXT,
+    hora TEXT,
+    descripcion TEXT,
+    importe REAL,
+    categoria TEXT,
+    tipo_movimiento TEXT,
+    tipo_juego TEXT,
+    sala TEXT,
+    nivel_buyin TEXT,
+    hash_duplicado TEXT,
+    clasificador_version INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_espejo_fecha_id ON poker_results(fecha, id);
+CREATE INDEX IF NOT EXISTS idx_espejo_categoria ON poker_results(categoria);
+CREATE INDEX IF NOT EXISTS idx_espejo_sala ON poker_results(sala);
+CREATE TABLE IF NOT EXISTS sincronizacion (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Si hay más cambios pendientes que esto, es más barato copiar todo de nuevo
+MAX_CAMBIOS_INCREMENTALES = 5000
+
+# Solape de la sincronización incremental: filas creadas en los últimos segundos antes de
+# la última copiada y entradas del registro de cambios anteriores al último seq aplicado
+SOLAPE_SEGUNDOS = 600
+SOLAPE_CAMBIOS = 200
+
+# Menor UUID: con él el keyset (created_at, id) incluye todas las filas de ese created_at
+UUID_MINIMO = '00000000-0000-0000-0000-000000000000'
+
+# Operadores de filtro soportados (PostgREST -> SQL)
+OPERADORES = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+class RespuestaLocal:
+    """Misma forma que la respuesta de supabase-py (data y count)"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class LlamadaLocal:
+    """Función del servidor resuelta en local (se evalúa en execute, como en supabase-py)"""
+
+    def __init__(self, funcion):
+        self.funcion = funcion
+
+    def execute(self):
+        return RespuestaLocal(self.funcion())
+
+
+class ConsultaLocal:
+    """Constructor de consultas sobre la tabla local con la API de supabase-py"""
+
+    def __init__(self, espejo, user_id):
+        self.espejo = espejo
+        self.user_id = user_id
+        self._campos = '*'
+        self._contar = False
+        self._solo_conteo = False
+        self._condiciones = []
+        self._parametros = []
+        self._orden = []
+        self._limite = None
+        self._desplazamiento = 0
+
+    @staticmethod
+    def _columna(nombre):
+        nombre = nombre.strip()
+        if nombre not in COLUMNAS_ESPEJO:
+            raise ValueError(f"Columna no disponible en el espejo local: {nombre}")
+        return nombre
+
+    def select(self, campos='*', count=None, head=False):
+        if campos.strip() != '*':
+            campos = ', '.join(self._columna(campo) for campo in campos.split(','))
+        self._campos = campos
+        self._contar = count is not None
+        self._solo_conteo = head
+        return self
+
+    def _filtro(self, columna, operador, valor):
+        self._condiciones.append(f"{self._columna(columna)} {OPERADORES[operador]} ?")
+        self._parametros.append(valor)
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro(columna, 'eq', valor)
+
+    def neq(self, columna, valor):
+        return self._filtro(columna, 'neq', valor)
+
+    def gt(self, columna, valor):
+        return self._filtro(columna, 'gt', valor)
+
+    def gte(self, columna, valor):
+        return self._filtro(columna, 'gte', valor)
+
+    def lt(self, columna, valor):
+        return self._filtro(columna, 'lt', valor)
+
+    def lte(self, columna, valor):
+        return self._filtro(columna, 'lte', valor)
+
+    def in_(self, columna, valores):
+        valores = list(valores)
+        if not valores:
+            self._condiciones.append('0')
+            return self
+        self._condiciones.append(f"{self._columna(columna)} IN ({', '.join('?' for _ in valores)})")
+        self._parametros.extend(valores)
+        return self
+
+    @staticmethod
+    def _partes(expresion):
+        """Separa por las comas de primer nivel (las de dentro de and(...)/or(...) no cuentan)"""
+        partes, nivel, actual = [], 0, ''
+        for caracter in expresion:
+            if caracter == ',' and nivel == 0:
+                partes.append(actual)
+                actual = ''
+                continue
+            nivel += caracter == '('
+            nivel -= caracter == ')'
+            actual += caracter
+        return partes + [actual]
+
+    def _logica(self, expresion, union):
+        """Condiciones `columna.operador.valor` (eq, neq, gt, gte, lt, lte, ilike) y grupos and(...)/or(...)"""
+        condiciones = []
+        for parte in self._partes(expresion):
+            for grupo, union_grupo in (('and(', ' AND '), ('or(', ' OR ')):
+                if parte.startswith(grupo) and parte.endswith(')'):
+                    condiciones.append(self._logica(parte[len(grupo):-1], union_grupo))
+                    break
+            else:
+                columna, operador, valor = parte.split('.', 2)
+                valor = valor.strip('"')
+                if operador == 'ilike':
+                    condiciones.append(f"lower({self._columna(columna)}) LIKE lower(?)")
+                    self._parametros.append(valor.replace('*', '%'))
+                else:
+                    condiciones.append(f"{self._columna(columna)} {OPERADORES[operador]} ?")
+                    self._parametros.append(valor)
+        return f"({union.join(condiciones)})"
+
+    def or_(self, expresion):
+        """Alternativas separadas por comas, como en PostgREST (admite grupos and(...))"""
+        self._condiciones.append(self._logica(expresion, ' OR '))
+        return self
+
+    def order(self, columna, desc=False):
+        self._orden.append(f"{self._columna(columna)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, cantidad):
+        self._limite = cantidad
+        return self
+
+    def range(self, inicio, fin):
+        self._desplazamiento = inicio
+        self._limite = fin - inicio + 1
+        return self
+
+    def execute(self):
+        where = f" WHERE {' AND '.join(self._condiciones)}" if self._condiciones else ''
+        with self.espejo.conectar(self.user_id) as conexion:
+            total = None
+            if self._contar:
+                total = conexion.execute(f"SELECT COUNT(*) FROM {TABLA}{where}", self._parametros).fetchone()[0]
+            if self._solo_conteo:
+                return RespuestaLocal([], total)
+
+            sql = f"SELECT {self._campos} FROM {TABLA}{where}"
+            if self._orden:
+                sql += f" ORDER BY {', '.join(self._orden)}"
+            if self._limite is not None:
+                sql += f" LIMIT {int(self._limite)} OFFSET {int(self._desplazamiento)}"
+            filas = [dict(fila) for fila in conexion.execute(sql, self._parametros)]
+        return RespuestaLocal(filas, total)
+
+
+class ClienteEspejo:
+    """Cliente de solo lectura sobre el espejo de un usuario"""
+
+    def __init__(self, espejo, user_id):
+        self.espejo = espejo
+        self.user_id = str(user_id)
+
+    def table(self, nombre):
+        if nombre != TABLA:
+            raise ValueError(f"El espejo local solo contiene {TABLA}")
+        return ConsultaLocal(self.espejo, self.user_id)
+
+    def rpc(self, nombre, parametros):
+        if nombre != 'get_opciones_filtros':
+            raise ValueError(f"Función no disponible en el espejo local: {nombre}")
+        return LlamadaLocal(lambda: self.espejo.opciones_filtros(self.user_id))
+
+
+class EspejoLocal:
+    """Ficheros SQLite por usuario sincronizados de forma incremental desde Supabase"""
+
+    def __init__(self, directorio, repositorio, retencion_cambios_dias=30, solape_segundos=SOLAPE_SEGUNDOS, solape_cambios=SOLAPE_CAMBIOS):
+        self.directorio = directorio
+        # Repositorio remoto (Supabase) del que se leen las filas y los cambios
+        self.repositorio = repositorio
+        # Más allá de este plazo el registro de cambios puede haberse purgado
+        self.retencion_cambios = timedelta(days=retencion_cambios_dias)
+        self.solape_segundos = solape_segundos
+        self.solape_cambios = solape_cambios
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._inicializados = set()
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, user_id):
+        user_id = str(user_id)
+        if not re.fullmatch(r'[0-9a-fA-F-]+', user_id):
+            raise ValueError(f"user_id no válido para el espejo local: {user_id}")
+        return os.path.join(self.directorio, f"{user_id}.sqlite3")
+
+    def existe(self, user_id):
+        return os.path.exists(self.ruta(user_id))
+
+    @contextmanager
+    def conectar(self, user_id):
+        """Conexión al fichero del usuario: confirma al salir sin errores y siempre se cierra"""
+        ruta = self.ruta(user_id)
+        conexion = sqlite3.connect(ruta, timeout=30)
+        conexion.row_factory = sqlite3.Row
+        try:
+            if ruta not in self._inicializados:
+                conexion.execute('PRAGMA journal_mode=WAL')
+                conexion.executescript(ESQUEMA)
+                self._inicializados.add(ruta)
+            with conexion:
+                yield conexion
+        finally:
+            conexion.close()
+
+    def sincronizado(self, user_id):
+        """Indica si el espejo del usuario se ha copiado al menos una vez"""
+        if not self.existe(user_id):
+            return False
+        with self.conectar(user_id) as conexion:
+            return 'sincronizado_en' in self._estado(conexion)
+
+    def cliente(self, user_id):
+        return ClienteEspejo(self, user_id)
+
+    def _lock(self, user_id):
+        with self._locks_lock:
+            return self._locks.setdefault(str(user_id), threading.Lock())
+
+    @staticmethod
+    def _estado(conexion):
+        return {fila['clave']: fila['valor'] for fila in conexion.execute('SELECT clave, valor FROM sincronizacion')}
+
+    @staticmethod
+    def _guardar_estado(conexion, **valores):
+        conexion.executemany(
+            'INSERT OR REPLACE INTO sincronizacion (clave, valor) VALUES (?, ?)',
+            [(clave, None if valor is None else str(valor)) for clave, valor in valores.items()]
+        )
+
+    @staticmethod
+    def _inicio_solape(creado, segundos):
+        """created_at `segundos` antes de `creado` (None = desde el principio si no se puede interpretar)"""
+        try:
+            return (datetime.fromisoformat(creado) - timedelta(seconds=segundos)).isoformat()
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _ids_existentes(conexion, filas):
+        ids = [fila['id'] for fila in filas]
+        return {fila[0] for fila in conexion.execute(f"SELECT id FROM {TABLA} WHERE id IN ({', '.join('?' for _ in ids)})", ids)}
+
+    @staticmethod
+    def _guardar_filas(conexion, filas):
+        conexion.executemany(
+            f"INSERT OR REPLACE INTO {TABLA} ({CAMPOS_ESPEJO}) VALUES ({', '.join('?' for _ in COLUMNAS_ESPEJO)})",
+            [tuple(fila.get(columna) for columna in COLUMNAS_ESPEJO) for fila in filas]
+        )
+
+    # ------------------------------------------------------------------
+    # Sincronización
+    # ------------------------------------------------------------------
+
+    def sincronizar(self, user_id, version=None):
+        """
+        Pone al día el espejo del usuario. Si se indica la versión de datos y coincide
+        con la ya sincronizada, no consulta Supabase. Devuelve un resumen de lo aplicado.
+        """
+        user_id = str(user_id)
+        with self._lock(user_id), self.conectar(user_id) as conexion:
+            estado = self._estado(conexion)
+            if version is not None and estado.get('version') == str(version):
+                return {'sincronizado': False}
+
+            inicio = time.perf_counter()
+            sincronizado_en = estado.get('sincronizado_en')
+            completa = (
+                'ultimo_seq' not in estado
+                or sincronizado_en is None
+                or datetime.now() - datetime.fromisoformat(sincronizado_en) > self.retencion_cambios
+            )
+
+            eliminados = set()
+            modificados = set()
+            if not completa:
+                try:
+                    # Con solape: un seq asignado antes del último aplicado puede haberse confirmado después
+                    cambios = self.repositorio.cambios_usuario(user_id, max(0, int(estado['ultimo_seq']) - self.solape_cambios))
+                except Exception as e:
+                    # Sin registro de cambios (migración no aplicada) solo es fiable la copia completa
+                    print(f"⚠️  Registro de cambios no disponible ({e}), copia completa del espejo")
+                    cambios = None
+                if cambios is None or len(cambios) > MAX_CAMBIOS_INCREMENTALES:
+                    completa = True
+                else:
+                    for cambio in cambios:
+                        if cambio['operacion'] == 'D':
+                            eliminados.add(cambio['result_id'])
+                        else:
+                            modificados.add(cambio['result_id'])
+                    ultimo_seq = max([int(estado['ultimo_seq'])] + [cambio['seq'] for cambio in cambios])
+
+            if completa:
+                # El seq se toma antes de copiar: lo que cambie durante la copia se aplicará después
+                try:
+                    ultimo_seq = self.repositorio.ultimo_cambio_usuario(user_id)
+                except Exception:
+                    ultimo_seq = 0
+                conexion.execute(f'DELETE FROM {TABLA}')
+                desde_creado, desde_id = None, None
+                inicio_creado, inicio_id = None, None
+            else:
+                desde_creado, desde_id = estado.get('ultimo_created_at'), estado.get('ultimo_id')
+                # Se vuelve a leer la ventana de solape: las filas ya copiadas se reescriben igual
+                inicio_creado = self._inicio_solape(desde_creado, self.solape_segundos) if desde_creado else None
+                inicio_id = UUID_MINIMO if inicio_creado else None
+
+            nuevos = 0
+            for lote in self.repositorio.iterar_nuevos_usuario(user_id, CAMPOS_ESPEJO, inicio_creado, inicio_id):
+                nuevos += len(lote) - (len(self._ids_existentes(conexion, lote)) if not completa else 0)
+                self._guardar_filas(conexion, lote)
+                if desde_creado is None or (lote[-1]['created_at'], lote[-1]['id']) > (desde_creado, desde_id):
+                    desde_creado, desde_id = lote[-1]['created_at'], lote[-1]['id']
+
+            if eliminados:
+                conexion.executemany(f'DELETE FROM {TABLA} WHERE id = ?', [(result_id,) for result_id in eliminados])
+            modificados -= eliminados
+            if modificados:
+                self._guardar_filas(conexion, self.repositorio.registros_por_ids(modificados, CAMPOS_ESPEJO))
+
+            self._guardar_estado(
+                conexion,
+                version=version,
+                ultimo_seq=ultimo_seq,
+                ultimo_created_at=desde_creado,
+                ultimo_id=desde_id,
+                sincronizado_en=datetime.now().isoformat()
+            )
+
+        resumen = {
+            'sincronizado': True,
+            'completa': completa,
+            'nuevos': nuevos,
+            'modificados': len(modificados),
+            'eliminados': len(eliminados),
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        print(f"🪞 Espejo local de {user_id} sincronizado: {resumen}")
+        return resumen
+
+    # ------------------------------------------------------------------
+    # Consultas específicas
+    # ------------------------------------------------------------------
+
+    def opciones_filtros(self, user_id):
+        """Equivalente local de la función get_opciones_filtros"""
+        with self.conectar(user_id) as conexion:
+            opciones = {}
+            for clave, columna in (('salas', 'sala'), ('categorias', 'categoria'), ('tipos_juego', 'tipo_juego'),
+                                   ('niveles_buyin', 'nivel_buyin'), ('tipos_movimiento', 'tipo_movimiento')):
+                opciones[clave] = [fila[0] for fila in conexion.execute(
+                    f"SELECT DISTINCT {columna} FROM {TABLA} WHERE {columna} IS NOT NULL AND {columna} <> '' ORDER BY {columna}"
+                )]
+            fecha_min, fecha_max = conexion.execute(f'SELECT MIN(fecha), MAX(fecha) FROM {TABLA}').fetchone()
+        return {**opciones, 'fecha_min': fecha_min, 'fecha_max': fecha_max}
+
+    def eliminar(self, user_id):
+        """Borra el espejo del usuario (se reconstruye en la siguiente lectura)"""
+        with self._lock(user_id):
+            self._inicializados.discard(self.ruta(user_id))
+            for sufijo in ('', '-wal', '-shm'):
+                ruta = self.ruta(user_id) + sufijo
+                if os.path.exists(ruta):
+                    os.remove(ruta)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportación de los registros filtrados de informes en CSV, Parquet o XLSX.
+
+Cada formato es un generador que recibe los lotes de registros (listas de dicts, en
+el orden de la tabla de informes) y devuelve bytes a medida que los escribe, por lo
+que la memoria no depende del número de filas:
+- CSV: la cabecera sale antes de leer nada y cada lote se escribe al llegar.
+- Parquet: los lotes se acumulan en columnas hasta completar un row group de
+  PARQUET_FILAS_POR_GRUPO filas, que se escribe al llenarse (requiere pyarrow).
+- XLSX: openpyxl en modo write_only escribe las filas en un fichero temporal, que
+  se envía por bloques al cerrarse el libro (el formato no permite enviarlo antes).
+"""
+
+import csv
+import io
+import tempfile
+from datetime import date
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow es opcional: sin él no se ofrece la exportación a Parquet
+    pa = pq = None
+
+# Columnas del fichero (en este orden); la consulta añade `id` para la paginación keyset
+COLUMNAS_EXPORTACION = ['fecha', 'hora', 'sala', 'descripcion', 'importe', 'categoria', 'tipo_movimiento', 'tipo_juego', 'nivel_buyin']
+CAMPOS_EXPORTACION = 'id, ' + ', '.join(COLUMNAS_EXPORTACION)
+
+BLOQUE_BYTES = 64 * 1024
+# Excel admite 1.048.576 filas por hoja (una es la cabecera); al llenarse se abre otra
+XLSX_FILAS_POR_HOJA = 1048575
+# Filas por row group de Parquet: grupos de ~1000 filas (una página) comprimen peor y
+# multiplican los metadatos que leen los lectores columnares
+PARQUET_FILAS_POR_GRUPO = 64 * 1024
+
+
+def exportar_csv(lotes, columnas=COLUMNAS_EXPORTACION):
+    """CSV UTF-8 con BOM (para que Excel muestre bien los acentos), un bloque por lote"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([registro.get(columna) for columna in columnas] for registro in lote)
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _SalidaIncremental(io.RawIOBase):
+    """Destino de escritura que acumula los bytes hasta que se recogen con vaciar()"""
+
+    def __init__(self):
+        self.pendiente = bytearray()
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.pendiente += datos
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def vaciar(self):
+        datos = bytes(self.pendiente)
+        self.pendiente.clear()
+        return datos
+
+
+def esquema_parquet(columnas=COLUMNAS_EXPORTACION):
+    tipos = {'fecha': pa.date32(), 'importe': pa.float64()}
+    return pa.schema([(columna, tipos.get(columna, pa.string())) for columna in columnas])
+
+
+def _tabla_parquet(lote, esquema):
+    """Convierte un lote de registros en una tabla de Arrow con el esquema del fichero"""
+    arrays = []
+    for campo in esquema:
+        valores = [registro.get(campo.name) for registro in lote]
+        if campo.name == 'fecha':
+            arrays.append(pa.array(valores, pa.string()).cast(pa.date32()))
+        elif campo.name == 'importe':
+            arrays.append(pa.array([None if v is None else float(v) for v in valores], pa.float64()))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in valores], pa.string()))
+    return pa.Table.from_arrays(arrays, schema=esquema)
+
+
+def exportar_parquet(lotes, columnas=COLUMNAS_EXPORTACION, filas_por_grupo=PARQUET_FILAS_POR_GRUPO):
+    """
+    Parquet con row groups de `filas_por_grupo` filas: los lotes se acumulan ya en
+    columnas hasta completar un grupo, que se escribe y se envía en cuanto está listo
+    """
+    esquema = esquema_parquet(columnas)
+    salida = _SalidaIncremental()
+    escritor = pq.ParquetWriter(pa.PythonFile(salida, mode='w'), esquema, compression='snappy')
+    pendientes, filas_pendientes = [], 0
+    try:
+        for lote in lotes:
+            if not lote:
+                continue
+            pendientes.append(_tabla_parquet(lote, esquema))
+            filas_pendientes += len(lote)
+            if filas_pendientes < filas_por_grupo:
+                continue
+            tabla = pa.concat_tables(pendientes)
+            while tabla.num_rows >= filas_por_grupo:
+                escritor.write_table(tabla.slice(0, filas_por_grupo), row_group_size=filas_por_grupo)
+                tabla = tabla.slice(filas_por_grupo)
+            pendientes, filas_pendientes = ([tabla] if tabla.num_rows else []), tabla.num_rows
+            yield salida.vaciar()
+        if pendientes:
+            escritor.write_table(pa.concat_tables(pendientes), row_group_size=filas_por_grupo)
+    finally:
+        escritor.close()
+    yield salida.vaciar()
+
+
+def _fecha(valor):
+    return date.fromisoformat(str(valor)[:10])
+
+
+def exportar_xlsx(lotes, columnas=COLUMNAS_EXPORTACION):
+    """XLSX en modo write_only (filas en disco, no en memoria), enviado por bloques al terminar"""
+    libro = Workbook(write_only=True)
+    hoja, filas_hoja, hojas = None, XLSX_FILAS_POR_HOJA, 0
+    # Fechas e importes como valores de Excel (no texto) para poder filtrar y sumar
+    conversiones = [(columnas.index(columna), conversion) for columna, conversion in
+                    (('fecha', _fecha), ('importe', float)) if columna in columnas]
+    for lote in lotes:
+        for registro in lote:
+            if filas_hoja >= XLSX_FILAS_POR_HOJA:
+                hojas += 1
+                hoja = libro.create_sheet('Registros' if hojas == 1 else f'Registros {hojas}')
+                hoja.append(columnas)
+                filas_hoja = 0
+            fila = [registro.get(columna) for columna in columnas]
+            for posicion, conversion in conversiones:
+                if fila[posicion] is not None:
+                    fila[posicion] = conversion(fila[posicion])
+            hoja.append(fila)
+            filas_hoja += 1
+    if hoja is None:
+        libro.create_sheet('Registros').append(columnas)
+
+    with tempfile.TemporaryFile() as fichero:
+        libro.save(fichero)
+        fichero.seek(0)
+        while True:
+            bloque = fichero.read(BLOQUE_BYTES)
+            if not bloque:
+                break
+            yield bloque
+
+
+# formato -> (generador, mimetype, extensión)
+FORMATOS_EXPORTACION = {
+    'csv': (exportar_csv, 'text/csv', 'csv'),
+    'parquet': (exportar_parquet, 'application/vnd.apache.parquet', 'parquet'),
+    'xlsx': (exportar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def formato_disponible(formato):
+    return formato in FORMATOS_EXPORTACION and (formato != 'parquet' or pq is not None)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Informes dinámicos (pivot) sobre DuckDB.
+
+Las filas del usuario se cargan una vez por versión de datos en una tabla columnar de
+una base DuckDB en memoria (`SnapshotPivot`, guardado en `CacheSnapshots`). Cada pivot
+se traduce a una única consulta SQL vectorizada sobre esa tabla, sin bucles en Python
+por fila.
+Dimensiones, medidas y filtros se eligen de listas cerradas, por lo que la consulta
+solo interpola identificadores conocidos; los valores de los filtros van como parámetros.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import duckdb
+import pandas as pd
+
+# Columnas del snapshot columnar
+CAMPOS_SNAPSHOT = 'id, fecha, hora, descripcion, importe, categoria, tipo_movimiento, tipo_juego, sala, nivel_buyin'
+COLUMNAS_CATEGORICAS = ['categoria', 'tipo_movimiento', 'tipo_juego', 'sala', 'nivel_buyin']
+
+# Dimensiones disponibles -> expresión SQL
+DIMENSIONES = {
+    'sala': 'sala',
+    'categoria': 'categoria',
+    'tipo_movimiento': 'tipo_movimiento',
+    'tipo_juego': 'tipo_juego',
+    'nivel_buyin': 'nivel_buyin',
+    'fecha': "strftime(fecha, '%Y-%m-%d')",
+    'semana': "strftime(date_trunc('week', fecha), '%Y-%m-%d')",
+    'mes': "strftime(fecha, '%Y-%m')",
+    'anio': 'year(fecha)',
+    'dia_semana': 'isodow(fecha)',  # 1 = lunes ... 7 = domingo
+    'hora': 'CAST(substr(hora, 1, 2) AS INTEGER)',
+}
+
+# Medidas disponibles -> expresión SQL (mismas definiciones que /api/informes/resultados)
+_INVERTIDO = "SUM(CASE WHEN categoria = 'Torneo' AND importe < 0 THEN -importe ELSE 0 END)"
+_GANADO = "SUM(CASE WHEN categoria = 'Torneo' AND importe > 0 THEN importe ELSE 0 END)"
+MEDIDAS = {
+    'suma': 'SUM(importe)',
+    'cantidad': 'COUNT(*)',
+    'torneos': "COUNT(*) FILTER (WHERE tipo_movimiento = 'Buy In' AND categoria = 'Torneo')",
+    'invertido': _INVERTIDO,
+    'ganado': _GANADO,
+    'roi': f"CASE WHEN {_INVERTIDO} > 0 THEN ({_GANADO} - {_INVERTIDO}) / {_INVERTIDO} * 100 ELSE 0 END",
+    # Categoría o tipo nulos cuentan como resultado, igual que en get_estadisticas_informe
+    'resultado_economico': "COALESCE(SUM(importe) FILTER (WHERE COALESCE(categoria, '') NOT IN ('Transferencia', 'Depósito', 'Retiro') "
+                           "AND tipo_movimiento IS DISTINCT FROM 'Retiro'), 0)",
+}
+
+# Filtros de lista (parámetro -> columna), iguales que en /api/informes/resultados
+FILTROS_LISTA = {
+    'salas': 'sala',
+    'categorias': 'categoria',
+    'tipos_juego': 'tipo_juego',
+    'niveles_buyin': 'nivel_buyin',
+    'tipos_movimiento': 'tipo_movimiento',
+}
+
+MAX_DIMENSIONES = 4
+MAX_FILAS = 10000
+
+
+class ErrorPivot(ValueError):
+    """Parámetros de pivot no válidos (se responde con 400)"""
+
+
+class SnapshotPivot:
+    """Tabla `resultados` de un usuario en una base DuckDB en memoria"""
+
+    def __init__(self, registros):
+        df = pd.DataFrame(registros, columns=[campo.strip() for campo in CAMPOS_SNAPSHOT.split(',')])
+        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+        df['importe'] = pd.to_numeric(df['importe'], errors='coerce').fillna(0.0).astype('float64')
+
+        self.conexion = duckdb.connect()
+        self.conexion.register('registros', df)
+        self.conexion.execute(f"""
+            CREATE TABLE resultados AS
+            SELECT id, CAST(fecha AS DATE) AS fecha, hora, descripcion, importe,
+                   {', '.join(COLUMNAS_CATEGORICAS)}
+            FROM registros
+        """)
+        self.conexion.unregister('registros')
+        self.filas = len(df)
+
+    def consultar(self, sql, parametros):
+        """Ejecuta una consulta con un cursor propio (seguro entre hilos) y devuelve (columnas, filas)"""
+        cursor = self.conexion.cursor()
+        try:
+            cursor.execute(sql, parametros)
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            return columnas, cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+class CacheSnapshots:
+    """Snapshots columnar por (usuario, versión de datos); conserva los `max_usuarios` más recientes"""
+
+    def __init__(self, max_usuarios=8):
+        self.max_usuarios = max_usuarios
+        self._snapshots = OrderedDict()  # user_id -> (versión, SnapshotPivot)
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id, version, cargar):
+        """Devuelve el snapshot del usuario; si no existe o es de otra versión, lo crea con cargar()"""
+        user_id = str(user_id)
+        with self._lock:
+            entrada = self._snapshots.get(user_id)
+            # Versión desconocida (None): se carga de nuevo y no se conserva
+            if entrada and version is not None and entrada[0] == version:
+                self._snapshots.move_to_end(user_id)
+                return entrada[1]
+
+        inicio = time.perf_counter()
+        snapshot = SnapshotPivot(cargar())
+        print(f"🧱 Snapshot columnar de {user_id} (versión {version}): {snapshot.filas} filas en {time.perf_counter() - inicio:.2f}s")
+
+        if version is None:
+            return snapshot
+        with self._lock:
+            self._snapshots[user_id] = (version, snapshot)
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_usuarios:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidar_usuario(self, user_id):
+        with self._lock:
+            self._snapshots.pop(str(user_id), None)
+
+
+def _lista(valor):
+    """Acepta 'a,b' o ['a', 'b'] y devuelve la lista sin vacíos"""
+    if valor is None:
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    return [v.strip() for v in valor if v and v.strip()]
+
+
+def construir_consulta(dimensiones, medidas, filtros=None, orden=None, limite=None):
+    """Traduce un pivot a (sql, parámetros) sobre la tabla `resultados`"""
+    dimensiones = _lista(dimensiones)
+    medidas = _lista(medidas) or ['suma', 'cantidad']
+    filtros = filtros or {}
+
+    desconocidas = [d for d in dimensiones if d not in DIMENSIONES] + [m for m in medidas if m not in MEDIDAS]
+    if desconocidas:
+        raise ErrorPivot(f"Dimensiones o medidas no válidas: {', '.join(desconocidas)}. "
+                         f"Dimensiones: {', '.join(DIMENSIONES)}. Medidas: {', '.join(MEDIDAS)}")
+    if len(dimensiones) > MAX_DIMENSIONES:
+        raise ErrorPivot(f"Como máximo {MAX_DIMENSIONES} dimensiones")
+    if len(set(dimensiones)) != len(dimensiones) or len(set(medidas)) != len(medidas):
+        raise ErrorPivot("Dimensiones o medidas repetidas")
+
+    condiciones = []
+    parametros = []
+    for parametro, columna in FILTROS_LISTA.items():
+        valores = _lista(filtros.get(parametro))
+        if valores:
+            condiciones.append(f"{columna} IN ({', '.join('?' for _ in valores)})")
+            parametros.extend(valores)
+    if filtros.get('fecha_inicio'):
+        condiciones.append('fecha >= CAST(? AS DATE)')
+        parametros.append(filtros['fecha_inicio'])
+    if filtros.get('fecha_fin'):
+        condiciones.append('fecha <= CAST(? AS DATE)')
+        parametros.append(filtros['fecha_fin'])
+
+    columnas = [f'{DIMENSIONES[d]} AS "{d}"' for d in dimensiones] + [f'{MEDIDAS[m]} AS "{m}"' for m in medidas]
+    sql = f"SELECT {', '.join(columnas)} FROM resultados"
+    if condiciones:
+        sql += f" WHERE {' AND '.join(condiciones)}"
+    if dimensiones:
+        sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(dimensiones)))}"
+
+    # Orden: una dimensión o medida elegida (prefijo '-' = descendente); por defecto, las dimensiones
+    if orden:
+        descendente = orden.startswith('-')
+        campo = orden.lstrip('-')
+        if campo not in dimensiones and campo not in medidas:
+            raise ErrorPivot(f"Solo se puede ordenar por una dimensión o medida elegida: {campo}")
+        sql += f' ORDER BY "{campo}" {"DESC" if descendente else "ASC"} NULLS LAST'
+    elif dimensiones:
+        sql += f" ORDER BY {', '.join(str(i + 1) for i in range(len(dimensiones)))}"
+
+    sql += f" LIMIT {min(int(limite or MAX_FILAS), MAX_FILAS)}"
+    return sql, parametros, dimensiones, medidas
+
+
+def ejecutar_pivot(snapshot, dimensiones, medidas, filtros=None, orden=None, limite=None):
+    """Ejecuta el pivot sobre el snapshot y devuelve las filas y el tiempo de consulta"""
+    sql, parametros, dimensiones, medidas = construir_consulta(dimensiones, medidas, filtros, orden, limite)
+
+    inicio = time.perf_counter()
+    columnas, filas = snapshot.consultar(sql, parametros)
+    milisegundos = (time.perf_counter() - inicio) * 1000
+
+    filas = [
+        {columna: round(valor, 2) if isinstance(valor, float) else valor for columna, valor in zip(columnas, fila)}
+        for fila in filas
+    ]
+    return {
+        'dimensiones': dimensiones,
+        'medidas': medidas,
+        'filas': filas,
+        'total_filas': len(filas),
+        'registros_snapshot': snapshot.filas,
+        'consulta_ms': round(milisegundos, 2)
+    }
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Recategorización masiva del historial con los clasificadores actuales.
+
+Por defecto se ejecuta en modo simulación y solo muestra el diff de cambios
+(conteos por campo y transiciones antes -> después). Con --aplicar se escriben
+los cambios mediante actualizaciones agrupadas.
+
+Uso:
+    python recategorizar.py --usuario <user_id>
+    python recategorizar.py --todos --aplicar
+    python recategorizar.py --usuario <user_id> --completo
+
+Por defecto solo se recalculan los registros cuyo clasificador_version es anterior
+a CLASIFICADOR_VERSION; --completo recalcula todo el historial.
+"""
+
+import argparse
+import json
+
+from app_working import recategorizar_historial, CLASIFICADOR_VERSION
+
+
+def mostrar_resumen(resumen):
+    """Muestra el diff de un usuario de forma legible"""
+    print(f"\n👤 Usuario {resumen['user_id']}")
+    print(f"   📊 Registros analizados: {resumen['registros_analizados']}")
+    print(f"   🕒 Registros con versión anterior: {resumen['registros_desactualizados']}")
+    print(f"   🔄 Registros con cambios: {resumen['registros_con_cambios']}")
+    for campo, cantidad in resumen['cambios_por_campo'].items():
+        print(f"      - {campo}: {cantidad}")
+    for transicion in resumen['transiciones']:
+        antes = ' | '.join(str(v) for v in transicion['antes'].values())
+        despues = ' | '.join(str(v) for v in transicion['despues'].values())
+        print(f"   {transicion['registros']:>6}  {antes}  ->  {despues}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recategoriza el historial de poker_results con los clasificadores actuales')
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--usuario', help='ID del usuario a recategorizar')
+    grupo.add_argument('--todos', action='store_true', help='Recategorizar todos los usuarios')
+    parser.add_argument('--aplicar', action='store_true', help='Escribir los cambios (por defecto solo simulación)')
+    parser.add_argument('--completo', action='store_true', help='Recalcular todo el historial, no solo los registros desactualizados')
+    parser.add_argument('--json', action='store_true', help='Mostrar el resultado completo en JSON')
+    args = parser.parse_args()
+
+    print("=== RECATEGORIZACIÓN MASIVA ===")
+    print("✍️ Modo: aplicar cambios" if args.aplicar else "🔍 Modo: simulación (sin escribir)")
+    print(f"🏷️ Versión de clasificador: {CLASIFICADOR_VERSION}{' (historial completo)' if args.completo else ''}")
+
+    resultado = recategorizar_historial(user_id=args.usuario, aplicar=args.aplicar, completo=args.completo)
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        return
+
+    for resumen in resultado['detalle']:
+        mostrar_resumen(resumen)
+
+    print(f"\n✅ {resultado['usuarios']} usuario(s), {resultado['registros_con_cambios']} de {resultado['registros_analizados']} registros con cambios")
+    if args.aplicar:
+        print(f"✍️ Registros actualizados: {resultado['registros_actualizados']}")
+    else:
+        print("ℹ️ Ejecuta con --aplicar para escribir los cambios")
+
+
+if __name__ == '__main__':
+    main()
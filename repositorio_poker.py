@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capa de acceso a datos de poker_results.
+
+Cada forma de consulta declara su proyección, usa conteos en lugar de traer filas
+cuando solo hace falta el total y pagina internamente (keyset sobre (user_id, id)).
+Todas las consultas pasan por `_ejecutar`, que registra tiempo y filas devueltas por
+nombre de consulta para poder medirlas y ajustarlas.
+"""
+
+import math
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+TABLA_RESULTADOS = 'poker_results'
+TABLA_CAMBIOS = 'poker_results_cambios'
+TABLA_ROLLUP = 'poker_daily_rollup'
+# Clave única del rollup por usuario (orden estable para paginar)
+COLUMNAS_CLAVE_ROLLUP = ('fecha', 'sala', 'categoria', 'tipo_movimiento', 'tipo_juego', 'nivel_buyin')
+
+# Proyecciones de cada forma de consulta
+CAMPOS_USUARIOS_ADMIN = 'id, username, email, is_admin, is_active, created_at, last_login'
+CAMPOS_TORNEOS = 'id, fecha, hora, descripcion, importe, categoria, tipo_movimiento, tipo_juego, sala, nivel_buyin'
+CAMPOS_RESULTADOS = f'{CAMPOS_TORNEOS}, created_at'
+CAMPOS_EJEMPLO_SALA = 'fecha, descripcion, categoria'
+
+# Páginas que cada rango de la lectura concurrente puede adelantar antes de que se consuman
+PAGINAS_EN_COLA = 2
+_FIN_RANGO = object()
+
+
+class MetricasConsultas:
+    """Acumula, por nombre de consulta, número de ejecuciones, tiempo y filas devueltas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._consultas = {}
+
+    def registrar(self, nombre, segundos, filas):
+        with self._lock:
+            metrica = self._consultas.setdefault(nombre, {'consultas': 0, 'segundos': 0.0, 'max_segundos': 0.0, 'filas': 0, 'errores': 0})
+            metrica['consultas'] += 1
+            metrica['segundos'] += segundos
+            metrica['max_segundos'] = max(metrica['max_segundos'], segundos)
+            metrica['filas'] += filas
+
+    def registrar_error(self, nombre):
+        with self._lock:
+            metrica = self._consultas.setdefault(nombre, {'consultas': 0, 'segundos': 0.0, 'max_segundos': 0.0, 'filas': 0, 'errores': 0})
+            metrica['errores'] += 1
+
+    def resumen(self):
+        """Métricas ordenadas por tiempo total (las consultas más caras primero)"""
+        with self._lock:
+            consultas = [
+                {
+                    'consulta': nombre,
+                    **metrica,
+                    'segundos': round(metrica['segundos'], 4),
+                    'max_segundos': round(metrica['max_segundos'], 4),
+                    'promedio_ms': round(metrica['segundos'] / metrica['consultas'] * 1000, 2) if metrica['consultas'] else 0,
+                    'filas_por_consulta': round(metrica['filas'] / metrica['consultas'], 1) if metrica['consultas'] else 0
+                }
+                for nombre, metrica in self._consultas.items()
+            ]
+        return sorted(consultas, key=lambda c: c['segundos'], reverse=True)
+
+    def reiniciar(self):
+        with self._lock:
+            self._consultas.clear()
+
+
+class RepositorioPoker:
+    """Consultas sobre poker_results y users con proyecciones explícitas y métricas"""
+
+    def __init__(self, cliente, ejecutar=None, tamano_lote=1000, max_hilos=6, metricas=None):
+        self.cliente = cliente
+        # `ejecutar` recibe una función sin argumentos y la ejecuta (p. ej. con reintentos)
+        self.ejecutar = ejecutar or (lambda funcion: funcion())
+        self.tamano_lote = tamano_lote
+        self.max_hilos = max_hilos
+        self.metricas = metricas or MetricasConsultas()
+
+    # ------------------------------------------------------------------
+    # Ejecución medida
+    # ------------------------------------------------------------------
+
+    def _ejecutar(self, nombre, construir):
+        """Ejecuta la consulta que devuelve `construir()` registrando tiempo y filas"""
+        inicio = time.perf_counter()
+        try:
+            resultado = self.ejecutar(lambda: construir().execute())
+        except Exception:
+            self.metricas.registrar_error(nombre)
+            raise
+        datos = resultado.data
+        filas = len(datos) if isinstance(datos, list) else (1 if datos else 0)
+        self.metricas.registrar(nombre, time.perf_counter() - inicio, filas)
+        return resultado
+
+    def rpc(self, nombre, parametros):
+        """Llama a una función del servidor"""
+        return self._ejecutar(f"rpc.{nombre}", lambda: self.cliente.rpc(nombre, parametros)).data
+
+    # ------------------------------------------------------------------
+    # Paginación
+    # ------------------------------------------------------------------
+
+    def iterar_lotes(self, tabla, campos, filtros=None, nombre=None, tamano_lote=None, desde=None, hasta=None):
+        """
+        Recorre una tabla por lotes con paginación keyset sobre id (orden explícito).
+        `filtros` recibe la consulta base y devuelve la consulta filtrada. Cada lote se
+        entrega en cuanto llega, por lo que el coste por página no depende de la profundidad.
+        `desde` (incluido) y `hasta` (excluido) limitan el recorrido a un rango de ids.
+        """
+        nombre = nombre or f"{tabla}.lotes"
+        tamano_lote = tamano_lote or self.tamano_lote
+        lista_campos = [campo.strip() for campo in campos.split(',')]
+        if '*' not in lista_campos and 'id' not in lista_campos:
+            campos = f"id, {campos}"
+        ultimo_id = None
+
+        while True:
+            def construir():
+                consulta = self.cliente.table(tabla).select(campos)
+                if filtros:
+                    consulta = filtros(consulta)
+                if ultimo_id is not None:
+                    consulta = consulta.gt('id', ultimo_id)
+                elif desde is not None:
+                    consulta = consulta.gte('id', desde)
+                if hasta is not None:
+                    consulta = consulta.lt('id', hasta)
+                return consulta.order('id').limit(tamano_lote)
+
+            lote = self._ejecutar(nombre, construir).data
+            if not lote:
+                break
+
+            yield lote
+
+            if len(lote) < tamano_lote:
+                break
+
+            ultimo_id = lote[-1]['id']
+
+    def iterar_lotes_por_fecha(self, tabla, campos, filtros=None, nombre=None, tamano_lote=None):
+        """
+        Recorre una tabla por lotes en el orden de la tabla de informes (fecha DESC,
+        id DESC) con paginación keyset: cada página pide (fecha, id) menor que la última
+        fila entregada, así que el coste por página no depende de la profundidad.
+        """
+        nombre = nombre or f"{tabla}.lotes_fecha"
+        tamano_lote = tamano_lote or self.tamano_lote
+        lista_campos = [campo.strip() for campo in campos.split(',')]
+        if '*' not in lista_campos:
+            campos = ', '.join([campo for campo in ('id', 'fecha') if campo not in lista_campos] + lista_campos)
+        ultima = None
+
+        while True:
+            def construir():
+                consulta = self.cliente.table(tabla).select(campos)
+                if filtros:
+                    consulta = filtros(consulta)
+                if ultima is not None:
+                    fecha, id_ultimo = ultima
+                    consulta = consulta.or_(f'fecha.lt.{fecha},and(fecha.eq.{fecha},id.lt.{id_ultimo})')
+                return consulta.order('fecha', desc=True).order('id', desc=True).limit(tamano_lote)
+
+            lote = self._ejecutar(nombre, construir).data
+            if not lote:
+                break
+
+            yield lote
+
+            if len(lote) < tamano_lote:
+                break
+
+            ultima = (lote[-1]['fecha'], lote[-1]['id'])
+
+    @staticmethod
+    def rangos_uuid(particiones):
+        """Divide el espacio de UUIDs en `particiones` rangos contiguos [desde, hasta) ordenados"""
+        paso = (1 << 128) // particiones
+        limites = [str(uuid.UUID(int=i * paso)) for i in range(particiones)] + [None]
+        return list(zip(limites[:-1], limites[1:]))
+
+    def iterar_lotes_concurrente(self, tabla, campos, filtros=None, nombre=None, tamano_lote=None, max_hilos=None):
+        """
+        Variante de iterar_lotes para lecturas completas. Una primera consulta con
+        count='exact' da el total de registros; si hacen falta varias páginas, el espacio de
+        ids (UUID) se divide en rangos que se recorren en paralelo con un pool de hilos acotado.
+        Cada rango deja sus páginas en una cola de PAGINAS_EN_COLA y se entregan en orden de
+        rango en cuanto llegan: el resultado mantiene el orden por id y la memoria queda
+        acotada a unas pocas páginas por rango. Si el consumidor deja de iterar, los hilos
+        se detienen tras la página en curso.
+        """
+        nombre = nombre or f"{tabla}.lotes"
+        tamano_lote = tamano_lote or self.tamano_lote
+        max_hilos = max_hilos or self.max_hilos
+
+        def construir_conteo():
+            consulta = self.cliente.table(tabla).select('id', count='exact')
+            if filtros:
+                consulta = filtros(consulta)
+            return consulta.order('id').limit(1)
+
+        conteo = self._ejecutar(f"{nombre}.conteo", construir_conteo)
+        total = conteo.count or 0
+        particiones = min(max_hilos, math.ceil(total / tamano_lote))
+
+        # Los rangos solo se pueden calcular sobre ids UUID; si no lo son, se lee en serie
+        ids_uuid = False
+        if conteo.data:
+            try:
+                uuid.UUID(str(conteo.data[0]['id']))
+                ids_uuid = True
+            except ValueError:
+                pass
+
+        if particiones <= 1 or not ids_uuid:
+            yield from self.iterar_lotes(tabla, campos, filtros, nombre, tamano_lote)
+            return
+
+        print(f"⚡ Lectura concurrente de {tabla}: {total} registros en {particiones} rangos")
+
+        cancelado = threading.Event()
+
+        def encolar(cola, elemento):
+            while not cancelado.is_set():
+                try:
+                    cola.put(elemento, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def leer_rango(rango, cola):
+            desde, hasta = rango
+            try:
+                for lote in self.iterar_lotes(tabla, campos, filtros, nombre, tamano_lote, desde, hasta):
+                    if not encolar(cola, lote):
+                        return
+            except Exception as e:
+                encolar(cola, e)
+                return
+            encolar(cola, _FIN_RANGO)
+
+        colas = [queue.Queue(maxsize=PAGINAS_EN_COLA) for _ in range(particiones)]
+        executor = ThreadPoolExecutor(max_workers=particiones)
+        try:
+            for rango, cola in zip(self.rangos_uuid(particiones), colas):
+                executor.submit(leer_rango, rango, cola)
+            for cola in colas:
+                while True:
+                    elemento = cola.get()
+                    if elemento is _FIN_RANGO:
+                        break
+                    if isinstance(elemento, Exception):
+                        raise elemento
+                    yield elemento
+        finally:
+            # Corte anticipado (max_records, error o generador cerrado): no se espera a los rangos
+            cancelado.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def leer_todos(self, tabla, campos, filtros=None, nombre=None):
+        """Lee todos los registros que cumplen `filtros` con la lectura concurrente"""
+        return [registro for lote in self.iterar_lotes_concurrente(tabla, campos, filtros, nombre) for registro in lote]
+
+    # ------------------------------------------------------------------
+    # Conteos
+    # ------------------------------------------------------------------
+
+    def contar(self, tabla, filtros=None, nombre=None):
+        """Cuenta filas con count='exact' sin traer ninguna"""
+        def construir():
+            consulta = self.cliente.table(tabla).select('id', count='exact', head=True)
+            return filtros(consulta) if filtros else consulta
+        return self._ejecutar(nombre or f"{tabla}.contar", construir).count or 0
+
+    def contar_registros_totales(self):
+        return self.contar(TABLA_RESULTADOS, nombre='resultados.contar_total')
+
+    def contar_registros_usuario(self, user_id, sala=None):
+        def filtros(consulta):
+            consulta = consulta.eq('user_id', str(user_id))
+            return consulta.eq('sala', sala) if sala else consulta
+        return self.contar(TABLA_RESULTADOS, filtros, nombre='resultados.contar_usuario_sala' if sala else 'resultados.contar_usuario')
+
+    # ------------------------------------------------------------------
+    # Formas de consulta
+    # ------------------------------------------------------------------
+
+    def listar_usuarios_admin(self):
+        """Usuarios para el panel de administración (sin password_hash)"""
+        return self._ejecutar('users.listar_admin', lambda: self.cliente.table('users').select(CAMPOS_USUARIOS_ADMIN).order('username')).data or []
+
+    def torneos_usuario(self, user_id, campos=CAMPOS_TORNEOS):
+        """Todos los movimientos de torneo de un usuario, paginados internamente"""
+        return self.leer_todos(
+            TABLA_RESULTADOS, campos,
+            lambda consulta: consulta.eq('user_id', str(user_id)).eq('categoria', 'Torneo'),
+            nombre='resultados.torneos_usuario'
+        )
+
+    def pagina_resultados(self, user_id, filtros=None, desde=0, cantidad=50, campos=CAMPOS_RESULTADOS):
+        """Página de registros del usuario en el orden de la tabla de informes (fecha DESC, id DESC)"""
+        def construir():
+            consulta = self.cliente.table(TABLA_RESULTADOS).select(campos).eq('user_id', str(user_id))
+            if filtros:
+                consulta = filtros(consulta)
+            return consulta.order('fecha', desc=True).order('id', desc=True).range(desde, desde + cantidad - 1)
+        return self._ejecutar('resultados.pagina', construir).data or []
+
+    def ejemplo_sala(self, user_id, sala, campos=CAMPOS_EJEMPLO_SALA):
+        """Un registro de ejemplo de la sala (o None)"""
+        lote = self._ejecutar('resultados.ejemplo_sala', lambda: self.cliente.table(TABLA_RESULTADOS).select(campos)
+                              .eq('user_id', str(user_id)).eq('sala', sala).limit(1)).data
+        return lote[0] if lote else None
+
+    def iterar_nuevos_usuario(self, user_id, campos, desde_creado=None, desde_id=None, tamano_lote=None):
+        """
+        Registros del usuario creados después de (desde_creado, desde_id), por lotes con
+        keyset sobre (created_at, id). Sirve para la sincronización incremental.
+        """
+        tamano_lote = tamano_lote or self.tamano_lote
+        while True:
+            def construir():
+                consulta = self.cliente.table(TABLA_RESULTADOS).select(campos).eq('user_id', str(user_id))
+                if desde_creado is not None:
+                    consulta = consulta.or_(f'created_at.gt."{desde_creado}",and(created_at.eq."{desde_creado}",id.gt.{desde_id}))')
+                return consulta.order('created_at').order('id').limit(tamano_lote)
+
+            lote = self._ejecutar('resultados.nuevos_usuario', construir).data
+            if not lote:
+                break
+
+            yield lote
+
+            if len(lote) < tamano_lote:
+                break
+
+            desde_creado, desde_id = lote[-1]['created_at'], lote[-1]['id']
+
+    def cambios_usuario(self, user_id, desde_seq=0, tamano_lote=None):
+        """Entradas del registro de cambios (modificaciones y eliminaciones) posteriores a desde_seq"""
+        tamano_lote = tamano_lote or self.tamano_lote
+        cambios = []
+        while True:
+            ultimo_seq = cambios[-1]['seq'] if cambios else desde_seq
+            lote = self._ejecutar('cambios.usuario', lambda: self.cliente.table(TABLA_CAMBIOS)
+                                  .select('seq, result_id, operacion').eq('user_id', str(user_id))
+                                  .gt('seq', ultimo_seq).order('seq').limit(tamano_lote)).data or []
+            cambios.extend(lote)
+            if len(lote) < tamano_lote:
+                return cambios
+
+    def ultimo_cambio_usuario(self, user_id):
+        """Último seq del registro de cambios del usuario (0 si no hay ninguno)"""
+        lote = self._ejecutar('cambios.ultimo', lambda: self.cliente.table(TABLA_CAMBIOS)
+                              .select('seq').eq('user_id', str(user_id)).order('seq', desc=True).limit(1)).data
+        return lote[0]['seq'] if lote else 0
+
+    def registros_por_ids(self, ids, campos, tamano_lote=200):
+        """Registros con los ids indicados, en grupos para no exceder la longitud de la URL"""
+        ids = list(ids)
+        registros = []
+        for i in range(0, len(ids), tamano_lote):
+            grupo = ids[i:i + tamano_lote]
+            registros.extend(self._ejecutar('resultados.por_ids', lambda: self.cliente.table(TABLA_RESULTADOS).select(campos).in_('id', grupo)).data or [])
+        return registros
+
+    def hashes_existentes(self, user_id, hashes, tamano_lote=100):
+        """
+        Hashes de `hashes` que el usuario ya tiene (duplicados al importar). Solo se
+        consultan los del fichero, en grupos para no exceder la longitud de la URL, así
+        que el coste depende del tamaño del fichero y no del historial.
+        """
+        hashes = list(dict.fromkeys(hashes))
+        existentes = set()
+        for i in range(0, len(hashes), tamano_lote):
+            grupo = hashes[i:i + tamano_lote]
+            existentes.update(registro['hash_duplicado'] for registro in self._ejecutar(
+                'resultados.hashes_existentes',
+                lambda: self.cliente.table(TABLA_RESULTADOS).select('hash_duplicado').eq('user_id', str(user_id)).in_('hash_duplicado', grupo)
+            ).data or [])
+        return existentes
+
+    def iterar_movimientos_poker_periodo(self, user_id, desde, hasta, rollup=False):
+        """
+        Movimientos de poker (sin transferencias, depósitos ni retiros) entre dos fechas
+        incluidas (None = sin límite), página a página: filas del rollup diario (fecha,
+        cantidad, suma) o registros (fecha, importe)
+        """
+        def filtros(consulta):
+            consulta = consulta.eq('user_id', str(user_id)) \
+                .neq('categoria', 'Transferencia').neq('categoria', 'Depósito').neq('tipo_movimiento', 'Retiro')
+            if desde is not None:
+                consulta = consulta.gte('fecha', str(desde))
+            if hasta is not None:
+                consulta = consulta.lte('fecha', str(hasta))
+            return consulta
+
+        if not rollup:
+            yield from self.iterar_lotes(TABLA_RESULTADOS, 'fecha, importe', filtros, nombre='resultados.periodo')
+            return
+
+        # El rollup no tiene id: páginas por rango sobre su clave única, que fija el orden
+        inicio = 0
+        while True:
+            def construir():
+                consulta = filtros(self.cliente.table(TABLA_ROLLUP).select('fecha, cantidad, suma'))
+                for columna in COLUMNAS_CLAVE_ROLLUP:
+                    consulta = consulta.order(columna)
+                return consulta.range(inicio, inicio + self.tamano_lote - 1)
+
+            lote = self._ejecutar('rollup.periodo', construir).data
+            if not lote:
+                break
+
+            yield lote
+
+            if len(lote) < self.tamano_lote:
+                break
+
+            inicio += len(lote)
+
+    def movimientos_poker_periodo(self, user_id, desde, hasta, rollup=False):
+        """Lista completa de iterar_movimientos_poker_periodo"""
+        filas = []
+        for lote in self.iterar_movimientos_poker_periodo(user_id, desde, hasta, rollup):
+            filas.extend(lote)
+        return filas
+
+    def reconstruir_rollup(self, user_id=None):
+        """Regenera el rollup diario desde poker_results y devuelve las filas generadas"""
+        return self.rpc('rebuild_poker_daily_rollup', {'user_id_param': str(user_id) if user_id else None})
+
+    def verificar_rollup(self, user_id=None):
+        """Grupos en los que el rollup no coincide con poker_results (lista vacía = consistente)"""
+        return self.rpc('check_poker_daily_rollup', {'user_id_param': str(user_id) if user_id else None}) or []
+
+    def actualizar_por_ids(self, ids, cambios, nombre='resultados.actualizar', tamano_lote=200):
+        """
+        Aplica los mismos `cambios` a los registros con los ids indicados con una
+        actualización `in_('id', ...)` por grupo (en lugar de una petición por fila) y
+        devuelve cuántos se actualizaron
+        """
+        ids = list(ids)
+        actualizados = 0
+        for i in range(0, len(ids), tamano_lote):
+            grupo = ids[i:i + tamano_lote]
+            actualizados += len(self._ejecutar(nombre, lambda: self.cliente.table(TABLA_RESULTADOS).update(cambios).in_('id', grupo)).data or [])
+        return actualizados
+
+    def actualizar_agrupados(self, cambios_por_id, nombre='resultados.actualizar', tamano_lote=200):
+        """Agrupa {id: cambios} por cambios idénticos y aplica cada grupo con actualizar_por_ids"""
+        grupos = {}
+        for id_registro, cambios in cambios_por_id.items():
+            grupos.setdefault(tuple(sorted(cambios.items())), []).append(id_registro)
+        return sum(self.actualizar_por_ids(ids, dict(cambios), nombre, tamano_lote) for cambios, ids in grupos.items())
+
+    def eliminar_registros_usuario(self, user_id, sala=None):
+        """Elimina los registros del usuario (opcionalmente de una sala) y devuelve cuántos había"""
+        total = self.contar_registros_usuario(user_id, sala)
+        if total == 0:
+            return 0
+
+        def construir():
+            consulta = self.cliente.table(TABLA_RESULTADOS).delete().eq('user_id', str(user_id))
+            return consulta.eq('sala', sala) if sala else consulta
+
+        self._ejecutar('resultados.eliminar_usuario_sala' if sala else 'resultados.eliminar_usuario', construir)
+        return total
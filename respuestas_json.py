@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serialización JSON rápida y compresión de respuestas.
+
+ProveedorJSONRapido sustituye el codificador de `jsonify` por orjson cuando está
+instalado, con la misma salida que el de Flask: claves ordenadas, fechas en formato
+HTTP y Decimal/UUID como texto. comprimir_respuesta comprime con brotli o gzip,
+según el Accept-Encoding del cliente, las respuestas que superan un tamaño mínimo.
+"""
+
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    # orjson es opcional: sin él se usa el codificador de la biblioteca estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Por debajo de este tamaño la compresión no compensa la cabecera ni el tiempo
+COMPRESION_MIN_BYTES = 1024
+TIPOS_COMPRIMIBLES = {'application/json', 'text/html', 'text/csv', 'text/plain'}
+# Niveles pensados para respuestas dinámicas: casi toda la reducción con poco CPU
+BROTLI_CALIDAD = 4
+GZIP_NIVEL = 4
+
+
+class ProveedorJSONRapido(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask sobre orjson. Las fechas pasan por el mismo `default` que
+    en Flask para no cambiar su formato. Las llamadas con opciones propias (indent en
+    modo debug, cls...) y los valores que orjson no admite (enteros de más de 64 bits)
+    usan el codificador estándar.
+    """
+
+    def _opciones_orjson(self):
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        return opciones
+
+    def _orjson(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._opciones_orjson())
+        except TypeError:
+            return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson(obj) + b'\n', mimetype=self.mimetype)
+
+
+def negociar_codificacion(accept_encodings):
+    """'br' o 'gzip' según el Accept-Encoding del cliente (None si no acepta ninguna)"""
+    calidad_br = accept_encodings['br'] if brotli is not None else 0
+    calidad_gzip = accept_encodings['gzip']
+    if calidad_br and calidad_br >= calidad_gzip:
+        return 'br'
+    if calidad_gzip:
+        return 'gzip'
+    return None
+
+
+def comprimir_respuesta(respuesta, accept_encodings, min_bytes=COMPRESION_MIN_BYTES, tipos=TIPOS_COMPRIMIBLES):
+    """
+    Comprime el cuerpo de una respuesta completa (after_request). Se dejan tal cual
+    las respuestas en streaming, los ficheros, las que ya tienen Content-Encoding,
+    las de otros tipos y las menores de `min_bytes`.
+    """
+    if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+            or 'Content-Encoding' in respuesta.headers or respuesta.mimetype not in tipos):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    datos = respuesta.get_data()
+    if len(datos) < min_bytes:
+        return respuesta
+
+    codificacion = negociar_codificacion(accept_encodings)
+    if codificacion == 'br':
+        datos = brotli.compress(datos, quality=BROTLI_CALIDAD)
+    elif codificacion == 'gzip':
+        datos = gzip.compress(datos, compresslevel=GZIP_NIVEL, mtime=0)
+    else:
+        return respuesta
+
+    respuesta.set_data(datos)
+    respuesta.headers['Content-Encoding'] = codificacion
+    return respuesta
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Mantenimiento del rollup diario (poker_daily_rollup).
+
+Los triggers de poker_results mantienen el rollup al día; este script sirve para
+comprobar que coincide con los registros individuales y para regenerarlo si no
+(por ejemplo, tras cargas hechas con los triggers deshabilitados).
+
+Uso:
+    python rollup_diario.py --usuario <user_id>
+    python rollup_diario.py --todos --reconstruir
+"""
+
+import argparse
+import json
+
+from app_working import reconstruir_rollup_diario, verificar_rollup_diario
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica o reconstruye el rollup diario de poker_results')
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--usuario', help='ID del usuario')
+    grupo.add_argument('--todos', action='store_true', help='Todos los usuarios')
+    parser.add_argument('--reconstruir', action='store_true', help='Regenerar el rollup (por defecto solo se verifica)')
+    parser.add_argument('--json', action='store_true', help='Mostrar el resultado completo en JSON')
+    args = parser.parse_args()
+
+    print("=== ROLLUP DIARIO ===")
+    if args.reconstruir:
+        resultado = reconstruir_rollup_diario(args.usuario)
+    else:
+        resultado = verificar_rollup_diario(args.usuario)
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+        return
+
+    if args.reconstruir:
+        print(f"✅ {resultado['filas']} filas generadas para {resultado['usuarios']} usuario(s)")
+    elif resultado['consistente']:
+        print("✅ El rollup coincide con poker_results")
+    else:
+        for diferencia in resultado['diferencias'][:50]:
+            print(f"   ⚠️ {diferencia}")
+        print(f"❌ {len(resultado['diferencias'])} grupos con diferencias; ejecuta con --reconstruir para regenerarlo")
+
+
+if __name__ == '__main__':
+    main()
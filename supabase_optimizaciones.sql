@@ -0,0 +1,569 @@
+-- Migraciones de rendimiento para instalaciones existentes
+-- Ejecutar este script en el SQL Editor de Supabase (todas las sentencias son idempotentes)
+-- Las funciones y tablas de este script solo son accesibles para service_role: la
+-- aplicación debe usar la clave de servicio (SUPABASE_SERVICE_KEY)
+
+-- =============================================================================
+-- VERSIÓN DE CLASIFICADOR
+-- =============================================================================
+-- Cada registro guarda la versión de las reglas de clasificación que lo produjeron
+-- (CLASIFICADOR_VERSION en app_working.py). Los registros existentes quedan en 0 y
+-- la recategorización solo recalcula los que tienen una versión anterior a la actual.
+ALTER TABLE poker_results ADD COLUMN IF NOT EXISTS clasificador_version INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_clasificador_version ON poker_results(user_id, clasificador_version);
+
+-- =============================================================================
+-- PAGINACIÓN KEYSET
+-- =============================================================================
+-- Los recorridos completos (iterar_lotes_keyset) piden cada página con
+-- user_id = ? AND id > último_id ORDER BY id LIMIT 1000, por lo que el coste de
+-- cada página es constante sin importar la profundidad.
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_id_id ON poker_results(user_id, id);
+
+-- =============================================================================
+-- OPCIONES DE FILTROS EN UNA SOLA CONSULTA
+-- =============================================================================
+-- Devuelve los valores distintos de cada filtro de informes y el rango de fechas
+-- del usuario. Sustituye a las cinco pasadas por lotes de obtener_valores_unicos_optimizado
+-- y a la lectura de fechas limitada a 20.000 registros.
+CREATE OR REPLACE FUNCTION get_opciones_filtros(user_id_param UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'salas', COALESCE((SELECT array_agg(sala ORDER BY sala) FROM (SELECT DISTINCT sala FROM poker_results WHERE user_id = user_id_param AND sala IS NOT NULL AND sala <> '') s), '{}'),
+        'categorias', COALESCE((SELECT array_agg(categoria ORDER BY categoria) FROM (SELECT DISTINCT categoria FROM poker_results WHERE user_id = user_id_param AND categoria IS NOT NULL AND categoria <> '') c), '{}'),
+        'tipos_juego', COALESCE((SELECT array_agg(tipo_juego ORDER BY tipo_juego) FROM (SELECT DISTINCT tipo_juego FROM poker_results WHERE user_id = user_id_param AND tipo_juego IS NOT NULL AND tipo_juego <> '') t), '{}'),
+        'niveles_buyin', COALESCE((SELECT array_agg(nivel_buyin ORDER BY nivel_buyin) FROM (SELECT DISTINCT nivel_buyin FROM poker_results WHERE user_id = user_id_param AND nivel_buyin IS NOT NULL AND nivel_buyin <> '') n), '{}'),
+        'tipos_movimiento', COALESCE((SELECT array_agg(tipo_movimiento ORDER BY tipo_movimiento) FROM (SELECT DISTINCT tipo_movimiento FROM poker_results WHERE user_id = user_id_param AND tipo_movimiento IS NOT NULL AND tipo_movimiento <> '') m), '{}'),
+        'fecha_min', (SELECT MIN(fecha) FROM poker_results WHERE user_id = user_id_param),
+        'fecha_max', (SELECT MAX(fecha) FROM poker_results WHERE user_id = user_id_param)
+    );
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- SECURITY DEFINER salta el RLS y el usuario llega como parámetro: solo el servidor
+-- (service_role) puede llamarla; con la clave anon cualquiera leería otros usuarios
+REVOKE EXECUTE ON FUNCTION get_opciones_filtros(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_opciones_filtros(UUID) TO service_role;
+
+-- =============================================================================
+-- VERSIÓN DE DATOS POR USUARIO
+-- =============================================================================
+-- Contador que se incrementa con cada importación, eliminación o reclasificación.
+-- La caché de informes y análisis usa la versión como parte de la clave, por lo que
+-- las respuestas anteriores a un cambio dejan de servirse automáticamente.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+-- Sin políticas: solo el servidor (service_role, que no pasa por el RLS) la lee y la escribe.
+-- Con acceso público cualquiera podría cambiar la versión de otro usuario e invalidar sus cachés
+ALTER TABLE user_data_versions ENABLE ROW LEVEL SECURITY;
+-- TRUNCATE no pasa por el RLS
+REVOKE INSERT, UPDATE, DELETE, TRUNCATE ON user_data_versions FROM anon, authenticated;
+
+-- Incremento atómico (crea la fila la primera vez) y devuelve la nueva versión
+CREATE OR REPLACE FUNCTION bump_data_version(user_id_param UUID)
+RETURNS BIGINT AS $$
+    INSERT INTO user_data_versions (user_id, version, updated_at)
+    VALUES (user_id_param, 1, NOW())
+    ON CONFLICT (user_id) DO UPDATE
+        SET version = user_data_versions.version + 1,
+            updated_at = NOW()
+    RETURNING version;
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION bump_data_version(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bump_data_version(UUID) TO service_role;
+
+-- =============================================================================
+-- REGISTRO DE CAMBIOS PARA EL ESPEJO LOCAL
+-- =============================================================================
+-- El espejo local (espejo_local.py) copia las filas nuevas por (created_at, id); las
+-- modificaciones (reclasificación, recategorización) y las eliminaciones no cambian
+-- created_at, así que se anotan aquí y el espejo las aplica a partir del último seq.
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_created_id ON poker_results(user_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS poker_results_cambios (
+    seq BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    result_id TEXT NOT NULL,
+    operacion CHAR(1) NOT NULL,  -- 'U' modificación, 'D' eliminación
+    creado_en TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_poker_results_cambios_user_seq ON poker_results_cambios(user_id, seq);
+-- Sin políticas: solo el servidor (service_role) lee el registro; lo escribe el trigger
+ALTER TABLE poker_results_cambios ENABLE ROW LEVEL SECURITY;
+-- TRUNCATE no pasa por el RLS
+REVOKE INSERT, UPDATE, DELETE, TRUNCATE ON poker_results_cambios FROM anon, authenticated;
+
+CREATE OR REPLACE FUNCTION registrar_cambio_poker_results()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO poker_results_cambios (user_id, result_id, operacion) VALUES (OLD.user_id, OLD.id::text, 'D');
+        RETURN OLD;
+    END IF;
+    INSERT INTO poker_results_cambios (user_id, result_id, operacion) VALUES (NEW.user_id, NEW.id::text, 'U');
+    -- Si la fila cambia de usuario, para el anterior es una eliminación
+    IF NEW.user_id <> OLD.user_id THEN
+        INSERT INTO poker_results_cambios (user_id, result_id, operacion) VALUES (OLD.user_id, OLD.id::text, 'D');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS trg_poker_results_cambios ON poker_results;
+CREATE TRIGGER trg_poker_results_cambios
+    AFTER UPDATE OR DELETE ON poker_results
+    FOR EACH ROW EXECUTE FUNCTION registrar_cambio_poker_results();
+
+-- Purga periódica; los espejos sin sincronizar desde hace más de `dias` se copian completos
+CREATE OR REPLACE FUNCTION purgar_cambios_poker_results(dias INTEGER DEFAULT 30)
+RETURNS BIGINT AS $$
+    WITH borrados AS (
+        DELETE FROM poker_results_cambios WHERE creado_en < NOW() - make_interval(days => dias) RETURNING 1
+    )
+    SELECT COUNT(*) FROM borrados;
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER;
+
+-- Una purga fuerza copias completas en todos los espejos: solo para service_role
+REVOKE EXECUTE ON FUNCTION purgar_cambios_poker_results(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION purgar_cambios_poker_results(INTEGER) TO service_role;
+
+-- =============================================================================
+-- ROLLUP DIARIO (poker_daily_rollup)
+-- =============================================================================
+-- Sumas por (usuario, fecha, sala, categoría, tipo de movimiento, tipo de juego,
+-- nivel de buy-in). Las estadísticas de informes (torneos jugados, invertido,
+-- ganancias, ROI, resultado económico, por categoría) y el gráfico diario se
+-- calculan con estas filas en lugar de con los registros individuales.
+-- Se mantiene con triggers por sentencia (tablas de transición): cada importación,
+-- eliminación o reclasificación aplica solo su diferencia agregada.
+-- Requiere PostgreSQL 15+ (UNIQUE NULLS NOT DISTINCT): en versiones anteriores la
+-- comprobación siguiente detiene la migración antes de crear nada. Sin esta sección
+-- la aplicación calcula los informes desde los registros.
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::INTEGER < 150000 THEN
+        RAISE EXCEPTION 'poker_daily_rollup requiere PostgreSQL 15 o superior (UNIQUE NULLS NOT DISTINCT); versión actual: %',
+            current_setting('server_version');
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS poker_daily_rollup (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    fecha DATE NOT NULL,
+    sala VARCHAR(50),
+    categoria VARCHAR(50),
+    tipo_movimiento VARCHAR(50),
+    tipo_juego VARCHAR(50),
+    nivel_buyin VARCHAR(20),
+    cantidad BIGINT NOT NULL DEFAULT 0,
+    suma NUMERIC(14,2) NOT NULL DEFAULT 0,
+    suma_ingresos NUMERIC(14,2) NOT NULL DEFAULT 0,  -- importes positivos
+    suma_egresos NUMERIC(14,2) NOT NULL DEFAULT 0,   -- importes negativos
+    CONSTRAINT poker_daily_rollup_clave UNIQUE NULLS NOT DISTINCT (user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin)
+);
+
+-- Lectura con las mismas políticas que poker_results; sin políticas de escritura: solo
+-- escriben el trigger y rebuild_poker_daily_rollup (SECURITY DEFINER) y service_role
+ALTER TABLE poker_daily_rollup ENABLE ROW LEVEL SECURITY;
+REVOKE INSERT, UPDATE, DELETE, TRUNCATE ON poker_daily_rollup FROM anon, authenticated;
+
+DROP POLICY IF EXISTS "Users can view their own daily rollup" ON poker_daily_rollup;
+CREATE POLICY "Users can view their own daily rollup" ON poker_daily_rollup
+    FOR SELECT USING (user_id = auth.uid());
+
+DROP POLICY IF EXISTS "Admins can view all daily rollups" ON poker_daily_rollup;
+CREATE POLICY "Admins can view all daily rollups" ON poker_daily_rollup
+    FOR SELECT USING (
+        EXISTS (
+            SELECT 1 FROM users
+            WHERE id = auth.uid()
+            AND is_admin = TRUE
+        )
+    );
+
+-- Aplica la diferencia de una sentencia sobre poker_results (filas viejas restan, nuevas suman)
+CREATE OR REPLACE FUNCTION actualizar_poker_daily_rollup()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO poker_daily_rollup AS r (user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin, cantidad, suma, suma_ingresos, suma_egresos)
+        SELECT user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin,
+               -COUNT(*), -SUM(importe), -SUM(GREATEST(importe, 0)), -SUM(LEAST(importe, 0))
+        FROM viejas
+        GROUP BY user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin
+        ON CONFLICT ON CONSTRAINT poker_daily_rollup_clave DO UPDATE
+            SET cantidad = r.cantidad + EXCLUDED.cantidad,
+                suma = r.suma + EXCLUDED.suma,
+                suma_ingresos = r.suma_ingresos + EXCLUDED.suma_ingresos,
+                suma_egresos = r.suma_egresos + EXCLUDED.suma_egresos;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO poker_daily_rollup AS r (user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin, cantidad, suma, suma_ingresos, suma_egresos)
+        SELECT user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin,
+               COUNT(*), SUM(importe), SUM(GREATEST(importe, 0)), SUM(LEAST(importe, 0))
+        FROM nuevas
+        GROUP BY user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin
+        ON CONFLICT ON CONSTRAINT poker_daily_rollup_clave DO UPDATE
+            SET cantidad = r.cantidad + EXCLUDED.cantidad,
+                suma = r.suma + EXCLUDED.suma,
+                suma_ingresos = r.suma_ingresos + EXCLUDED.suma_ingresos,
+                suma_egresos = r.suma_egresos + EXCLUDED.suma_egresos;
+    END IF;
+
+    -- Solo las restas pueden dejar grupos vacíos (índice de la restricción única por user_id)
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM poker_daily_rollup r
+        USING (SELECT DISTINCT user_id FROM viejas) u
+        WHERE r.user_id = u.user_id AND r.cantidad <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Las tablas de transición exigen un trigger por evento
+DROP TRIGGER IF EXISTS trg_poker_daily_rollup_insert ON poker_results;
+CREATE TRIGGER trg_poker_daily_rollup_insert
+    AFTER INSERT ON poker_results REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_poker_daily_rollup();
+
+DROP TRIGGER IF EXISTS trg_poker_daily_rollup_update ON poker_results;
+CREATE TRIGGER trg_poker_daily_rollup_update
+    AFTER UPDATE ON poker_results REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_poker_daily_rollup();
+
+DROP TRIGGER IF EXISTS trg_poker_daily_rollup_delete ON poker_results;
+CREATE TRIGGER trg_poker_daily_rollup_delete
+    AFTER DELETE ON poker_results REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_poker_daily_rollup();
+
+-- Reconstrucción completa (de un usuario o de todos); devuelve las filas generadas.
+-- El bloqueo hace esperar a los triggers concurrentes hasta que termine.
+CREATE OR REPLACE FUNCTION rebuild_poker_daily_rollup(user_id_param UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    filas BIGINT;
+BEGIN
+    LOCK TABLE poker_daily_rollup IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM poker_daily_rollup WHERE user_id_param IS NULL OR user_id = user_id_param;
+    INSERT INTO poker_daily_rollup (user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin, cantidad, suma, suma_ingresos, suma_egresos)
+    SELECT user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin,
+           COUNT(*), SUM(importe), SUM(GREATEST(importe, 0)), SUM(LEAST(importe, 0))
+    FROM poker_results
+    WHERE user_id_param IS NULL OR user_id = user_id_param
+    GROUP BY user_id, fecha, sala, categoria, tipo_movimiento, tipo_juego, nivel_buyin;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql VOLATILE SECURITY DEFINER;
+
+-- Verificación: grupos en los que el rollup no coincide con poker_results (vacío = consistente)
+CREATE OR REPLACE FUNCTION check_poker_daily_rollup(user_id_param UUID DEFAULT NULL)
+RETURNS TABLE (
+    user_id UUID, fecha DATE, sala VARCHAR, categoria VARCHAR, tipo_movimiento VARCHAR, tipo_juego VARCHAR, nivel_buyin VARCHAR,
+    cantidad_rollup BIGINT, cantidad_real BIGINT, suma_rollup NUMERIC, suma_real NUMERIC
+) AS $$
+    WITH reales AS (
+        SELECT p.user_id, p.fecha, p.sala, p.categoria, p.tipo_movimiento, p.tipo_juego, p.nivel_buyin,
+               COUNT(*) AS cantidad, SUM(p.importe) AS suma,
+               SUM(GREATEST(p.importe, 0)) AS suma_ingresos, SUM(LEAST(p.importe, 0)) AS suma_egresos
+        FROM poker_results p
+        WHERE user_id_param IS NULL OR p.user_id = user_id_param
+        GROUP BY p.user_id, p.fecha, p.sala, p.categoria, p.tipo_movimiento, p.tipo_juego, p.nivel_buyin
+    ), acumulados AS (
+        SELECT * FROM poker_daily_rollup r WHERE user_id_param IS NULL OR r.user_id = user_id_param
+    )
+    SELECT COALESCE(a.user_id, x.user_id), COALESCE(a.fecha, x.fecha), COALESCE(a.sala, x.sala),
+           COALESCE(a.categoria, x.categoria), COALESCE(a.tipo_movimiento, x.tipo_movimiento),
+           COALESCE(a.tipo_juego, x.tipo_juego), COALESCE(a.nivel_buyin, x.nivel_buyin),
+           a.cantidad, x.cantidad, a.suma, x.suma
+    FROM acumulados a
+    FULL OUTER JOIN reales x
+        ON a.user_id = x.user_id AND a.fecha = x.fecha
+       AND COALESCE(a.sala, '') = COALESCE(x.sala, '')
+       AND COALESCE(a.categoria, '') = COALESCE(x.categoria, '')
+       AND COALESCE(a.tipo_movimiento, '') = COALESCE(x.tipo_movimiento, '')
+       AND COALESCE(a.tipo_juego, '') = COALESCE(x.tipo_juego, '')
+       AND COALESCE(a.nivel_buyin, '') = COALESCE(x.nivel_buyin, '')
+    WHERE a.cantidad IS DISTINCT FROM x.cantidad
+       OR a.suma IS DISTINCT FROM x.suma
+       OR a.suma_ingresos IS DISTINCT FROM x.suma_ingresos
+       OR a.suma_egresos IS DISTINCT FROM x.suma_egresos;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- SECURITY DEFINER salta el RLS: solo el rol de servicio puede reconstruir o comparar
+-- el rollup de cualquier usuario
+REVOKE EXECUTE ON FUNCTION rebuild_poker_daily_rollup(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION check_poker_daily_rollup(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_poker_daily_rollup(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION check_poker_daily_rollup(UUID) TO service_role;
+
+-- La carga inicial no se hace aquí (bloquearía poker_daily_rollup durante toda la
+-- migración): tras aplicarla, ejecutar `python rollup_diario.py --todos --reconstruir`
+
+-- =============================================================================
+-- BÚSQUEDA INDEXADA (pg_trgm)
+-- =============================================================================
+-- La búsqueda de informes mira descripción, sala, tipo de movimiento y categoría
+-- con '%término%'. Un ILIKE con comodín inicial no usa índices B-tree, así que
+-- cada búsqueda recorría todos los registros del usuario. texto_busqueda(p) une
+-- esos campos (separados por saltos de línea para que un término no cruce de un
+-- campo a otro) y el índice GIN de trigramas sobre esa misma expresión resuelve
+-- ILIKE '%término%' con un escaneo del índice. Es una columna calculada de PostgREST
+-- (?texto_busqueda=ilike.*término*) que no aparece en select=*. Al ser una función
+-- SQL inmutable, el planificador la expande y reconoce la expresión del índice.
+-- Los términos de menos de 3 caracteres no tienen trigramas y recorren el índice completo.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE OR REPLACE FUNCTION texto_busqueda(poker_results)
+RETURNS TEXT AS $$
+    SELECT COALESCE($1.descripcion, '') || E'\n' || COALESCE($1.sala, '') || E'\n'
+        || COALESCE($1.tipo_movimiento, '') || E'\n' || COALESCE($1.categoria, '');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_texto_busqueda_trgm ON poker_results
+    USING gin (user_id, (COALESCE(descripcion, '') || E'\n' || COALESCE(sala, '') || E'\n'
+                         || COALESCE(tipo_movimiento, '') || E'\n' || COALESCE(categoria, '')) gin_trgm_ops);
+
+-- =============================================================================
+-- ESTADÍSTICAS DE INFORMES EN SQL
+-- =============================================================================
+-- Registros del usuario con los filtros de informes. Es una función SQL simple
+-- (sin SECURITY DEFINER) para que el planificador la expanda en línea y use los
+-- índices de poker_results en cada consulta que la llama. Con y sin búsqueda son
+-- ramas separadas (la condición sobre busqueda_param se evalúa una sola vez), de
+-- modo que la búsqueda usa idx_poker_results_user_texto_busqueda_trgm.
+CREATE OR REPLACE FUNCTION poker_results_filtrados(
+    user_id_param UUID,
+    salas_param TEXT[] DEFAULT NULL,
+    categorias_param TEXT[] DEFAULT NULL,
+    tipos_juego_param TEXT[] DEFAULT NULL,
+    niveles_buyin_param TEXT[] DEFAULT NULL,
+    tipos_movimiento_param TEXT[] DEFAULT NULL,
+    fecha_inicio_param DATE DEFAULT NULL,
+    fecha_fin_param DATE DEFAULT NULL,
+    busqueda_param TEXT DEFAULT NULL
+)
+RETURNS SETOF poker_results AS $$
+    SELECT p.*
+    FROM (
+        SELECT * FROM poker_results
+        WHERE user_id = user_id_param AND COALESCE(busqueda_param, '') = ''
+        UNION ALL
+        SELECT * FROM poker_results b
+        WHERE b.user_id = user_id_param AND COALESCE(busqueda_param, '') <> ''
+          AND texto_busqueda(b) ILIKE '%' || busqueda_param || '%'
+    ) p
+    WHERE (salas_param IS NULL OR p.sala = ANY(salas_param))
+      AND (categorias_param IS NULL OR p.categoria = ANY(categorias_param))
+      AND (tipos_juego_param IS NULL OR p.tipo_juego = ANY(tipos_juego_param))
+      AND (niveles_buyin_param IS NULL OR p.nivel_buyin = ANY(niveles_buyin_param))
+      AND (tipos_movimiento_param IS NULL OR p.tipo_movimiento = ANY(tipos_movimiento_param))
+      AND (fecha_inicio_param IS NULL OR p.fecha >= fecha_inicio_param)
+      AND (fecha_fin_param IS NULL OR p.fecha <= fecha_fin_param);
+$$ LANGUAGE sql STABLE;
+
+-- Todas las estadísticas de /api/informes/resultados (torneos jugados, invertido,
+-- ganancias, balance, ROI, resultado económico y desglose por categoría) en una sola
+-- consulta con agregados condicionales (FILTER) y con los mismos filtros que la
+-- página de registros. Sin búsqueda por texto se agregan las filas del rollup
+-- diario; con búsqueda (que también mira la descripción) los registros individuales.
+CREATE OR REPLACE FUNCTION get_estadisticas_informe(
+    user_id_param UUID,
+    salas_param TEXT[] DEFAULT NULL,
+    categorias_param TEXT[] DEFAULT NULL,
+    tipos_juego_param TEXT[] DEFAULT NULL,
+    niveles_buyin_param TEXT[] DEFAULT NULL,
+    tipos_movimiento_param TEXT[] DEFAULT NULL,
+    fecha_inicio_param DATE DEFAULT NULL,
+    fecha_fin_param DATE DEFAULT NULL,
+    busqueda_param TEXT DEFAULT NULL
+)
+RETURNS JSON AS $$
+    WITH filas AS (
+        SELECT r.categoria, r.tipo_movimiento, r.cantidad, r.suma, r.suma_ingresos, r.suma_egresos
+        FROM poker_daily_rollup r
+        WHERE COALESCE(busqueda_param, '') = ''
+          AND r.user_id = user_id_param
+          AND (salas_param IS NULL OR r.sala = ANY(salas_param))
+          AND (categorias_param IS NULL OR r.categoria = ANY(categorias_param))
+          AND (tipos_juego_param IS NULL OR r.tipo_juego = ANY(tipos_juego_param))
+          AND (niveles_buyin_param IS NULL OR r.nivel_buyin = ANY(niveles_buyin_param))
+          AND (tipos_movimiento_param IS NULL OR r.tipo_movimiento = ANY(tipos_movimiento_param))
+          AND (fecha_inicio_param IS NULL OR r.fecha >= fecha_inicio_param)
+          AND (fecha_fin_param IS NULL OR r.fecha <= fecha_fin_param)
+        UNION ALL
+        SELECT p.categoria, p.tipo_movimiento, 1, p.importe, GREATEST(p.importe, 0), LEAST(p.importe, 0)
+        FROM poker_results_filtrados(user_id_param, salas_param, categorias_param, tipos_juego_param, niveles_buyin_param,
+                                     tipos_movimiento_param, fecha_inicio_param, fecha_fin_param, busqueda_param) p
+        WHERE COALESCE(busqueda_param, '') <> ''
+    ), totales AS (
+        SELECT
+            COALESCE(SUM(cantidad) FILTER (WHERE categoria = 'Torneo' AND tipo_movimiento = 'Buy In'), 0) AS torneos_jugados,
+            COALESCE(-SUM(suma_egresos) FILTER (WHERE categoria = 'Torneo'), 0) AS total_invertido,
+            COALESCE(SUM(suma_ingresos) FILTER (WHERE categoria = 'Torneo'), 0) AS total_ganancias,
+            COALESCE(SUM(suma), 0) AS total_importe,
+            COALESCE(SUM(suma) FILTER (WHERE COALESCE(categoria, '') NOT IN ('Transferencia', 'Depósito', 'Retiro')
+                                         AND tipo_movimiento IS DISTINCT FROM 'Retiro'), 0) AS resultado_economico
+        FROM filas
+    ), por_categoria AS (
+        SELECT COALESCE(categoria, 'Sin categoría') AS categoria, SUM(cantidad) AS cantidad, SUM(suma) AS suma
+        FROM filas
+        GROUP BY 1
+    )
+    SELECT json_build_object(
+        'torneos_jugados', t.torneos_jugados,
+        'total_invertido', t.total_invertido,
+        'total_ganancias', t.total_ganancias,
+        'total_importe', t.total_importe,
+        'roi', CASE WHEN t.total_invertido > 0 THEN (t.total_ganancias - t.total_invertido) / t.total_invertido * 100 ELSE 0 END,
+        'resultado_economico', t.resultado_economico,
+        'por_categoria', COALESCE((SELECT json_object_agg(c.categoria, json_build_object('count', c.cantidad, 'total', c.suma)) FROM por_categoria c), '{}'::json)
+    )
+    FROM totales t;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Solo para el servidor (service_role): recibe el usuario como parámetro y salta el RLS
+REVOKE EXECUTE ON FUNCTION get_estadisticas_informe(UUID, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], DATE, DATE, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_estadisticas_informe(UUID, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], DATE, DATE, TEXT) TO service_role;
+
+-- =============================================================================
+-- INFORME DE RESULTADOS EN UNA SOLA LLAMADA
+-- =============================================================================
+-- Página de registros, total filtrado, estadísticas y resultados de los últimos
+-- 10 días en un único documento JSON: /api/informes/resultados hace un solo viaje
+-- de red. hoy_param lo envía la aplicación para que el gráfico use su fecha local.
+-- Con cursor_fecha_param/cursor_id_param la página se lee por keyset sobre
+-- (fecha, id) con idx_poker_results_user_fecha_id_desc: una página profunda cuesta
+-- lo mismo que la primera. Sin cursor se usa desplazamiento_param (páginas numeradas).
+DROP FUNCTION IF EXISTS get_informe_resultados(UUID, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], DATE, DATE, TEXT, INTEGER, INTEGER, DATE);
+CREATE OR REPLACE FUNCTION get_informe_resultados(
+    user_id_param UUID,
+    salas_param TEXT[] DEFAULT NULL,
+    categorias_param TEXT[] DEFAULT NULL,
+    tipos_juego_param TEXT[] DEFAULT NULL,
+    niveles_buyin_param TEXT[] DEFAULT NULL,
+    tipos_movimiento_param TEXT[] DEFAULT NULL,
+    fecha_inicio_param DATE DEFAULT NULL,
+    fecha_fin_param DATE DEFAULT NULL,
+    busqueda_param TEXT DEFAULT NULL,
+    limite_param INTEGER DEFAULT 50,
+    desplazamiento_param INTEGER DEFAULT 0,
+    hoy_param DATE DEFAULT CURRENT_DATE,
+    cursor_fecha_param DATE DEFAULT NULL,
+    cursor_id_param UUID DEFAULT NULL,
+    cursor_anterior_param BOOLEAN DEFAULT FALSE
+)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'total_registros', (
+            SELECT COUNT(*)
+            FROM poker_results_filtrados(user_id_param, salas_param, categorias_param, tipos_juego_param, niveles_buyin_param,
+                                         tipos_movimiento_param, fecha_inicio_param, fecha_fin_param, busqueda_param)
+        ),
+        'registros', COALESCE((
+            SELECT json_agg(pagina ORDER BY pagina.fecha DESC, pagina.id DESC)
+            FROM (
+                -- Hacia delante: filas anteriores al cursor (sin cursor, desde el principio)
+                (SELECT *
+                 FROM poker_results_filtrados(user_id_param, salas_param, categorias_param, tipos_juego_param, niveles_buyin_param,
+                                              tipos_movimiento_param, fecha_inicio_param, fecha_fin_param, busqueda_param) f
+                 WHERE NOT cursor_anterior_param
+                   AND (f.fecha, f.id) < (COALESCE(cursor_fecha_param, 'infinity'::date), COALESCE(cursor_id_param, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid))
+                 ORDER BY f.fecha DESC, f.id DESC
+                 LIMIT limite_param OFFSET desplazamiento_param)
+                UNION ALL
+                -- Hacia atrás: filas posteriores al cursor, las más cercanas primero
+                (SELECT *
+                 FROM poker_results_filtrados(user_id_param, salas_param, categorias_param, tipos_juego_param, niveles_buyin_param,
+                                              tipos_movimiento_param, fecha_inicio_param, fecha_fin_param, busqueda_param) f
+                 WHERE cursor_anterior_param
+                   AND (f.fecha, f.id) > (cursor_fecha_param, cursor_id_param)
+                 ORDER BY f.fecha ASC, f.id ASC
+                 LIMIT limite_param)
+            ) pagina
+        ), '[]'::json),
+        'estadisticas', get_estadisticas_informe(user_id_param, salas_param, categorias_param, tipos_juego_param, niveles_buyin_param,
+                                                 tipos_movimiento_param, fecha_inicio_param, fecha_fin_param, busqueda_param),
+        -- Movimientos de poker (sin filtros) de los últimos 10 días, desde el rollup
+        'resultados_diarios', (
+            SELECT json_agg(json_build_object('fecha', d.dia, 'resultado', COALESCE(r.suma, 0), 'movimientos', COALESCE(r.cantidad, 0)) ORDER BY d.dia)
+            FROM (SELECT hoy_param - n AS dia FROM generate_series(9, 0, -1) n) d
+            LEFT JOIN (
+                SELECT fecha, SUM(cantidad) AS cantidad, SUM(suma) AS suma
+                FROM poker_daily_rollup
+                WHERE user_id = user_id_param
+                  AND fecha BETWEEN hoy_param - 9 AND hoy_param
+                  AND categoria <> 'Transferencia' AND categoria <> 'Depósito' AND tipo_movimiento <> 'Retiro'
+                GROUP BY fecha
+            ) r ON r.fecha = d.dia
+        )
+    );
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Solo para el servidor (service_role): recibe el usuario como parámetro y salta el RLS
+REVOKE EXECUTE ON FUNCTION get_informe_resultados(UUID, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], DATE, DATE, TEXT, INTEGER, INTEGER, DATE, DATE, UUID, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_informe_resultados(UUID, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], DATE, DATE, TEXT, INTEGER, INTEGER, DATE, DATE, UUID, BOOLEAN) TO service_role;
+
+-- =============================================================================
+-- SERIE TEMPORAL DE RESULTADOS (bankroll acumulado)
+-- =============================================================================
+-- Resultado y movimientos de poker (sin transferencias, depósitos ni retiros) por
+-- día, semana (lunes), mes o año, desde el rollup diario, con todos los periodos
+-- del rango (también los vacíos). saldo_inicial es el resultado acumulado antes de
+-- fecha_inicio_param, para que la curva de bankroll no empiece en cero. Sin fechas,
+-- el rango va de la primera a la última fecha con movimientos.
+CREATE OR REPLACE FUNCTION get_serie_resultados(
+    user_id_param UUID,
+    granularidad_param TEXT DEFAULT 'dia',
+    fecha_inicio_param DATE DEFAULT NULL,
+    fecha_fin_param DATE DEFAULT NULL
+)
+RETURNS JSON AS $$
+    WITH poker AS (
+        SELECT fecha, cantidad, suma
+        FROM poker_daily_rollup
+        WHERE user_id = user_id_param
+          AND categoria <> 'Transferencia' AND categoria <> 'Depósito' AND tipo_movimiento <> 'Retiro'
+          AND (fecha_fin_param IS NULL OR fecha <= fecha_fin_param)
+    ), limites AS (
+        SELECT COALESCE(fecha_inicio_param, MIN(fecha)) AS desde,
+               COALESCE(fecha_fin_param, MAX(fecha)) AS hasta,
+               CASE granularidad_param WHEN 'semana' THEN 'week' WHEN 'mes' THEN 'month' WHEN 'anio' THEN 'year' ELSE 'day' END AS unidad
+        FROM poker
+    ), periodos AS (
+        SELECT p::date AS periodo
+        FROM limites l, generate_series(date_trunc(l.unidad, l.desde), l.hasta, ('1 ' || l.unidad)::interval) p
+    ), por_periodo AS (
+        SELECT date_trunc(l.unidad, p.fecha)::date AS periodo, SUM(p.cantidad) AS movimientos, SUM(p.suma) AS resultado
+        FROM poker p, limites l
+        WHERE p.fecha >= l.desde
+        GROUP BY 1
+    )
+    SELECT json_build_object(
+        'saldo_inicial', (SELECT COALESCE(SUM(p.suma), 0) FROM poker p, limites l WHERE p.fecha < l.desde),
+        'periodos', COALESCE((
+            SELECT json_agg(json_build_object('periodo', x.periodo, 'resultado', COALESCE(r.resultado, 0), 'movimientos', COALESCE(r.movimientos, 0))
+                            ORDER BY x.periodo)
+            FROM periodos x
+            LEFT JOIN por_periodo r ON r.periodo = x.periodo
+        ), '[]'::json)
+    );
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Solo para el servidor (service_role): recibe el usuario como parámetro y salta el RLS
+REVOKE EXECUTE ON FUNCTION get_serie_resultados(UUID, TEXT, DATE, DATE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_serie_resultados(UUID, TEXT, DATE, DATE) TO service_role;
+
+-- =============================================================================
+-- PAGINACIÓN POR CURSOR DE INFORMES
+-- =============================================================================
+-- La tabla de informes pagina por (fecha DESC, id DESC) con cursores keyset; este
+-- índice sirve el orden y la condición (fecha, id) < (cursor) sin descartar filas.
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_fecha_id_desc ON poker_results(user_id, fecha DESC, id DESC);
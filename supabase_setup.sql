@@ -27,6 +27,7 @@ CREATE TABLE IF NOT EXISTS poker_results (
     sala VARCHAR(50) NOT NULL,
     nivel_buyin VARCHAR(20),
     hash_duplicado VARCHAR(64) NOT NULL,
+    clasificador_version INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -38,6 +39,22 @@ CREATE INDEX IF NOT EXISTS idx_poker_results_hash_duplicado ON poker_results(has
 CREATE INDEX IF NOT EXISTS idx_poker_results_fecha ON poker_results(fecha);
 CREATE INDEX IF NOT EXISTS idx_poker_results_categoria ON poker_results(categoria);
 CREATE INDEX IF NOT EXISTS idx_poker_results_sala ON poker_results(sala);
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_clasificador_version ON poker_results(user_id, clasificador_version);
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_id_id ON poker_results(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_created_id ON poker_results(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_fecha_id_desc ON poker_results(user_id, fecha DESC, id DESC);
+
+-- Búsqueda de informes por trigramas (ver supabase_optimizaciones.sql)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+CREATE OR REPLACE FUNCTION texto_busqueda(poker_results)
+RETURNS TEXT AS $$
+    SELECT COALESCE($1.descripcion, '') || E'\n' || COALESCE($1.sala, '') || E'\n'
+        || COALESCE($1.tipo_movimiento, '') || E'\n' || COALESCE($1.categoria, '');
+$$ LANGUAGE sql IMMUTABLE;
+CREATE INDEX IF NOT EXISTS idx_poker_results_user_texto_busqueda_trgm ON poker_results
+    USING gin (user_id, (COALESCE(descripcion, '') || E'\n' || COALESCE(sala, '') || E'\n'
+                         || COALESCE(tipo_movimiento, '') || E'\n' || COALESCE(categoria, '')) gin_trgm_ops);
 
 -- Crear usuario administrador por defecto
 INSERT INTO users (id, username, email, password_hash, is_admin, is_active) 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Script para probar el análisis avanzado sobre el dataset columnar de torneos:
+conversión por lotes, resultados por sección, parámetro `sections` y mismo JSON
+que el cálculo registro a registro
+"""
+
+import analisis_torneos
+from analisis_torneos import CacheDatasets, DatasetTorneos, ErrorAnalisis, calcular_analisis, secciones_pedidas
+from benchmark_analisis import analisis_por_registros, en_lotes, generar_torneos, json_canonico
+
+REGISTROS = [
+    {'fecha': '2025-03-03', 'hora': '20:15:00', 'importe': -10, 'nivel_buyin': 'Micro', 'sala': 'WPN', 'tipo_juego': 'NLH'},
+    {'fecha': '2025-03-03', 'hora': '21:00:00', 'importe': 35.5, 'nivel_buyin': 'Micro', 'sala': 'WPN', 'tipo_juego': 'NLH'},
+    {'fecha': '2025-03-04', 'hora': None, 'importe': -20, 'nivel_buyin': 'Bajo', 'sala': 'Pokerstars', 'tipo_juego': 'PLO'},
+    {'fecha': None, 'hora': '10:00:00', 'importe': -5, 'nivel_buyin': None, 'sala': 'Pokerstars', 'tipo_juego': None},
+]
+
+def test_dataset_por_lotes():
+    """Cargar por lotes da las mismas columnas que cargar de una vez"""
+    print("=== DATASET POR LOTES ===\n")
+    completo = DatasetTorneos([REGISTROS])
+    por_lotes = DatasetTorneos([REGISTROS[:1], REGISTROS[1:3], [], REGISTROS[3:]])
+    assert len(completo) == len(por_lotes) == 4
+    assert calcular_analisis(completo) == calcular_analisis(por_lotes)
+    assert por_lotes.hora.tolist() == [20, 21, -1, 10]
+    assert por_lotes.importe.tolist() == [-10.0, 35.5, -20.0, -5.0]
+    assert por_lotes.etiquetas['sala'] == ['WPN', 'Pokerstars'] and por_lotes.sala.tolist() == [0, 0, 1, 1]
+    print(f"📦 {len(por_lotes)} filas, horas {por_lotes.hora.tolist()}")
+    print("✅ Mismo dataset")
+
+def test_secciones():
+    """Resultados por sección y filtrado con `sections`"""
+    print("\n=== SECCIONES ===\n")
+    dataset = DatasetTorneos([REGISTROS])
+    analisis = calcular_analisis(dataset)
+    assert list(analisis) == ['analisis_buyin', 'analisis_sala', 'analisis_temporal', 'analisis_juego', 'analisis_consistencia', 'recomendaciones']
+
+    micro = analisis['analisis_buyin']['Micro']
+    assert (micro['total_torneos'], micro['total_invertido'], micro['total_ganancias'], micro['salas']) == (2, 10, 35.5, ['WPN'])
+    assert abs(micro['roi'] - 255.0) < 1e-9
+    assert analisis['analisis_sala']['Pokerstars']['total_torneos'] == 2
+    assert analisis['analisis_sala']['Pokerstars']['tipos_juego'] == ['PLO']
+    # La fila sin fecha no cuenta en el análisis temporal ni en la consistencia
+    assert [d['dia'] for d in analisis['analisis_temporal']['por_dia_semana']] == ['Lunes', 'Martes']
+    assert [h['hora'] for h in analisis['analisis_temporal']['por_hora']] == ['20:00', '21:00']
+    assert analisis['analisis_consistencia']['dias_jugados'] == 2
+    print(f"📊 Buy-in Micro: ROI {micro['roi']:.1f}%")
+
+    assert list(calcular_analisis(dataset, 'recomendaciones')) == ['recomendaciones']
+    assert calcular_analisis(dataset, ['juego', 'analisis_juego']) == {'analisis_juego': analisis['analisis_juego']}
+    assert secciones_pedidas('') == secciones_pedidas(None) == ['buyin', 'sala', 'temporal', 'juego', 'consistencia', 'recomendaciones']
+    try:
+        secciones_pedidas('buyin,ventas')
+        raise AssertionError('Se esperaba ErrorAnalisis')
+    except ErrorAnalisis as e:
+        print(f"🚫 {e}")
+    assert calcular_analisis(DatasetTorneos(), 'consistencia') == {'analisis_consistencia': {'consistencia': 'Sin datos suficientes'}}
+    print("✅ Secciones correctas")
+
+def test_mismo_json_que_por_registros():
+    """El motor vectorizado da exactamente el mismo JSON que recorrer los registros"""
+    print("\n=== MISMO JSON QUE REGISTRO A REGISTRO ===\n")
+    conversion = analisis_torneos.FILAS_POR_CONVERSION
+    analisis_torneos.FILAS_POR_CONVERSION = 3000  # varias conversiones por dataset
+    try:
+        for cantidad, semilla in ((1, 1), (500, 2), (20000, 3)):
+            torneos = generar_torneos(cantidad, semilla)
+            dataset = DatasetTorneos(en_lotes(torneos, 700))
+            assert json_canonico(calcular_analisis(dataset)) == json_canonico(analisis_por_registros(torneos))
+            print(f"📊 {cantidad} torneos: JSON idéntico")
+    finally:
+        analisis_torneos.FILAS_POR_CONVERSION = conversion
+    print("✅ Mismo JSON")
+
+def test_cache_por_version():
+    """El dataset se carga una vez por versión de datos"""
+    print("\n=== CACHÉ POR VERSIÓN ===\n")
+    cache = CacheDatasets(max_usuarios=1)
+    cargas = []
+
+    def cargar():
+        cargas.append(1)
+        return [REGISTROS]
+
+    primero = cache.obtener('u1', 1, cargar)
+    assert cache.obtener('u1', 1, cargar) is primero and len(cargas) == 1
+    assert cache.obtener('u1', 2, cargar) is not primero and len(cargas) == 2
+    cache.obtener('u2', 1, cargar)
+    cache.obtener('u1', 2, cargar)
+    assert len(cargas) == 4  # max_usuarios=1: u2 expulsó a u1
+    print(f"🧱 {len(cargas)} cargas")
+    print("✅ Caché por versión correcta")
+
+if __name__ == '__main__':
+    test_dataset_por_lotes()
+    test_secciones()
+    test_mismo_json_que_por_registros()
+    test_cache_por_version()
+    print("\n✅ Pruebas del análisis de torneos completadas")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Script para probar la caché LRU de resultados y la normalización de filtros
+"""
+
+from werkzeug.datastructures import MultiDict
+from cache_resultados import CacheLRU, etag_respuesta, normalizar_filtros, tamano_respuesta
+
+def test_normalizar_filtros():
+    """El orden de los parámetros, los vacíos y el sufijo [] no cambian la clave"""
+    print("=== NORMALIZACIÓN DE FILTROS ===\n")
+    a = normalizar_filtros(MultiDict([('salas[]', 'WPN'), ('salas[]', 'Pokerstars'), ('page', '1'), ('busqueda', ''), ('_', '123')]))
+    b = normalizar_filtros(MultiDict([('page', '1'), ('salas', 'Pokerstars'), ('salas[]', 'WPN')]))
+    print(f"🔑 {a}")
+    print(f"🔑 {b}")
+    assert a == b == (('page', ('1',)), ('salas', ('Pokerstars', 'WPN')))
+    assert normalizar_filtros(MultiDict([('page', '2')])) != a
+    print("✅ Claves equivalentes")
+
+def test_parametros_ordenados():
+    """El orden de dimensiones y medidas cambia la consulta y, por tanto, la clave"""
+    print("\n=== PARÁMETROS CON ORDEN ===\n")
+    a = normalizar_filtros(MultiDict([('dimensiones[]', 'sala'), ('dimensiones[]', 'mes'), ('medidas', 'suma,roi')]))
+    b = normalizar_filtros(MultiDict([('dimensiones[]', 'mes'), ('dimensiones[]', 'sala'), ('medidas', 'suma,roi')]))
+    print(f"🔑 {a}")
+    print(f"🔑 {b}")
+    assert a == (('dimensiones[]', ('sala', 'mes')), ('medidas', ('suma,roi',)))
+    assert a != b
+    assert etag_respuesta('u1', 3, 'informes_pivot', a) != etag_respuesta('u1', 3, 'informes_pivot', b)
+    print("✅ Dimensiones en distinto orden, claves distintas")
+
+def test_lru_presupuesto():
+    """Al superar el presupuesto se expulsa la entrada menos usada"""
+    print("\n=== LRU CON PRESUPUESTO DE MEMORIA ===\n")
+    valor = {'datos': 'x' * 100}
+    cache = CacheLRU(max_bytes=tamano_respuesta(valor) * 2)
+    cache.guardar(('u1', 1, 'a', ()), valor)
+    cache.guardar(('u1', 1, 'b', ()), valor)
+    assert cache.obtener(('u1', 1, 'a', ())) == valor  # 'a' pasa a ser la más reciente
+    cache.guardar(('u1', 1, 'c', ()), valor)
+    print(f"📊 {cache.estadisticas()}")
+    assert cache.obtener(('u1', 1, 'b', ())) is None
+    assert cache.obtener(('u1', 1, 'a', ())) == valor
+    assert cache.estadisticas()['bytes'] <= cache.max_bytes
+    assert not cache.guardar(('u1', 1, 'grande', ()), {'datos': 'x' * 1000})
+    print("✅ Expulsión LRU correcta")
+
+def test_invalidar_usuario():
+    """Invalidar un usuario libera solo sus entradas"""
+    print("\n=== INVALIDACIÓN POR USUARIO ===\n")
+    cache = CacheLRU(max_bytes=1024 * 1024)
+    cache.guardar(('u1', 1, 'a', ()), {'v': 1})
+    cache.guardar(('u2', 1, 'a', ()), {'v': 2})
+    assert cache.invalidar_usuario('u1') == 1
+    assert cache.obtener(('u1', 1, 'a', ())) is None
+    assert cache.obtener(('u2', 1, 'a', ())) == {'v': 2}
+    print(f"📊 {cache.estadisticas()}")
+    print("✅ Invalidación correcta")
+
+def test_etag_respuesta():
+    """El ETag solo depende de usuario, versión, endpoint y filtros normalizados"""
+    print("\n=== ETAG DE RESPUESTAS ===\n")
+    filtros = normalizar_filtros(MultiDict([('salas[]', 'WPN'), ('_', '1')]))
+    etag = etag_respuesta('u1', 3, 'informes_resultados', filtros)
+    print(f"🏷️  {etag}")
+    assert etag == etag_respuesta('u1', 3, 'informes_resultados', normalizar_filtros(MultiDict([('salas', 'WPN'), ('_', '2')])))
+    assert etag != etag_respuesta('u1', 4, 'informes_resultados', filtros)
+    assert etag != etag_respuesta('u2', 3, 'informes_resultados', filtros)
+    assert etag != etag_respuesta('u1', 3, 'informes_opciones', filtros)
+    print("✅ ETags estables y dependientes de la versión")
+
+def test_version_no_duradera():
+    """Si la versión no llega a la base de datos no se cachea ni se responde con ETag"""
+    print("\n=== VERSIÓN NO DURADERA ===\n")
+    import app_working
+
+    user_id = '00000000-0000-0000-0000-000000000001'
+    incremento, reintento = app_working._incrementar_version_remota, app_working._programar_reintento_version
+    llamadas = []
+
+    def caido(_):
+        raise ConnectionError('Supabase no disponible')
+
+    def endpoint(user_id, args):
+        llamadas.append(1)
+        return {'success': True}, 200
+
+    vista = app_working.cache_por_version('prueba_version')(endpoint)
+    app_working._incrementar_version_remota = caido
+    app_working._programar_reintento_version = lambda _: None
+    try:
+        assert app_working.incrementar_version_datos(user_id) is None
+        assert app_working.obtener_version_datos(user_id) is None
+        for _ in range(2):
+            with app_working.app.test_request_context('/prueba'):
+                respuesta = app_working.app.make_response(vista())
+            assert respuesta.status_code == 200 and respuesta.get_etag() == (None, None)
+        assert len(llamadas) == 2  # sin caché
+        print(f"🚫 Sin ETag ni caché mientras el incremento está pendiente ({len(llamadas)} consultas)")
+
+        app_working._incrementar_version_remota = lambda _: 7
+        assert app_working._reintentar_incremento_version(user_id) == 7
+        assert app_working.obtener_version_datos(user_id) == 7
+        assert user_id not in app_working._versiones_pendientes
+        with app_working.app.test_request_context('/prueba'):
+            etag = app_working.app.make_response(vista()).get_etag()[0]
+        assert etag
+        print(f"🏷️  Versión 7 aplicada al reintentar: {etag}")
+        print("✅ Sin respuestas cacheadas con una versión desconocida")
+    finally:
+        app_working._incrementar_version_remota, app_working._programar_reintento_version = incremento, reintento
+        app_working._versiones_datos.pop(user_id, None)
+        app_working._versiones_pendientes.discard(user_id)
+
+def test_refresco_en_segundo_plano():
+    """El refresco de una respuesta obsoleta llama a la función de datos con el user_id guardado, sin petición"""
+    print("\n=== REFRESCO DE RESPUESTAS OBSOLETAS ===\n")
+    import app_working
+    from flask import has_request_context
+    from werkzeug.datastructures import MultiDict
+
+    user_id, endpoint = 'usuario-refresco', 'prueba_refresco'
+    args = MultiDict([('salas[]', 'WPN')])
+    clave_respaldo = (user_id, endpoint, normalizar_filtros(args))
+    llamadas = []
+
+    def datos(uid, parametros):
+        llamadas.append((uid, parametros.getlist('salas[]'), has_request_context()))
+        return {'success': True, 'total': len(llamadas)}, 200
+
+    app_working._refrescos_pendientes[clave_respaldo] = (datos, args, False)
+    try:
+        app_working.refrescar_respaldos(endpoint)
+        print(f"🔄 {llamadas}")
+        assert llamadas == [(user_id, ['WPN'], False)]
+        assert clave_respaldo not in app_working._refrescos_pendientes
+        assert app_working.respaldo_resultados.obtener(clave_respaldo)['respuesta'] == {'success': True, 'total': 1}
+        print("✅ Respaldo recalculado con el user_id explícito")
+    finally:
+        app_working._refrescos_pendientes.pop(clave_respaldo, None)
+
+if __name__ == '__main__':
+    test_normalizar_filtros()
+    test_parametros_ordenados()
+    test_lru_presupuesto()
+    test_invalidar_usuario()
+    test_etag_respuesta()
+    test_version_no_duradera()
+    test_refresco_en_segundo_plano()
+    print("\n✅ Pruebas de caché completadas")
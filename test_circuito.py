@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Script para probar el circuit breaker de la capa de datos
+"""
+
+import time
+import httpx
+from circuito import CircuitBreaker, CircuitoAbierto, GestorCircuitos, CERRADO, ABIERTO, SEMIABIERTO
+from cliente_async import ClienteSupabaseAsync
+
+def fallar():
+    raise ConnectionError("Resource temporarily unavailable")
+
+def test_apertura_y_rechazo():
+    """Tras max_fallos fallos consecutivos las llamadas fallan sin ejecutarse"""
+    print("=== APERTURA DEL CIRCUITO ===\n")
+    circuito = CircuitBreaker('prueba', max_fallos=2, apertura_segundos=60)
+    for _ in range(2):
+        try:
+            circuito.llamar(fallar)
+        except ConnectionError:
+            pass
+    assert circuito.estado == ABIERTO
+
+    llamadas = []
+    try:
+        circuito.llamar(lambda: llamadas.append(1))
+        assert False, "Debería haber lanzado CircuitoAbierto"
+    except CircuitoAbierto as e:
+        print(f"🚫 {e}")
+    assert llamadas == []
+    print(f"📊 {circuito.estadisticas()}")
+    print("✅ Circuito abierto y llamadas rechazadas")
+
+def test_semiabierto_y_recuperacion():
+    """Pasado el tiempo de apertura solo pasa una llamada de prueba; si va bien se cierra"""
+    print("\n=== RECUPERACIÓN ===\n")
+    recuperados = []
+    circuito = CircuitBreaker('prueba', max_fallos=1, apertura_segundos=0.05, al_cerrar=recuperados.append)
+    circuito.registrar_fallo()
+    time.sleep(0.06)
+    assert circuito.estado == SEMIABIERTO
+    assert circuito.permitir()
+    assert not circuito.permitir()  # solo una llamada de prueba a la vez
+    circuito.registrar_exito()
+    assert circuito.estado == CERRADO
+    assert recuperados == ['prueba']
+
+    # Si la prueba falla vuelve a abrirse
+    circuito.registrar_fallo()
+    time.sleep(0.06)
+    assert circuito.permitir()
+    circuito.registrar_fallo()
+    assert circuito.estado == ABIERTO
+    print("✅ Semiabierto, cierre y reapertura correctos")
+
+def test_presupuesto_latencia():
+    """Una respuesta más lenta que el presupuesto del endpoint cuenta como fallo"""
+    print("\n=== PRESUPUESTOS POR ENDPOINT ===\n")
+    gestor = GestorCircuitos({'lento': {'max_fallos': 1, 'latencia_max': 0.01}}, por_defecto={'max_fallos': 5})
+    gestor.obtener('lento').llamar(lambda: time.sleep(0.02))
+    gestor.obtener('rapido').llamar(lambda: time.sleep(0.02))
+    estadisticas = gestor.estadisticas()
+    print(f"📊 {estadisticas}")
+    assert estadisticas['lento']['estado'] == ABIERTO
+    assert estadisticas['rapido']['estado'] == CERRADO
+    print("✅ Presupuestos independientes por endpoint")
+
+def test_arranque_perezoso():
+    """El cliente asíncrono arranca en el primer uso y de nuevo tras un fork"""
+    print("\n=== ARRANQUE DEL CLIENTE ASÍNCRONO ===\n")
+    cliente = ClienteSupabaseAsync('http://localhost', 'clave')
+    assert cliente._loop is None  # nada arranca al importar
+    cliente.table('poker_results')
+    bucle = cliente._loop
+    assert bucle is not None and bucle.is_running()
+    cliente.table('poker_results')
+    assert cliente._loop is bucle
+    cliente._pid = -1  # como si el proceso fuera un hijo de fork
+    cliente.table('poker_results')
+    assert cliente._loop is not bucle
+    cliente.cerrar()
+    print("✅ Bucle nuevo tras el fork")
+
+def test_reintentos_sincronos():
+    """Los reintentos del cliente síncrono esperan con jitter y se cortan si el circuito se abre"""
+    print("\n=== REINTENTOS DEL CLIENTE SÍNCRONO ===\n")
+    import app_working
+    original = app_working.circuito_supabase
+    circuito = app_working.circuito_supabase = CircuitBreaker('datos', max_fallos=1, apertura_segundos=60)
+    intentos = []
+
+    def inestable():
+        intentos.append(1)
+        if len(intentos) < 3:
+            raise httpx.ReadError('Resource temporarily unavailable')
+        return 'ok'
+
+    try:
+        assert app_working.ejecutar_con_reintentos(inestable, delay=0.001) == 'ok' and len(intentos) == 3
+        print(f"🔁 {len(intentos)} intentos")
+
+        intentos.clear()
+
+        def abre_el_circuito():
+            intentos.append(1)
+            circuito.registrar_fallo()  # otra petición abre el circuito mientras se espera
+            raise httpx.ReadError('Resource temporarily unavailable')
+
+        try:
+            app_working.ejecutar_con_reintentos(abre_el_circuito, delay=0.001)
+            raise AssertionError('Se esperaba ReadError')
+        except httpx.ReadError:
+            pass
+        assert len(intentos) == 1
+    finally:
+        app_working.circuito_supabase = original
+    print("✅ Sin reintentos con el circuito abierto")
+
+if __name__ == '__main__':
+    test_apertura_y_rechazo()
+    test_semiabierto_y_recuperacion()
+    test_presupuesto_latencia()
+    test_arranque_perezoso()
+    test_reintentos_sincronos()
+    print("\n✅ Pruebas del circuito completadas")
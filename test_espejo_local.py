@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Script para probar el espejo local (SQLite) y su sincronización incremental
+"""
+
+import csv
+import io
+import shutil
+import tempfile
+import uuid
+from espejo_local import EspejoLocal
+from exportar_informes import exportar_csv
+from repositorio_poker import RepositorioPoker
+
+USER_ID = '00000000-0000-0000-0000-000000000001'
+
+class RemotoEnMemoria:
+    """Stand-in del repositorio de Supabase: filas y registro de cambios en memoria"""
+
+    def __init__(self):
+        self.filas = {}
+        self.cambios = []
+        self.reloj = 0
+
+    def insertar(self, **campos):
+        self.reloj += 1
+        fila = {'id': str(uuid.uuid4()), 'user_id': USER_ID, 'created_at': f"2025-01-01T00:00:{self.reloj:02d}+00:00", **campos}
+        self.filas[fila['id']] = fila
+        return fila['id']
+
+    def modificar(self, result_id, **campos):
+        self.filas[result_id].update(campos)
+        self.cambios.append({'seq': len(self.cambios) + 1, 'result_id': result_id, 'operacion': 'U'})
+
+    def eliminar(self, result_id):
+        del self.filas[result_id]
+        self.cambios.append({'seq': len(self.cambios) + 1, 'result_id': result_id, 'operacion': 'D'})
+
+    def iterar_nuevos_usuario(self, user_id, campos, desde_creado=None, desde_id=None):
+        filas = sorted(self.filas.values(), key=lambda f: (f['created_at'], f['id']))
+        if desde_creado is not None:
+            filas = [f for f in filas if (f['created_at'], f['id']) > (desde_creado, desde_id)]
+        for i in range(0, len(filas), 2):
+            yield [dict(f) for f in filas[i:i + 2]]
+
+    def cambios_usuario(self, user_id, desde_seq=0):
+        return [c for c in self.cambios if c['seq'] > desde_seq]
+
+    def ultimo_cambio_usuario(self, user_id):
+        return self.cambios[-1]['seq'] if self.cambios else 0
+
+    def registros_por_ids(self, ids, campos):
+        return [dict(self.filas[i]) for i in ids if i in self.filas]
+
+def test_consultas_locales():
+    """El cliente del espejo responde como el de supabase-py"""
+    print("=== CONSULTAS SOBRE EL ESPEJO ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        remoto.insertar(fecha='2025-01-01', importe=-10.0, categoria='Torneo', tipo_movimiento='Buy In', sala='WPN', descripcion='Sit & Go 10')
+        remoto.insertar(fecha='2025-01-02', importe=25.5, categoria='Torneo', tipo_movimiento='Ganancia', sala='Pokerstars', descripcion='Bounty Hunter')
+        remoto.insertar(fecha='2025-01-03', importe=100.0, categoria='Depósito', tipo_movimiento='Depósito', sala='WPN', descripcion='Transfer in')
+        espejo = EspejoLocal(directorio, remoto)
+        espejo.sincronizar(USER_ID, version=1)
+        cliente = espejo.cliente(USER_ID)
+
+        conteo = cliente.table('poker_results').select('id', count='exact', head=True).eq('user_id', USER_ID).in_('sala', ['WPN']).execute()
+        assert conteo.count == 2
+
+        pagina = cliente.table('poker_results').select('*').eq('user_id', USER_ID).order('fecha', desc=True).order('id', desc=True).range(0, 1).execute()
+        assert [r['fecha'] for r in pagina.data] == ['2025-01-03', '2025-01-02']
+
+        busqueda = cliente.table('poker_results').select('descripcion').or_('descripcion.ilike.%bounty%,sala.ilike.%bounty%').execute()
+        assert [r['descripcion'] for r in busqueda.data] == ['Bounty Hunter']
+
+        poker = cliente.table('poker_results').select('fecha, importe').neq('categoria', 'Depósito').gte('fecha', '2025-01-02').execute()
+        assert poker.data == [{'fecha': '2025-01-02', 'importe': 25.5}]
+
+        opciones = cliente.rpc('get_opciones_filtros', {'user_id_param': USER_ID}).execute().data
+        print(f"🔍 {opciones}")
+        assert opciones['salas'] == ['Pokerstars', 'WPN']
+        assert (opciones['fecha_min'], opciones['fecha_max']) == ('2025-01-01', '2025-01-03')
+        print("✅ Consultas locales correctas")
+    finally:
+        shutil.rmtree(directorio)
+
+def test_sincronizacion_incremental():
+    """Solo se copian las filas nuevas y se aplican modificaciones y eliminaciones"""
+    print("\n=== SINCRONIZACIÓN INCREMENTAL ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        ids = [remoto.insertar(fecha='2025-01-01', importe=-1.0, categoria='Torneo', tipo_movimiento='Buy In', sala='WPN') for _ in range(5)]
+        espejo = EspejoLocal(directorio, remoto)
+        primera = espejo.sincronizar(USER_ID, version=1)
+        assert primera['completa'] and primera['nuevos'] == 5
+
+        # Misma versión: no se consulta el remoto
+        assert espejo.sincronizar(USER_ID, version=1) == {'sincronizado': False}
+
+        remoto.insertar(fecha='2025-01-02', importe=5.0, categoria='Torneo', tipo_movimiento='Ganancia', sala='WPN')
+        remoto.modificar(ids[0], categoria='Cash')
+        remoto.eliminar(ids[1])
+        segunda = espejo.sincronizar(USER_ID, version=2)
+        print(f"📊 {segunda}")
+        assert not segunda['completa']
+        assert (segunda['nuevos'], segunda['modificados'], segunda['eliminados']) == (1, 1, 1)
+
+        local = espejo.cliente(USER_ID).table('poker_results').select('*').order('created_at').order('id').execute().data
+        remotas = sorted(remoto.filas.values(), key=lambda f: (f['created_at'], f['id']))
+        assert [(f['id'], f['categoria']) for f in local] == [(f['id'], f['categoria']) for f in remotas]
+        print("✅ Espejo idéntico al remoto")
+    finally:
+        shutil.rmtree(directorio)
+
+def test_confirmacion_tardia():
+    """Una fila confirmada después de otra con created_at posterior no se pierde"""
+    print("\n=== CONFIRMACIÓN TARDÍA ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        for _ in range(3):
+            remoto.insertar(fecha='2025-01-01', importe=-1.0, categoria='Torneo', tipo_movimiento='Buy In', sala='WPN')
+        espejo = EspejoLocal(directorio, remoto)
+        espejo.sincronizar(USER_ID, version=1)
+
+        # Transacción que empezó antes (created_at anterior) pero confirmó después de la copia
+        tardia = remoto.insertar(fecha='2025-01-01', importe=7.0, categoria='Torneo', tipo_movimiento='Ganancia', sala='WPN',
+                                 created_at='2025-01-01T00:00:01.500000+00:00')
+        resumen = espejo.sincronizar(USER_ID, version=2)
+        print(f"📊 {resumen}")
+        assert resumen['nuevos'] == 1
+        ids = [r['id'] for r in espejo.cliente(USER_ID).table('poker_results').select('id').execute().data]
+        assert tardia in ids and len(ids) == 4
+        print("✅ La ventana de solape recupera la fila")
+    finally:
+        shutil.rmtree(directorio)
+
+def test_paginacion_keyset():
+    """Recorrer el espejo con condiciones keyset and(...) da las mismas filas que el orden completo"""
+    print("\n=== PAGINACIÓN KEYSET EN EL ESPEJO ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        for dia in range(1, 8):
+            for _ in range(dia):
+                remoto.insertar(fecha=f'2025-01-0{dia}', importe=1.0, categoria='Torneo', tipo_movimiento='Buy In', sala='WPN')
+        espejo = EspejoLocal(directorio, remoto)
+        espejo.sincronizar(USER_ID, version=1)
+        cliente = espejo.cliente(USER_ID)
+        esperado = [(r['fecha'], r['id']) for r in cliente.table('poker_results').select('fecha, id').order('fecha', desc=True).order('id', desc=True).execute().data]
+
+        vistos = []
+        while True:
+            consulta = cliente.table('poker_results').select('fecha, id')
+            if vistos:
+                fecha, registro_id = vistos[-1]
+                consulta = consulta.or_(f'fecha.lt.{fecha},and(fecha.eq.{fecha},id.lt.{registro_id})')
+            pagina = consulta.order('fecha', desc=True).order('id', desc=True).limit(5).execute().data
+            vistos.extend((r['fecha'], r['id']) for r in pagina)
+            if len(pagina) < 5:
+                break
+        print(f"📄 {len(vistos)} filas en páginas de 5")
+        assert vistos == esperado
+        print("✅ Keyset idéntico al orden completo")
+    finally:
+        shutil.rmtree(directorio)
+
+def test_exportacion_por_lotes():
+    """La exportación CSV recorre el espejo por lotes (fecha, id) y sale en el orden de la tabla"""
+    print("\n=== EXPORTACIÓN POR LOTES ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        for dia in range(1, 8):
+            for i in range(dia):
+                remoto.insertar(fecha=f'2025-01-0{dia}', importe=-1.5, categoria='Torneo', tipo_movimiento='Buy In', sala='WPN', descripcion=f'Torneo, "{dia}-{i}"')
+        espejo = EspejoLocal(directorio, remoto)
+        espejo.sincronizar(USER_ID, version=1)
+        repo = RepositorioPoker(espejo.cliente(USER_ID), tamano_lote=4, max_hilos=1)
+        lotes = repo.iterar_lotes_por_fecha('poker_results', 'descripcion, importe', lambda q: q.eq('user_id', USER_ID).gte('fecha', '2025-01-03'))
+        contenido = b''.join(exportar_csv(lotes, ['fecha', 'descripcion', 'importe'])).decode('utf-8-sig')
+        filas = list(csv.reader(io.StringIO(contenido)))
+        esperado = sorted((f for f in remoto.filas.values() if f['fecha'] >= '2025-01-03'), key=lambda f: (f['fecha'], f['id']), reverse=True)
+        print(f"📄 {len(filas) - 1} filas exportadas en lotes de 4")
+        assert filas[0] == ['fecha', 'descripcion', 'importe']
+        assert [fila[1] for fila in filas[1:]] == [f['descripcion'] for f in esperado]
+        print("✅ Exportación completa y ordenada")
+    finally:
+        shutil.rmtree(directorio)
+
+def test_lectura_concurrente_por_paginas():
+    """La lectura por rangos entrega las páginas en orden de id sin leer todo el historial antes"""
+    print("\n=== LECTURA CONCURRENTE POR PÁGINAS ===\n")
+    directorio = tempfile.mkdtemp()
+    try:
+        remoto = RemotoEnMemoria()
+        for i in range(60):
+            remoto.insertar(fecha='2025-01-01', importe=float(i), categoria='Torneo', tipo_movimiento='Buy In', sala='WPN')
+        espejo = EspejoLocal(directorio, remoto)
+        espejo.sincronizar(USER_ID, version=1)
+        repo = RepositorioPoker(espejo.cliente(USER_ID), tamano_lote=3, max_hilos=4)
+        filtros = lambda q: q.eq('user_id', USER_ID)
+
+        lotes = repo.iterar_lotes_concurrente('poker_results', 'importe', filtros, nombre='rangos')
+        primero = next(lotes)
+        paginas = sum(m['consultas'] for m in repo.metricas.resumen() if m['consulta'] == 'rangos')
+        lotes.close()
+        print(f"📄 {paginas} páginas leídas al entregar la primera (de 20)")
+        assert primero and paginas < 20
+
+        ids = [r['id'] for lote in repo.iterar_lotes_concurrente('poker_results', 'importe', filtros) for r in lote]
+        assert ids == sorted(remoto.filas)
+        print("✅ Páginas en orden de id y memoria acotada")
+    finally:
+        shutil.rmtree(directorio)
+
+class ActualizacionesEnMemoria:
+    """Stand-in de PostgREST que solo admite update(...).in_('id', ...) y anota cada petición"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.peticiones = []
+
+    def table(self, nombre):
+        return self
+
+    def update(self, cambios):
+        self._cambios = cambios
+        return self
+
+    def in_(self, columna, valores):
+        self._ids = list(valores)
+        return self
+
+    def execute(self):
+        self.peticiones.append((self._cambios, self._ids))
+        actualizadas = [self.filas[i] for i in self._ids if i in self.filas]
+        for fila in actualizadas:
+            fila.update(self._cambios)
+        return type('Respuesta', (), {'data': [dict(f) for f in actualizadas]})
+
+def test_actualizacion_por_lotes():
+    """Los cambios por registro se agrupan por valores en actualizaciones in_('id', ...) medidas"""
+    print("\n=== ACTUALIZACIÓN POR LOTES ===\n")
+    cliente = ActualizacionesEnMemoria({i: {'id': i, 'tipo_juego': 'Torneo'} for i in range(7)})
+    repo = RepositorioPoker(cliente)
+    cambios = {i: {'tipo_juego': 'PLO' if i % 2 else 'NLH'} for i in range(7)}
+
+    actualizados = repo.actualizar_agrupados(cambios, nombre='reclasificar', tamano_lote=3)
+    print(f"✏️  {actualizados} registros en {len(cliente.peticiones)} peticiones: {cliente.peticiones}")
+    assert actualizados == 7 and len(cliente.peticiones) == 3  # 4 NLH en 3 + 1 y 3 PLO
+    assert all(cliente.filas[i]['tipo_juego'] == cambios[i]['tipo_juego'] for i in range(7))
+    metrica = next(m for m in repo.metricas.resumen() if m['consulta'] == 'reclasificar')
+    assert metrica['consultas'] == 3 and metrica['filas'] == 7
+    print("✅ Una petición por grupo de ids, con tiempo y filas registrados")
+
+if __name__ == '__main__':
+    test_consultas_locales()
+    test_sincronizacion_incremental()
+    test_confirmacion_tardia()
+    test_paginacion_keyset()
+    test_exportacion_por_lotes()
+    test_lectura_concurrente_por_paginas()
+    test_actualizacion_por_lotes()
+    print("\n✅ Pruebas del espejo local completadas")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Script para probar la exportación: row groups de Parquet de PARQUET_FILAS_POR_GRUPO
+filas aunque los lotes lleguen en páginas de 1.000, y que sin sesión se responda 401
+"""
+
+import io
+import pyarrow.parquet as pq
+from exportar_informes import PARQUET_FILAS_POR_GRUPO, exportar_parquet
+
+def lotes_de_prueba(total, tamano=1000):
+    for inicio in range(0, total, tamano):
+        yield [{
+            'fecha': f"2025-01-{(i % 28) + 1:02d}", 'hora': '20:00:00', 'sala': 'WPN', 'descripcion': f"Torneo {i}",
+            'importe': float(i), 'categoria': 'Torneo', 'tipo_movimiento': 'Buy In', 'tipo_juego': 'NLH', 'nivel_buyin': None
+        } for i in range(inicio, min(inicio + tamano, total))]
+
+def test_row_groups_parquet():
+    """150.000 filas en páginas de 1.000 dan 3 row groups, no 150"""
+    print("=== ROW GROUPS DE PARQUET ===\n")
+    total = 150000
+    fichero = pq.ParquetFile(io.BytesIO(b''.join(exportar_parquet(lotes_de_prueba(total)))))
+    grupos = [fichero.metadata.row_group(i).num_rows for i in range(fichero.num_row_groups)]
+    print(f"📦 {fichero.metadata.num_rows} filas en {len(grupos)} row groups: {grupos}")
+    assert grupos == [PARQUET_FILAS_POR_GRUPO, PARQUET_FILAS_POR_GRUPO, total - 2 * PARQUET_FILAS_POR_GRUPO]
+    importes = fichero.read(columns=['importe']).column('importe').to_pylist()
+    assert importes == [float(i) for i in range(total)]
+    print("✅ Grupos completos y filas en orden")
+
+def test_parquet_vacio_y_pequeno():
+    """Sin filas sale un Parquet válido vacío; con menos de un grupo, un solo row group"""
+    print("\n=== PARQUET VACÍO Y PEQUEÑO ===\n")
+    vacio = pq.ParquetFile(io.BytesIO(b''.join(exportar_parquet(iter([[]])))))
+    assert vacio.metadata.num_rows == 0
+    pequeno = pq.ParquetFile(io.BytesIO(b''.join(exportar_parquet(lotes_de_prueba(2500), filas_por_grupo=1000))))
+    grupos = [pequeno.metadata.row_group(i).num_rows for i in range(pequeno.num_row_groups)]
+    print(f"📦 {grupos}")
+    assert grupos == [1000, 1000, 500]
+    print("✅ Ficheros válidos")
+
+def test_exportar_requiere_sesion():
+    """Sin sesión, la exportación responde 401 y no envía ningún fichero"""
+    print("\n=== EXPORTACIÓN SIN SESIÓN ===\n")
+    from app_working import app
+    respuesta = app.test_client().get('/api/informes/exportar?formato=csv')
+    print(f"🔒 {respuesta.status_code} {respuesta.get_json()}")
+    assert respuesta.status_code == 401 and respuesta.get_json()['success'] is False
+    print("✅ Exportación protegida")
+
+if __name__ == '__main__':
+    test_row_groups_parquet()
+    test_parquet_vacio_y_pequeno()
+    test_exportar_requiere_sesion()
+    print("\n✅ Pruebas de exportación completadas")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Script para probar el pivot sobre DuckDB: agrupación, orden de las dimensiones,
+filtros, medidas con categorías nulas y caché de snapshots por versión
+"""
+
+from pivot_informes import CacheSnapshots, ErrorPivot, SnapshotPivot, construir_consulta, ejecutar_pivot
+
+REGISTROS = [
+    ('1', '2025-03-03', '20:15:00', 'Buy In', -10, 'Torneo', 'Buy In', 'NLH', 'WPN', 'Micro'),
+    ('2', '2025-03-03', '21:00:00', 'Premio', 35.5, 'Torneo', 'Winnings', 'NLH', 'WPN', 'Micro'),
+    ('3', '2025-04-04', '10:00:00', 'Buy In', -20, 'Torneo', 'Buy In', 'PLO', 'Pokerstars', 'Bajo'),
+    ('4', '2025-04-05', '11:00:00', 'Retiro', -100, 'Retiro', 'Retiro', None, 'Pokerstars', None),
+    ('5', '2025-04-06', '12:00:00', 'Ajuste', 7, None, None, None, 'Pokerstars', None),
+    ('6', '2025-04-07', '13:00:00', 'Bono', 3, 'Bonus', None, None, 'WPN', None),
+]
+
+def _snapshot():
+    campos = ['id', 'fecha', 'hora', 'descripcion', 'importe', 'categoria', 'tipo_movimiento', 'tipo_juego', 'sala', 'nivel_buyin']
+    return SnapshotPivot([dict(zip(campos, fila)) for fila in REGISTROS])
+
+def test_agrupacion():
+    """Suma, cantidad y ROI por sala"""
+    print("=== AGRUPACIÓN POR SALA ===\n")
+    pivot = ejecutar_pivot(_snapshot(), 'sala', 'suma,cantidad,torneos,roi')
+    print(f"📐 {pivot['filas']}")
+    assert pivot['registros_snapshot'] == 6
+    assert pivot['filas'] == [
+        {'sala': 'Pokerstars', 'suma': -113.0, 'cantidad': 3, 'torneos': 1, 'roi': -100.0},
+        {'sala': 'WPN', 'suma': 28.5, 'cantidad': 3, 'torneos': 1, 'roi': 255.0},
+    ]
+    print("✅ Agrupación correcta")
+
+def test_orden_de_dimensiones():
+    """El orden de las dimensiones cambia las columnas y la consulta"""
+    print("\n=== ORDEN DE LAS DIMENSIONES ===\n")
+    sql_a = construir_consulta(['sala', 'mes'], ['suma'])[0]
+    sql_b = construir_consulta(['mes', 'sala'], ['suma'])[0]
+    assert sql_a != sql_b
+    filas = ejecutar_pivot(_snapshot(), ['mes', 'sala'], ['suma'])['filas']
+    print(f"📐 {filas}")
+    assert list(filas[0]) == ['mes', 'sala', 'suma']
+    assert [(f['mes'], f['sala']) for f in filas] == [('2025-03', 'WPN'), ('2025-04', 'Pokerstars'), ('2025-04', 'WPN')]
+    print("✅ Columnas en el orden pedido")
+
+def test_resultado_economico_con_nulos():
+    """Categoría o tipo nulos cuentan en el resultado económico, como en get_estadisticas_informe"""
+    print("\n=== RESULTADO ECONÓMICO CON NULOS ===\n")
+    filas = ejecutar_pivot(_snapshot(), [], ['resultado_economico'])['filas']
+    print(f"💰 {filas}")
+    # Todo menos el retiro: -10 + 35.5 - 20 + 7 + 3
+    assert filas == [{'resultado_economico': 15.5}]
+    filas = ejecutar_pivot(_snapshot(), [], ['resultado_economico'], {'categorias': 'Retiro'})['filas']
+    assert filas == [{'resultado_economico': 0}]
+    print("✅ Nulos incluidos y 0 sin filas")
+
+def test_filtros_y_errores():
+    """Los filtros van como parámetros y las dimensiones desconocidas dan ErrorPivot"""
+    print("\n=== FILTROS Y ERRORES ===\n")
+    sql, parametros, _, _ = construir_consulta('sala', 'suma', {'salas': ['WPN'], 'fecha_inicio': '2025-04-01'})
+    print(f"🧾 {sql} {parametros}")
+    assert parametros == ['WPN', '2025-04-01'] and 'WPN' not in sql
+    filas = ejecutar_pivot(_snapshot(), 'sala', 'suma', {'salas': ['WPN'], 'fecha_inicio': '2025-04-01'})['filas']
+    assert filas == [{'sala': 'WPN', 'suma': 3.0}]
+    for dimensiones, medidas in [('sala; DROP TABLE resultados', 'suma'), ('sala,sala', 'suma'), ('sala', 'suma')]:
+        try:
+            construir_consulta(dimensiones, medidas, orden='cantidad')
+        except ErrorPivot as error:
+            print(f"🚫 {error}")
+        else:
+            raise AssertionError(f"Se esperaba ErrorPivot para {dimensiones} / {medidas}")
+    print("✅ Filtros y validación correctos")
+
+def test_cache_snapshots():
+    """Un snapshot se reutiliza por versión; con versión desconocida se recarga siempre"""
+    print("\n=== CACHÉ DE SNAPSHOTS ===\n")
+    cache = CacheSnapshots(max_usuarios=1)
+    cargas = []
+
+    def cargar():
+        cargas.append(1)
+        return []
+
+    primero = cache.obtener('u1', 1, cargar)
+    assert cache.obtener('u1', 1, cargar) is primero and len(cargas) == 1
+    assert cache.obtener('u1', None, cargar) is not primero and len(cargas) == 2
+    assert cache.obtener('u1', 1, cargar) is primero and len(cargas) == 2
+    cache.obtener('u2', 1, cargar)
+    cache.obtener('u1', 1, cargar)
+    assert len(cargas) == 4  # max_usuarios=1: u2 expulsó a u1
+    print(f"🧱 {len(cargas)} cargas")
+    print("✅ Caché por versión correcta")
+
+if __name__ == '__main__':
+    test_agrupacion()
+    test_orden_de_dimensiones()
+    test_resultado_economico_con_nulos()
+    test_filtros_y_errores()
+    test_cache_snapshots()
+    print("\n✅ Pruebas del pivot completadas")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Script para probar el cálculo de la recategorización masiva (sin escribir en la base de datos)
+"""
+
+from app_working import calcular_recategorizacion, resumir_recategorizacion, clasificar_niveles_buyin_vectorizado, clasificar_nivel_buyin, CLASIFICADOR_VERSION, CLASIFICADOR_VERSION_PENDIENTE
+
+def registro(id, sala, descripcion, importe, categoria, tipo_movimiento, tipo_juego, nivel_buyin, version=CLASIFICADOR_VERSION):
+    return {
+        'id': id, 'sala': sala, 'descripcion': descripcion, 'importe': importe,
+        'categoria': categoria, 'tipo_movimiento': tipo_movimiento,
+        'tipo_juego': tipo_juego, 'nivel_buyin': nivel_buyin,
+        'clasificador_version': version
+    }
+
+def test_niveles_vectorizados():
+    """El clasificador vectorizado coincide con clasificar_nivel_buyin"""
+    print("=== NIVELES DE BUY-IN VECTORIZADOS ===\n")
+    importes = [0, -1, 4.99, 5, -24.99, 25, 99.99, -100, 1000]
+    vectorizados = list(clasificar_niveles_buyin_vectorizado(importes))
+    esperados = [clasificar_nivel_buyin(i) for i in importes]
+    for importe, obtenido, esperado in zip(importes, vectorizados, esperados):
+        print(f"{'✅' if obtenido == esperado else '❌'} {importe} -> {obtenido} (esperado {esperado})")
+    assert vectorizados == esperados
+
+def test_herencia_desde_buyin():
+    """Los movimientos hijos heredan nivel y tipo de juego del Buy In"""
+    print("\n=== HERENCIA DESDE EL BUY IN ===\n")
+    registros = [
+        registro('1', 'WPN', 'Tournament #123 $10 NLH', -10, 'Torneo', 'Buy In', 'Torneo', None),
+        registro('2', 'WPN', 'Tournament #123 $10 NLH', 30, 'Torneo', 'Winnings', 'Torneo', None),
+        registro('3', 'Pokerstars', "999 Hold'em No Limit", -50, 'Torneo', 'Buy In', 'NLH', 'Medio'),
+        registro('4', 'Pokerstars', '999 Bounty', 20, 'Torneo', 'Bounty', 'Torneo', None),
+    ]
+    df = calcular_recategorizacion(registros).set_index('id')
+
+    casos = [
+        ('1', 'nivel_buyin_nuevo', 'Bajo'),
+        ('1', 'tipo_juego_nuevo', 'NLH'),
+        ('2', 'nivel_buyin_nuevo', 'Bajo'),
+        ('2', 'tipo_juego_nuevo', 'NLH'),
+        ('4', 'nivel_buyin_nuevo', 'Medio'),
+        ('4', 'tipo_juego_nuevo', 'NLH'),
+    ]
+    for id, campo, esperado in casos:
+        obtenido = df.loc[id, campo]
+        print(f"{'✅' if obtenido == esperado else '❌'} registro {id} {campo}: {obtenido} (esperado {esperado})")
+        assert obtenido == esperado
+
+def test_diff_sin_cambios():
+    """Un historial ya clasificado no produce cambios"""
+    print("\n=== DIFF SIN CAMBIOS ===\n")
+    registros = [
+        registro('1', 'Pokerstars', "999 Hold'em No Limit", -50, 'Torneo', 'Buy In', 'NLH', 'Medio'),
+        registro('2', 'Pokerstars', '999 Bounty', 20, 'Torneo', 'Bounty', 'NLH', 'Medio'),
+    ]
+    cambiados, resumen = resumir_recategorizacion(calcular_recategorizacion(registros))
+    print(f"📊 {resumen}")
+    assert resumen['registros_con_cambios'] == 0
+    assert not cambiados.any()
+
+def test_diff_transiciones():
+    """El resumen agrupa las transiciones (antes -> después) y cuenta los cambios por campo"""
+    print("\n=== TRANSICIONES ===\n")
+    registros = [registro(str(i), 'WPN', 'Tournament #1 $10 NLH', -10, 'Torneo', 'Buy In', 'Torneo', None) for i in range(3)]
+    cambiados, resumen = resumir_recategorizacion(calcular_recategorizacion(registros))
+    print(f"📊 {resumen}")
+    assert int(cambiados.sum()) == 3
+    assert resumen['cambios_por_campo']['nivel_buyin'] == 3
+    assert len(resumen['transiciones']) == 1
+    assert resumen['transiciones'][0]['registros'] == 3
+    assert resumen['transiciones'][0]['despues']['nivel_buyin'] == 'Bajo'
+
+def test_version_desactualizada():
+    """Los registros con una versión de clasificador anterior se marcan para escribir aunque no cambien"""
+    print("\n=== VERSIÓN DE CLASIFICADOR ===\n")
+    registros = [
+        registro('1', 'Pokerstars', "999 Hold'em No Limit", -50, 'Torneo', 'Buy In', 'NLH', 'Medio', version=0),
+        registro('2', 'Pokerstars', '999 Bounty', 20, 'Torneo', 'Bounty', 'NLH', 'Medio'),
+    ]
+    a_actualizar, resumen = resumir_recategorizacion(calcular_recategorizacion(registros))
+    print(f"📊 {resumen}")
+    assert resumen['registros_con_cambios'] == 0
+    assert resumen['registros_desactualizados'] == 1
+    assert list(a_actualizar) == [True, False]
+
+def test_importacion_pendiente():
+    """Las importaciones quedan pendientes hasta que la recategorización resuelve las herencias"""
+    print("\n=== IMPORTACIÓN PENDIENTE ===\n")
+    assert CLASIFICADOR_VERSION_PENDIENTE < CLASIFICADOR_VERSION
+    registros = [
+        registro('1', 'Pokerstars', "777 Hold'em No Limit", -10, 'Torneo', 'Buy In', 'NLH', 'Bajo', version=CLASIFICADOR_VERSION_PENDIENTE),
+        registro('2', 'Pokerstars', '777 Bounty', 5, 'Torneo', 'Bounty', 'Torneo', None, version=CLASIFICADOR_VERSION_PENDIENTE),
+    ]
+    df = calcular_recategorizacion(registros)
+    a_actualizar, resumen = resumir_recategorizacion(df)
+    print(f"📊 {resumen['cambios_por_campo']}")
+    assert df.loc[1, 'nivel_buyin_nuevo'] == 'Bajo' and df.loc[1, 'tipo_juego_nuevo'] == 'NLH'
+    assert resumen['registros_desactualizados'] == 2
+    assert list(a_actualizar) == [True, True]
+
+if __name__ == '__main__':
+    test_niveles_vectorizados()
+    test_herencia_desde_buyin()
+    test_diff_sin_cambios()
+    test_diff_transiciones()
+    test_version_desactualizada()
+    test_importacion_pendiente()
+    print("\n✅ Pruebas de recategorización completadas")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script para probar que el proveedor JSON con orjson produce lo mismo que el de Flask
+y que las respuestas grandes se comprimen según el Accept-Encoding
+"""
+
+import gzip
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from respuestas_json import ProveedorJSONRapido, comprimir_respuesta
+
+def crear_app():
+    app = Flask(__name__)
+    app.json = ProveedorJSONRapido(app)
+
+    @app.after_request
+    def comprimir(respuesta):
+        return comprimir_respuesta(respuesta, request.accept_encodings, min_bytes=1024)
+
+    @app.route('/grande')
+    def grande():
+        return jsonify({'registros': [{'id': i, 'descripcion': f'Buy In Torneo {i}', 'importe': -5.5} for i in range(500)]})
+
+    @app.route('/pequena')
+    def pequena():
+        return jsonify({'success': True})
+    return app
+
+def test_misma_salida_que_flask():
+    """Fechas, Decimal, UUID y orden de claves igual que el codificador estándar"""
+    print("=== ORJSON CON LA SALIDA DE FLASK ===\n")
+    app = crear_app()
+    estandar = DefaultJSONProvider(app)
+    datos = {'b': [date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5)], 'a': Decimal('1.50'), 'id': uuid.UUID(int=5), 'sala': 'Pokerstars ñ'}
+    print(f"📤 {app.json.dumps(datos)}")
+    assert json.loads(app.json.dumps(datos)) == json.loads(estandar.dumps(datos))
+    assert app.json.dumps(datos).index('"a"') < app.json.dumps(datos).index('"b"')
+    assert json.loads(app.json.dumps({'grande': 2 ** 70}))['grande'] == 2 ** 70
+    print("✅ Misma salida")
+
+def test_compresion():
+    """gzip solo si el cliente lo acepta y la respuesta supera el mínimo"""
+    print("\n=== COMPRESIÓN DE RESPUESTAS ===\n")
+    cliente = crear_app().test_client()
+    sin_comprimir = cliente.get('/grande')
+    comprimida = cliente.get('/grande', headers={'Accept-Encoding': 'gzip'})
+    print(f"📦 {len(sin_comprimir.data)} bytes -> {len(comprimida.data)} bytes ({comprimida.headers.get('Content-Encoding')})")
+    assert sin_comprimir.headers.get('Content-Encoding') is None
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in comprimida.headers['Vary']
+    assert json.loads(gzip.decompress(comprimida.data)) == sin_comprimir.get_json()
+    assert cliente.get('/pequena', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding') is None
+    assert cliente.get('/grande', headers={'Accept-Encoding': 'gzip;q=0'}).headers.get('Content-Encoding') is None
+    print("✅ Compresión negociada")
+
+if __name__ == '__main__':
+    test_misma_salida_que_flask()
+    test_compresion()
+    print("\n✅ Pruebas de respuestas JSON completadas")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Script para probar que las estadísticas de informes calculadas desde el rollup diario
+coinciden con las calculadas desde los registros individuales
+"""
+
+import random
+from datetime import date, timedelta
+from postgrest.exceptions import APIError
+import app_working
+from app_working import (acumular_serie, agregar_lotes, agrupar_registros, calcular_estadisticas_informe, calcular_resultados_diarios,
+                         calcular_serie_por_lotes, calcular_serie_resultados, filas_rollup_desde_registros)
+from repositorio_poker import RepositorioPoker
+
+CLAVE_ROLLUP = ('fecha', 'sala', 'categoria', 'tipo_movimiento', 'tipo_juego', 'nivel_buyin')
+
+def registros_aleatorios(cantidad, semilla=7):
+    random.seed(semilla)
+    hoy = date.today()
+    return [{
+        'fecha': (hoy - timedelta(days=random.randint(0, 14))).isoformat(),
+        'sala': random.choice(['WPN', 'Pokerstars']),
+        'categoria': random.choice(['Torneo', 'Torneo', 'Cash', 'Transferencia', 'Depósito', None]),
+        'tipo_movimiento': random.choice(['Buy In', 'Ganancia', 'Reentry', 'Retiro', 'Fee']),
+        'tipo_juego': random.choice(['NLH', 'PLO']),
+        'nivel_buyin': random.choice(['Micro', 'Bajo', None]),
+        'importe': round(random.uniform(-60, 80), 2)
+    } for _ in range(cantidad)]
+
+def agregar_como_rollup(registros):
+    """Mismo agrupado que rebuild_poker_daily_rollup"""
+    grupos = {}
+    for registro in registros:
+        clave = tuple(registro[campo] for campo in CLAVE_ROLLUP)
+        fila = grupos.setdefault(clave, {**dict(zip(CLAVE_ROLLUP, clave)), 'cantidad': 0, 'suma': 0.0, 'suma_ingresos': 0.0, 'suma_egresos': 0.0})
+        fila['cantidad'] += 1
+        fila['suma'] += registro['importe']
+        fila['suma_ingresos'] += max(registro['importe'], 0)
+        fila['suma_egresos'] += min(registro['importe'], 0)
+    return list(grupos.values())
+
+def iguales(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(iguales(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(iguales(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return abs(a - b) < 1e-6
+    return a == b
+
+def test_estadisticas_rollup():
+    """Rollup y registros individuales dan las mismas estadísticas"""
+    print("=== ESTADÍSTICAS DESDE EL ROLLUP ===\n")
+    registros = registros_aleatorios(5000)
+    rollup = agregar_como_rollup(registros)
+    desde_registros = calcular_estadisticas_informe(filas_rollup_desde_registros(registros))
+    desde_rollup = calcular_estadisticas_informe(rollup)
+    print(f"📊 {len(registros)} registros -> {len(rollup)} filas de rollup")
+    print(f"🎯 ROI {desde_rollup['roi']:.2f}% | torneos {desde_rollup['torneos_jugados']} | resultado {desde_rollup['resultado_economico']:.2f}")
+    assert iguales(desde_registros, desde_rollup)
+    print("✅ Estadísticas idénticas")
+
+def test_resultados_diarios_rollup():
+    """El gráfico de 10 días es el mismo desde el rollup"""
+    print("\n=== GRÁFICO DIARIO DESDE EL ROLLUP ===\n")
+    registros = [r for r in registros_aleatorios(2000, semilla=3)
+                 if r['categoria'] not in ('Transferencia', 'Depósito', None) and r['tipo_movimiento'] != 'Retiro']
+    hoy = date.today()
+    fechas = [hoy - timedelta(days=i) for i in range(9, -1, -1)]
+    desde_registros = calcular_resultados_diarios(filas_rollup_desde_registros(registros), fechas)
+    desde_rollup = calcular_resultados_diarios(agregar_como_rollup(registros), fechas)
+    assert len(desde_rollup) == 10
+    assert all(iguales(a, b) for a, b in zip(desde_registros, desde_rollup))
+    print(f"📈 {desde_rollup[-1]}")
+    print("✅ Serie diaria idéntica")
+
+def test_estadisticas_por_lotes():
+    """Agrupar los registros lote a lote da las mismas estadísticas que leerlos todos"""
+    print("\n=== ESTADÍSTICAS POR LOTES ===\n")
+    registros = registros_aleatorios(3500, semilla=11)
+    agrupadas = {}
+    for i in range(0, len(registros), 1000):
+        agrupar_registros(registros[i:i + 1000], agrupadas)
+    print(f"📦 {len(registros)} registros -> {len(agrupadas)} grupos (categoría, tipo de movimiento)")
+    assert iguales(calcular_estadisticas_informe(agrupadas.values()), calcular_estadisticas_informe(filas_rollup_desde_registros(registros)))
+    print("✅ Estadísticas idénticas")
+
+def test_agregacion_por_lotes():
+    """agregar_lotes da totales exactos por grupo, rango de fechas y muestras con cualquier tamaño de lote"""
+    print("\n=== AGREGACIÓN POR LOTES ===\n")
+    registros = registros_aleatorios(4321, semilla=3)
+    for tamano in (1, 1000, 5000):
+        lotes = (registros[i:i + tamano] for i in range(0, len(registros), tamano))
+        grupos, resumen = agregar_lotes(lotes, ('sala', 'categoria'), muestras=5)
+        assert resumen['registros'] == len(registros)
+        assert resumen['fecha_min'] == min(r['fecha'] for r in registros)
+        assert resumen['fecha_max'] == max(r['fecha'] for r in registros)
+        assert resumen['muestras'] == registros[:5]
+        for (sala, categoria), fila in grupos.items():
+            del_grupo = [r['importe'] for r in registros if r['sala'] == sala and r['categoria'] == categoria]
+            assert fila['cantidad'] == len(del_grupo)
+            assert abs(fila['suma'] - sum(del_grupo)) < 1e-6
+        print(f"📦 Lotes de {tamano}: {resumen['registros']} registros -> {len(grupos)} grupos (sala, categoría)")
+    print("✅ Agregados exactos")
+
+def test_serie_resultados():
+    """La serie por semana/mes desde el rollup coincide con la de los registros y acumula el saldo anterior"""
+    print("\n=== SERIE DE RESULTADOS ===\n")
+    registros = registros_aleatorios(3000, semilla=5)
+    hoy = date.today()
+    desde = hoy - timedelta(days=9)
+    for granularidad in ('dia', 'semana', 'mes', 'anio'):
+        desde_registros = acumular_serie(calcular_serie_resultados(filas_rollup_desde_registros(registros), granularidad, desde, hoy))
+        desde_rollup = acumular_serie(calcular_serie_resultados(agregar_como_rollup(registros), granularidad, desde, hoy))
+        assert iguales(desde_registros, desde_rollup)
+        total = sum(r['importe'] for r in registros if date.fromisoformat(r['fecha']) <= hoy)
+        assert abs(desde_rollup['periodos'][-1]['acumulado'] - total) < 1e-6
+        assert sum(p['movimientos'] for p in desde_rollup['periodos']) == sum(1 for r in registros if date.fromisoformat(r['fecha']) >= desde)
+        print(f"📈 {granularidad}: {len(desde_rollup['periodos'])} periodos, saldo inicial {desde_rollup['saldo_inicial']:.2f}")
+        # Por lotes (sin fechas: de la primera a la última) da la misma serie
+        lotes = (filas_rollup_desde_registros(registros[i:i + 250]) for i in range(0, len(registros), 250))
+        completa = calcular_serie_resultados(filas_rollup_desde_registros(registros), granularidad)
+        assert iguales(acumular_serie(calcular_serie_por_lotes(lotes, granularidad)), acumular_serie(completa))
+    print("✅ Series idénticas")
+
+class RollupEnMemoria:
+    """Stand-in de la tabla poker_daily_rollup en PostgREST: filtros, orden y rango (máx. 1000 filas)"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.consultas = 0
+
+    def table(self, nombre):
+        self._condiciones, self._orden, self._rango = [], [], (0, 999)
+        return self
+
+    def select(self, campos):
+        self._campos = [campo.strip() for campo in campos.split(',')]
+        return self
+
+    def eq(self, columna, valor):
+        self._condiciones.append(lambda f: f[columna] == valor)
+        return self
+
+    def neq(self, columna, valor):
+        self._condiciones.append(lambda f: f[columna] is not None and f[columna] != valor)
+        return self
+
+    def gte(self, columna, valor):
+        self._condiciones.append(lambda f: f[columna] >= valor)
+        return self
+
+    def lte(self, columna, valor):
+        self._condiciones.append(lambda f: f[columna] <= valor)
+        return self
+
+    def order(self, columna):
+        self._orden.append(columna)
+        return self
+
+    def range(self, inicio, fin):
+        self._rango = (inicio, min(fin, inicio + 999))
+        return self
+
+    def execute(self):
+        self.consultas += 1
+        filas = [f for f in self.filas if all(condicion(f) for condicion in self._condiciones)]
+        filas.sort(key=lambda f: tuple((f[c] is None, f[c] or '') for c in self._orden))
+        inicio, fin = self._rango
+        return type('Respuesta', (), {'data': [{c: f[c] for c in self._campos} for f in filas[inicio:fin + 1]]})
+
+def test_rollup_por_paginas():
+    """Los movimientos del rollup se leen por páginas, sin el límite de 1000 filas por respuesta"""
+    print("\n=== ROLLUP POR PÁGINAS ===\n")
+    registros = registros_aleatorios(20000)
+    filas = [{**fila, 'user_id': 'u1'} for fila in agregar_como_rollup(registros)]
+    cliente = RollupEnMemoria(filas)
+    repo = RepositorioPoker(cliente, tamano_lote=500)
+    movimientos = repo.movimientos_poker_periodo('u1', None, None, rollup=True)
+    # neq de PostgREST descarta también las categorías nulas
+    esperadas = [f for f in filas if f['categoria'] not in (None, 'Transferencia', 'Depósito') and f['tipo_movimiento'] != 'Retiro']
+    print(f"📄 {len(movimientos)} filas en {cliente.consultas} páginas")
+    assert len(esperadas) > 1000 and len(movimientos) == len(esperadas)
+    assert abs(sum(m['suma'] for m in movimientos) - sum(f['suma'] for f in esperadas)) < 1e-6
+    assert cliente.consultas == len(esperadas) // 500 + 1
+    print("✅ Todas las filas del rollup")
+
+def test_fallo_del_rollup():
+    """Solo la falta de migración pasa a los registros; los demás errores se propagan"""
+    print("\n=== FALLOS DEL ROLLUP ===\n")
+    repo = app_working.repositorio
+    fechas = app_working.dias_grafico()
+
+    def leer_con_error(error):
+        def movimientos(user_id, desde, hasta, rollup=False):
+            if rollup:
+                raise error
+            return []
+        return movimientos
+
+    try:
+        repo.movimientos_poker_periodo = leer_con_error(APIError({'code': '42P01', 'message': 'relation "poker_daily_rollup" does not exist'}))
+        diarios = app_working.resultados_diarios_usuario('u1', fechas)
+        assert len(diarios) == 10 and not app_working.rollup_disponible()
+        print("📭 42P01: registros individuales")
+
+        app_working._rollup_no_disponible_hasta = 0.0
+        repo.movimientos_poker_periodo = leer_con_error(APIError({'code': '57014', 'message': 'canceling statement due to statement timeout'}))
+        try:
+            app_working.resultados_diarios_usuario('u1', fechas)
+        except APIError as error:
+            print(f"⏱️  {error.code}: se propaga")
+        else:
+            raise AssertionError("Un timeout no debe desactivar el rollup")
+        assert app_working.rollup_disponible()
+    finally:
+        del repo.movimientos_poker_periodo
+        app_working._rollup_no_disponible_hasta = 0.0
+    print("✅ Rollup desactivado solo sin migración")
+
+if __name__ == '__main__':
+    test_estadisticas_rollup()
+    test_resultados_diarios_rollup()
+    test_estadisticas_por_lotes()
+    test_agregacion_por_lotes()
+    test_serie_resultados()
+    test_rollup_por_paginas()
+    test_fallo_del_rollup()
+    print("\n✅ Pruebas del rollup diario completadas")